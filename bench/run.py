@@ -0,0 +1,327 @@
+"""Offline benchmark of a full run against a local stand-in of the vendor sites.
+
+A run locates, downloads and organizes the claw prizes of `targets.py` from
+the stand-in of `server.py`, then builds the archive, in a fresh process and
+output directory so runs do not share caches, connections or memory. Each run
+measures:
+
+- the end-to-end run time, and the time taken to build the archive;
+- the time spent locating download URLs, and the throughput of the downloads,
+  the extraction and the archive build, from the run trace (see `tracing.py`);
+- the peak resident memory of the run and of its browsers and worker
+  processes, sampled every `RSS_INTERVAL` seconds.
+
+The median of the runs is appended to a results file along with the commit it
+was measured on, and compared with the results of another commit: by default
+the latest one measured with the same options.
+
+    python bench/run.py                          # 3 runs, compared with the previous commit measured
+    python bench/run.py --repeat 5 --compare main
+    python bench/run.py --no-browser --scale 0.1 # without Firefox, with smaller payloads
+"""
+
+import argparse
+import collections
+import contextlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+from typing import Any, TypedDict
+
+import psutil
+
+BENCH = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH.parent.joinpath('src')))
+
+import archive
+import server
+from driver_claw import DriverClaw
+from manifest import Manifest
+from targets import targets
+from tracing import Tracer
+
+RSS_INTERVAL = 0.05
+"""Seconds between two samples of the resident memory.
+"""
+
+METRICS = {
+    'seconds': ('Run time', 's', False),
+    'resolve_seconds': ('Locating URLs, over all items', 's', False),
+    'download_rate': ('Download throughput', 'MiB/s', True),
+    'extract_rate': ('Extraction throughput', 'MiB/s', True),
+    'archive_seconds': ('Archive build time', 's', False),
+    'archive_rate': ('Archive throughput', 'MiB/s', True),
+    'peak_rss': ('Peak resident memory', 'MiB', False),
+}
+"""Compared metrics: their description, unit, and whether higher is better.
+"""
+
+
+class Phase(TypedDict):
+    count: int
+    """Number of spans of the phase."""
+    seconds: float
+    """Total duration of the spans."""
+    bytes: int
+    """Total number of bytes of the spans."""
+
+
+class Measure(TypedDict):
+    seconds: float
+    """End-to-end run time, from locating the first URL to organizing the last file."""
+    resolve_seconds: float
+    """Total time spent locating download URLs, over all items."""
+    download_rate: float
+    """Bytes per second downloaded over the run."""
+    extract_rate: float
+    """Bytes per second extracted, while extracting."""
+    archive_seconds: float
+    """Time taken to build the archive."""
+    archive_rate: float
+    """Bytes per second archived."""
+    peak_rss: int
+    """Peak resident memory of the run and of its child processes, in bytes."""
+    failed: int
+    """Number of items that failed."""
+    phases: dict[str, Phase]
+    """Spans of the run trace by phase name."""
+
+
+class PeakRss:
+    """Peak resident memory of the current process and of its child processes,
+    sampled in a background thread.
+    """
+
+    peak: int
+    """Peak resident memory in bytes so far.
+    """
+
+    def __init__(self, interval: float = RSS_INTERVAL):
+        self.peak = 0
+        self._interval = interval
+        self._process = psutil.Process()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *_):
+        self._stop.set()
+        self._thread.join()
+
+    def _sample(self):
+        while True:
+            rss = 0
+            for process in [self._process, *self._process.children(recursive=True)]:
+                try:
+                    rss += process.memory_info().rss
+                except psutil.Error:
+                    pass
+            self.peak = max(self.peak, rss)
+            if self._stop.wait(self._interval):
+                return
+
+
+def measure(base: str, work: Path, browsers: int, browser: bool) -> Measure:
+    """Run the benchmark once, in the current process.
+
+    Args:
+        base (str): URL of the stand-in.
+        work (Path): Empty working directory.
+        browsers (int): Number of browser sessions.
+        browser (bool): Include the prizes only located with a browser.
+    """
+    prizes = targets(base, browser)
+    dest = work.joinpath('drivers')
+    trace = work.joinpath('trace.jsonl')
+
+    with PeakRss() as rss:
+        with Tracer(trace) as tracer:
+            claw = DriverClaw(dest, browsers=browsers, tracer=tracer)
+            started = time.perf_counter()
+            failed = claw.start(prizes, 'log')
+            seconds = time.perf_counter() - started
+
+            with tracer.span('archive') as span:
+                entries = archive.zip(work.joinpath('driver-pack.zip'), dest, digests=Manifest(dest).digests())
+                span['bytes'] = sum(entry.file_size for entry in entries)
+
+    phases: dict[str, Phase] = collections.defaultdict(lambda: {'count': 0, 'seconds': 0, 'bytes': 0})
+    with open(trace) as f:
+        for line in f:
+            span = json.loads(line)
+            phase = phases[span['name']]
+            phase['count'] += 1
+            phase['seconds'] += span['seconds']
+            phase['bytes'] += span.get('bytes') or 0
+
+    def rate(name: str) -> float:
+        return phases[name]['bytes'] / phases[name]['seconds'] if phases[name]['seconds'] else 0
+
+    return {'seconds': seconds,
+            'resolve_seconds': phases['resolve']['seconds'],
+            'download_rate': claw.throughput['rate'],
+            'extract_rate': rate('organize.extract'),
+            'archive_seconds': phases['archive']['seconds'],
+            'archive_rate': rate('archive'),
+            'peak_rss': rss.peak,
+            'failed': sum(map(len, failed.values())),
+            'phases': dict(phases)}
+
+
+def git(*args: str) -> str | None:
+    """Output of a git command run in the repository, or None if it failed.
+    """
+    try:
+        return subprocess.run(['git', *args], cwd=BENCH, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load(path: Path) -> list[dict[str, Any]]:
+    """Results stored in a results file, oldest first.
+    """
+    try:
+        with open(path) as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+def compare(base: dict[str, Any], result: dict[str, Any]):
+    """Print the metrics of a result next to those of a previous one.
+    """
+    print(f'{'':<36}{(base['commit'] or '?')[:10]:>12}{(result['commit'] or '?')[:10]:>12}{'change':>9}')
+    for key, (name, unit, higher) in METRICS.items():
+        before, after = base['median'].get(key), result['median'][key]
+        if before is None:
+            continue
+        scale = 1024 ** 2 if unit.startswith('MiB') else 1
+        change = (after - before) / before * 100 if before else 0
+        # a change of a few percent is within the noise of most machines
+        verdict = '' if abs(change) < 5 else ' better' if (change > 0) == higher else ' worse'
+        print(f'{f'{name} ({unit})':<36}{before / scale:>12.2f}{after / scale:>12.2f}{change:>+8.1f}%{verdict}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark a full run against a local stand-in of the vendor sites.')
+    parser.add_argument(
+        '--repeat', type=int, default=3, metavar='N',
+        help='Number of runs, whose median is kept (default: 3)'
+    )
+    parser.add_argument(
+        '--scale', type=float, default=1, metavar='FACTOR',
+        help='Factor applied to the size of the payloads, about 500 MiB in total (default: 1)'
+    )
+    parser.add_argument(
+        '-b', '--browsers', type=int, default=1,
+        help='Number of browser sessions (default: 1)'
+    )
+    parser.add_argument(
+        '--no-browser', action='store_true',
+        help='Only include the direct downloads and the prizes located without a browser'
+    )
+    parser.add_argument(
+        '--latency', type=float, default=0, metavar='SECONDS',
+        help='Delay of every response of the stand-in (default: 0)'
+    )
+    parser.add_argument(
+        '--rate', type=float, metavar='MIB',
+        help='Maximum MiB per second sent on a connection by the stand-in (default: no limit)'
+    )
+    parser.add_argument(
+        '--payloads', type=str, default=str(BENCH.joinpath('.payloads')), metavar='DIR',
+        help='Directory the synthetic payloads are generated into (default: bench/.payloads)'
+    )
+    parser.add_argument(
+        '--results', type=str, default=str(BENCH.joinpath('results.jsonl')), metavar='PATH',
+        help='File the results are appended to (default: bench/results.jsonl)'
+    )
+    parser.add_argument(
+        '--compare', type=str, metavar='COMMIT',
+        help='Commit to compare with (default: the latest other commit measured with the same options)'
+    )
+    parser.add_argument(
+        '--no-save', action='store_true',
+        help='Do not append the results to the results file'
+    )
+    parser.add_argument(
+        '-v', '--verbose', action='store_true',
+        help='Show the output of the runs'
+    )
+    parser.add_argument(
+        '--child', type=str, nargs=2, metavar=('BASE', 'WORK'), help=argparse.SUPPRESS
+    )
+    args = parser.parse_args()
+
+    if args.child:
+        base, work = args.child
+        # the output of the run is only shown with --verbose, as stdout carries the result
+        with open(os.devnull, 'w') if not args.verbose else contextlib.nullcontext(sys.stderr) as out:
+            with redirect_stdout(out), redirect_stderr(out):
+                result = measure(base, Path(work), args.browsers, not args.no_browser)
+        print(json.dumps(result))
+        exit(0)
+
+    options = {'scale': args.scale, 'browsers': args.browsers, 'browser': not args.no_browser,
+               'latency': args.latency, 'rate': args.rate}
+    print(f'Generating payloads at scale {args.scale:g}...')
+    payloads = server.generate(args.payloads, args.scale)
+
+    runs: list[Measure] = []
+    with server.serve(payloads, args.latency, args.rate * 1024 ** 2 if args.rate else None) as standin:
+        for n in range(args.repeat):
+            with tempfile.TemporaryDirectory(prefix='driver-claw-bench-') as work:
+                command = [sys.executable, __file__, '--child', standin.base, work, '--browsers', str(args.browsers)]
+                command += ['--no-browser'] * args.no_browser + ['--verbose'] * args.verbose
+                proc = subprocess.run(command, stdout=subprocess.PIPE, text=True)
+                if proc.returncode != 0:
+                    print(f'Run {n + 1}/{args.repeat} failed with status {proc.returncode}.')
+                    exit(1)
+                runs.append(json.loads(proc.stdout.splitlines()[-1]))
+            run = runs[-1]
+            print(f'Run {n + 1}/{args.repeat}: {run['seconds']:.1f}s, archive in {run['archive_seconds']:.1f}s, '
+                  f'peak memory {run['peak_rss'] / 1024 ** 2:.0f} MiB'
+                  + (f', {run['failed']} failed item(s)' if run['failed'] else '') + '.')
+
+    commit = git('rev-parse', 'HEAD')
+    result = {'commit': commit,
+              'dirty': bool(git('status', '--porcelain', '--untracked-files=no')),
+              'subject': git('log', '-1', '--format=%s'),
+              'date': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+              'machine': platform.node(),
+              'python': platform.python_version(),
+              'options': options,
+              'median': {key: statistics.median(run[key] for run in runs) for key in METRICS},
+              'runs': runs}
+
+    history = [previous for previous in load(Path(args.results))
+               if previous['options'] == options and previous['machine'] == result['machine']]
+    if args.compare:
+        wanted = git('rev-parse', args.compare) or args.compare
+        history = [previous for previous in history if previous['commit'] == wanted]
+    else:
+        history = [previous for previous in history if previous['commit'] != commit]
+    if history:
+        compare(history[-1], result)
+    else:
+        print(f'No results of {args.compare or 'another commit'} with the same options to compare with.')
+        for key, (name, unit, _) in METRICS.items():
+            print(f'{f'{name} ({unit})':<36}{result['median'][key] / (1024 ** 2 if unit.startswith('MiB') else 1):>12.2f}')
+
+    if not args.no_save:
+        with open(args.results, 'a') as f:
+            f.write(json.dumps(result) + '\n')
+        print(f'Results of {(commit or 'the working tree')[:10]}{' with local changes' if result['dirty'] else ''} '
+              f'appended to "{args.results}".')
@@ -0,0 +1,344 @@
+"""Local stand-in of the vendor sites, for offline benchmarks.
+
+The server serves the pages in `pages/`, which reproduce the markup the
+resolvers in `url.py` read on the AMD, Intel, Gigabyte, MSI and SourceForge
+sites, with their download links pointing back at the server. Links rendered
+by scripts on the real sites are rendered by scripts here too, after a delay,
+so resolvers wait for them as they would on the real sites.
+
+The downloads are synthetic payloads generated once into a directory: a large
+installer, self-extracting installers read as zip files, zip files holding a
+single executable, zip files with a top-level folder and zip files nested in
+zip files. Executables and driver binaries are incompressible, while INF files
+and text compress well, as on the real sites.
+
+Downloads support byte ranges and conditional requests, and can be slowed down
+per response and per connection to model distant servers.
+
+Run it on its own to browse the stand-in:
+
+    python bench/server.py --port 8000
+"""
+
+import argparse
+import contextlib
+import random
+import re
+import string
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Iterator, Literal
+
+PAGES = Path(__file__).resolve().parent.joinpath('pages')
+"""Directory of the page templates.
+"""
+
+CHUNK_SIZE = 1024 * 1024
+"""Number of bytes sent at a time.
+"""
+
+Member = tuple[str, Literal['bin', 'text'], float] | tuple[str, Literal['zip'], list['Member']]
+"""Member of a synthetic zip file: its name and either its kind and size in
+MiB, or the members of a nested zip file.
+"""
+
+PAYLOADS: dict[str, float | list[Member]] = {
+    # installers
+    'amd_chipset_software_7.06.02.123.exe': 48,
+    'OCCT-Installer-14.1.2.exe': 128,
+    # self-extracting installers, organized as zip files
+    'amd-software-adrenalin-edition-25.6.1-win10-win11-june5.exe': [
+        ('Setup.exe', 'bin', 8),
+        ('Packages/Drivers/Display/WT6A_INF/amdkmdag.sys', 'bin', 64),
+        ('Packages/Drivers/Display/WT6A_INF/amdxc64.dll', 'bin', 32),
+        ('Packages/Drivers/Display/WT6A_INF/u0412345.inf', 'text', 4),
+        ('Config/InstallManifest.json', 'text', 4),
+    ],
+    # zip files nested in zip files
+    'gfx_win_101.6979.zip': [
+        ('Installer.exe', 'bin', 16),
+        ('Graphics/iigd_dch.inf', 'text', 4),
+        ('Graphics/igdkmdn64.sys', 'bin', 48),
+        ('Resources/Extras.zip', 'zip', [('IntelGraphicsSoftware.exe', 'bin', 8),
+                                         ('Licenses/license.txt', 'text', 1)]),
+    ],
+    'DRV_WiFi_RTK_8852BE_SZ-TSD_W11_64_V6001151240_20220908B.zip': [
+        ('Setup.exe', 'bin', 4),
+        ('Driver/netrtwlane6.sys', 'bin', 12),
+        ('Driver/netrtwlane6.inf', 'text', 2),
+        ('Tools.zip', 'zip', [('RtkWlanTool.exe', 'bin', 4)]),
+    ],
+    # zip files holding a single executable
+    'mb_driver_3709_realtek8852wifi.zip': [('mb_driver_3709_realtek8852wifi.exe', 'bin', 24),
+                                           ('readme.txt', 'text', 0.01)],
+    'mb_driver_3710_realtek8852bt.zip': [('mb_driver_3710_realtek8852bt.exe', 'bin', 12)],
+    'CrystalDiskInfo9_7_0.zip': [('DiskInfo64.exe', 'bin', 6), ('Language/English.lang', 'text', 0.5)],
+    'CrystalMarkRetro1_0_0.zip': [('CrystalMarkRetro64.exe', 'bin', 4), ('License.txt', 'text', 0.01)],
+    # zip files with a top-level folder
+    'Realtek_HD_Universal_Driver_6.0.9773.1.zip': [
+        ('Realtek_HD_Universal_Driver/Setup.exe', 'bin', 4),
+        ('Realtek_HD_Universal_Driver/Win64/Realtek/RTKVHD64.sys', 'bin', 28),
+        ('Realtek_HD_Universal_Driver/Win64/Realtek/HDXRT.inf', 'text', 8),
+    ],
+    'Realtek_PCIE_Ethernet_Driver_11.21.zip': [
+        ('Realtek_PCIE_Ethernet_Driver/setup.exe', 'bin', 8),
+        ('Realtek_PCIE_Ethernet_Driver/WIN11/rt25cx21x64.inf', 'text', 4),
+    ],
+}
+"""Synthetic payloads by file name: the size of an executable in MiB, or the
+members of a zip file.
+"""
+
+INTEL_DOWNLOADS = {
+    '785597': 'gfx_win_101.6979.zip',
+}
+"""Payload of the Intel download pages, by download ID.
+"""
+
+SOURCEFORGE_FILES = {
+    'crystaldiskinfo': '/CrystalDiskInfo/9.7.0/CrystalDiskInfo9_7_0.zip',
+    'crystalmarkretro': '/CrystalMarkRetro/1.0.0/CrystalMarkRetro1_0_0.zip',
+}
+"""Path of the latest file of the SourceForge projects.
+"""
+
+
+def _binary(rng: random.Random, size: int) -> Iterator[bytes]:
+    """Incompressible bytes, in chunks.
+    """
+    while size > 0:
+        yield rng.randbytes(min(size, CHUNK_SIZE))
+        size -= CHUNK_SIZE
+
+
+def _text(rng: random.Random, size: int) -> Iterator[bytes]:
+    """Compressible lines, as in INF files, in chunks.
+    """
+    keys = ['HKR', 'CopyFiles', 'AddReg', 'DriverVer', 'ServiceBinary', 'HardwareId']
+    while size > 0:
+        lines = []
+        while sum(map(len, lines)) < min(size, CHUNK_SIZE):
+            lines.append(f'{rng.choice(keys)},{rng.randrange(1 << 16):04X},"PCI\\VEN_10EC&DEV_{rng.randrange(1 << 16):04X}"\r\n')
+        chunk = ''.join(lines).encode()[:min(size, CHUNK_SIZE)]
+        yield chunk
+        size -= len(chunk)
+
+
+def _write_zip(f, members: list[Member], rng: random.Random, scale: float):
+    with zipfile.ZipFile(f, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as zf:
+        for name, kind, content in members:
+            with zf.open(name, 'w', force_zip64=True) as member:
+                if kind == 'zip':
+                    _write_zip(member, content, rng, scale)
+                else:
+                    for chunk in (_binary if kind == 'bin' else _text)(rng, int(content * scale * 1024 ** 2)):
+                        member.write(chunk)
+
+
+def generate(root: str | Path, scale: float = 1) -> Path:
+    """Generate the synthetic payloads, unless they already are.
+
+    Payloads are generated from a fixed seed, so they are the same across
+    runs and machines.
+
+    Args:
+        root (str | Path): Directory of the payloads of every scale.
+        scale (float): Factor applied to the size of the payloads.
+
+    Returns:
+        Path: Directory of the payloads of the scale.
+    """
+    path = Path(root).joinpath(f'scale-{scale:g}')
+    path.mkdir(parents=True, exist_ok=True)
+
+    for name, content in PAYLOADS.items():
+        target = path.joinpath(name)
+        if target.exists():
+            continue
+        rng = random.Random(name)
+        partial = target.with_name(f'{name}.part')
+        with open(partial, 'wb') as f:
+            if isinstance(content, list):
+                _write_zip(f, content, rng, scale)
+            else:
+                f.write(b'MZ')
+                for chunk in _binary(rng, int(content * scale * 1024 ** 2)):
+                    f.write(chunk)
+        partial.replace(target)
+    return path
+
+
+class Handler(BaseHTTPRequestHandler):
+    """Request handler of the stand-in, configured by the attributes of its server.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    server: 'StandIn'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.do_GET(body=False)
+
+    def do_GET(self, body: bool = True):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        path = self.path.split('?')[0]
+        if match := re.fullmatch(r'/payloads/([^/]+)', path):
+            return self._file(match[1], body)
+        if match := re.fullmatch(r'/sf-download/([^/]+)/+(.+)', path):
+            return self._file(match[2].rsplit('/')[-1], body)
+
+        if re.fullmatch(r'/amd/[^/]+\.html', path):
+            page = self._page('amd.html')
+        elif match := re.fullmatch(r'/intel/(\d+)/[^/]*\.html', path):
+            if match[1] not in INTEL_DOWNLOADS:
+                return self.send_error(404)
+            page = self._page('intel.html', payload=INTEL_DOWNLOADS[match[1]])
+        elif re.fullmatch(r'/gigabyte/[^/]+/support', path):
+            page = self._page('gigabyte.html')
+        elif re.fullmatch(r'/msi/[^/]+/support', path):
+            page = self._page('msi.html')
+        elif (match := re.fullmatch(r'/sourceforge/projects/([^/]+)/files/', path)) and match[1] in SOURCEFORGE_FILES:
+            page = self._page('sourceforge.html', project=match[1], file=SOURCEFORGE_FILES[match[1]])
+        else:
+            return self.send_error(404)
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(page)))
+        self.end_headers()
+        if body:
+            self.wfile.write(page)
+
+    def _page(self, name: str, **values: str) -> bytes:
+        template = string.Template(PAGES.joinpath(name).read_text(encoding='utf-8'))
+        return template.substitute(base=self.server.base, **values).encode()
+
+    def _file(self, name: str, body: bool):
+        path = self.server.payloads.joinpath(name)
+        if name not in PAYLOADS or not path.is_file():
+            return self.send_error(404)
+
+        size = path.stat().st_size
+        etag = f'"{path.stat().st_mtime_ns:x}-{size:x}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        start, end = 0, size - 1
+        if ((match := re.fullmatch(r'bytes=(\d*)-(\d*)', self.headers.get('Range', '')))
+                and self.headers.get('If-Range', etag) == etag):
+            if match[1]:
+                start, end = int(match[1]), min(int(match[2]), end) if match[2] else end
+            elif match[2]:
+                start = max(0, size - int(match[2]))
+            if start > end:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{size}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', self.date_time_string(int(path.stat().st_mtime)))
+        self.end_headers()
+        if not body:
+            return
+
+        with open(path, 'rb') as f:
+            f.seek(start)
+            remaining = end - start + 1
+            began = time.monotonic()
+            sent = 0
+            while remaining > 0 and (chunk := f.read(min(remaining, CHUNK_SIZE // 4))):
+                try:
+                    self.wfile.write(chunk)
+                except (BrokenPipeError, ConnectionResetError):
+                    return
+                remaining -= len(chunk)
+                sent += len(chunk)
+                if self.server.rate and (ahead := sent / self.server.rate - (time.monotonic() - began)) > 0:
+                    time.sleep(ahead)
+
+
+class StandIn(ThreadingHTTPServer):
+    """HTTP server of the stand-in.
+    """
+
+    daemon_threads = True
+
+    payloads: Path
+    """Directory of the payloads served.
+    """
+
+    latency: float
+    """Seconds every response is delayed by.
+    """
+
+    rate: float | None
+    """Maximum number of bytes per second sent on a connection, or None for no limit.
+    """
+
+    def __init__(self, payloads: str | Path, host: str = '127.0.0.1', port: int = 0,
+                 latency: float = 0, rate: float | None = None):
+        super().__init__((host, port), Handler)
+        self.payloads = Path(payloads)
+        self.latency = latency
+        self.rate = rate
+
+    @property
+    def base(self) -> str:
+        """URL of the server.
+        """
+        return f'http://{self.server_address[0]}:{self.server_address[1]}'
+
+
+@contextlib.contextmanager
+def serve(payloads: str | Path, latency: float = 0, rate: float | None = None) -> Iterator[StandIn]:
+    """Run the stand-in on a free local port in a background thread.
+
+    Args:
+        payloads (str | Path): Directory of the payloads, see `generate`.
+        latency (float): Seconds every response is delayed by.
+        rate (float | None): Maximum number of bytes per second sent on a
+            connection, or None for no limit.
+
+    Yields:
+        StandIn: The running server.
+    """
+    with StandIn(payloads, latency=latency, rate=rate) as server:
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            yield server
+        finally:
+            server.shutdown()
+            thread.join()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve the local stand-in of the vendor sites.')
+    parser.add_argument('--port', type=int, default=8000, help='Port to listen on (default: 8000)')
+    parser.add_argument('--payloads', type=str, default=str(Path(__file__).resolve().parent.joinpath('.payloads')),
+                        help='Directory of the synthetic payloads (default: bench/.payloads)')
+    parser.add_argument('--scale', type=float, default=1, help='Factor applied to the size of the payloads (default: 1)')
+    args = parser.parse_args()
+
+    server = StandIn(generate(args.payloads, args.scale), port=args.port)
+    print(f'Serving the stand-in at {server.base}/')
+    server.serve_forever()
@@ -0,0 +1,119 @@
+"""Claw prizes of the benchmark, pointed at the local stand-in of the vendor sites.
+
+The prizes mirror `config.CLAW_PRIZES`: the same resolvers and file types,
+several drivers located on the same page, and direct downloads.
+"""
+
+import functools
+
+import url
+from driver_claw import ClawPrize
+
+
+def targets(base: str, browser: bool = True) -> dict[str, list[ClawPrize]]:
+    """Claw prizes of the benchmark.
+
+    SourceForge projects are located at fixed URLs, so `url.SOURCEFORGE` and
+    `url.SOURCEFORGE_DOWNLOADS` are pointed at the stand-in.
+
+    Args:
+        base (str): URL of the stand-in, see `server.serve`.
+        browser (bool): Include the prizes only located with a browser. If
+            False, only the direct downloads and the prizes whose resolver has
+            a fast path are included.
+
+    Returns:
+        dict[str, list[ClawPrize]]: Claw prizes by category.
+    """
+    url.SOURCEFORGE = f'{base}/sourceforge'
+    url.SOURCEFORGE_DOWNLOADS = f'{base}/sf-download'
+
+    prizes: dict[str, list[ClawPrize]] = {
+        'display': [
+            {
+                'path': 'AMD',
+                'url': functools.partial(url.amd, url=f'{base}/amd/amd-radeon-rx-9070-xt.html',
+                                         dri_name='win10-win11'),
+                'file_type': 'zip',
+                'rename_as': None
+            },
+            {
+                'path': 'Intel® Arc™ & Iris® Xe Graphics',
+                'url': functools.partial(url.intel, url=f'{base}/intel/785597/intel-arc-iris-xe-graphics-windows.html'),
+                'file_type': 'zip',
+                'rename_as': None
+            },
+        ],
+        'miscellaneous': [
+            {
+                'path': 'AMD Chipset',
+                'url': functools.partial(url.amd, url=f'{base}/amd/x870e.html', dri_name='chipset'),
+                'file_type': 'exe',
+                'rename_as': 'AMD_Chipset_Software'
+            },
+            {
+                'path': 'Realtek RTL8852CE\\Bluetooth',
+                'url': functools.partial(url.gigabyte, url=f'{base}/gigabyte/B860M-AORUS-ELITE-WIFI6E/support'
+                                                           '#support-dl-driver-wlanbt',
+                                         dri_name='8852 Bluetooth'),
+                'file_type': 'zip/exe',
+                'rename_as': 'mb_driver_3710_realtek8852bt'
+            },
+            {
+                'path': 'Realtek RTL8852CE\\WIFI',
+                'url': functools.partial(url.gigabyte, url=f'{base}/gigabyte/B860M-AORUS-ELITE-WIFI6E/support'
+                                                           '#support-dl-driver-wlanbt',
+                                         dri_name='8852 WIFI'),
+                'file_type': 'zip/exe',
+                'rename_as': 'mb_driver_3709_realtek8852wifi'
+            },
+            {
+                'path': 'Realtek HD Universal',
+                'url': functools.partial(url.msi, url=f'{base}/msi/MAG-X870-TOMAHAWK-WIFI/support#driver',
+                                         dri_type='On-Board Audio Drivers', dri_name='Realtek HD Universal Driver'),
+                'file_type': 'zip/folder',
+                'rename_as': None
+            },
+            {
+                'path': 'Realtek RTL8852BE\\WIFI',
+                'url': f'{base}/payloads/DRV_WiFi_RTK_8852BE_SZ-TSD_W11_64_V6001151240_20220908B.zip',
+                'file_type': 'zip',
+                'rename_as': None
+            },
+        ],
+        'network': [
+            {
+                'path': 'Realtek',
+                'url': functools.partial(url.msi, url=f'{base}/msi/MAG-X870-TOMAHAWK-WIFI/support#driver',
+                                         dri_type='LAN Drivers', dri_name='Realtek PCI-E Ethernet Drivers'),
+                'file_type': 'zip/folder',
+                'rename_as': None
+            },
+        ],
+        'tool': [
+            {
+                'path': 'CrystalDiskinfo',
+                'url': url.crystaldick_info,
+                'file_type': 'zip/exe',
+                'rename_as': None
+            },
+            {
+                'path': 'CrystalDiskMark',
+                'url': url.crystaldick_mark,
+                'file_type': 'zip/exe',
+                'rename_as': None
+            },
+            {
+                'path': 'OCCT',
+                'url': f'{base}/payloads/OCCT-Installer-14.1.2.exe',
+                'file_type': 'exe',
+                'rename_as': 'OCCT'
+            },
+        ],
+    }
+
+    if not browser:
+        prizes = {category: [item for item in items
+                             if type(item['url']) is str or url.fast_path_of(item['url'])]
+                  for category, items in prizes.items()}
+    return {category: items for category, items in prizes.items() if items}
@@ -1,11 +1,44 @@
 """Handling archive operations.
+
+Zip files are extracted in-process with `zipfile`, streaming every member
+straight to its final location. 7-Zip (or PowerShell) is only used for the
+archives `zipfile` cannot read, such as other formats, encrypted members or
+unsupported compression methods.
+
+Archives are built natively as well (see `zip`): entries are compressed in
+parallel on worker processes, and already compressed files, such as most
+installers, are stored without compression.
+
+A delta pack holds the entries of an archive that are missing from a previous
+one, so clients holding the previous archive only need to download the delta
+pack to rebuild the new one (see `delta` and `apply_delta`).
 """
 
+import collections
+import contextlib
+import copy
+import functools
+import glob
+import io
+import json
 import os
+import shutil
 import subprocess
+import tempfile
+import threading
+import time
+import zipfile
+import zlib
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path, PurePosixPath
+from typing import BinaryIO, Callable, Iterator, Literal, TypedDict
+from zipfile import ZIP_DEFLATED, ZipInfo
 
 import patoolib
 
+from manifest import MANIFEST_NAME, FileDigest, Hasher
+from zipwriter import ZipWriter
+
 try:
     LIB7ZIP = (os.getenv('PATH_LIB_7ZIP')
                or patoolib.find_archive_program("7z", "unzip"))
@@ -34,24 +67,804 @@ def unzip(source: os.PathLike, target: os.PathLike, silent: bool = True) -> int:
     return subprocess.run(cmd, stdout=stream, stderr=stream).returncode
 
 
-def zip(target: os.PathLike, *source: os.PathLike, level: int = 5, silent: bool = True) -> int:
+CHUNK_SIZE = 1024 * 1024
+"""Number of bytes copied at a time when extracting a member.
+"""
+
+INCOMPRESSIBLE_SUFFIXES = frozenset({
+    '.zip', '.7z', '.rar', '.cab', '.msi', '.msp', '.gz', '.tgz', '.bz2', '.xz',
+    '.zst', '.lzma', '.jar', '.apk', '.appx', '.msix', '.nupkg', '.whl',
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.mp3', '.mp4', '.mkv', '.webm',
+    '.docx', '.xlsx', '.pptx', '.pdf',
+})
+"""Suffixes of formats that are already compressed, stored without compression.
+"""
+
+SAMPLE_SIZE = 64 * 1024
+"""Number of bytes of each sample used to estimate how compressible a file is.
+"""
+
+COMPRESSIBLE_RATIO = 0.9
+"""Maximum compressed to raw size ratio of the samples of a file worth compressing.
+"""
+
+_NATIVE_METHODS = {zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED,
+                   zipfile.ZIP_BZIP2, zipfile.ZIP_LZMA}
+"""Compression methods supported by `zipfile`.
+"""
+
+
+def _member_path(info: zipfile.ZipInfo, strip_top: bool) -> PurePosixPath | None:
+    """Relative destination path of a zip member.
+
+    Args:
+        info (zipfile.ZipInfo): The member.
+        strip_top (bool): Drop the top-level directory of members inside one.
+
+    Returns:
+        PurePosixPath | None: The path, or None for directory entries.
+
+    Raises:
+        RuntimeError: If the member would be written outside the destination.
+    """
+    path = PurePosixPath(info.filename.replace('\\', '/'))
+    if path.is_absolute() or '..' in path.parts or ':' in path.parts[0]:
+        raise RuntimeError(f'Unsafe path in zip file: {info.filename}')
+    if info.is_dir():
+        return None
+    if strip_top and len(path.parts) > 1:
+        path = PurePosixPath(*path.parts[1:])
+    return path
+
+
+def _readable(source: os.PathLike) -> bool:
+    """Whether a file is a zip file whose members can all be read by `zipfile`.
+    """
+    if not zipfile.is_zipfile(source):
+        return False
+    with zipfile.ZipFile(source) as zf:
+        return all(info.compress_type in _NATIVE_METHODS and not info.flag_bits & 0x1
+                   for info in zf.infolist())
+
+
+def _layout(zf: zipfile.ZipFile, strip_top: bool, rename_exe: str | None) -> list[tuple[ZipInfo, PurePosixPath]]:
+    """Relative destination paths of the file members of a zip file.
+
+    Args:
+        zf (zipfile.ZipFile): The zip file.
+        strip_top (bool): Drop the top-level directory of members inside one.
+        rename_exe (str | None): New name, without extension, of the single
+            executable at the top level.
+
+    Returns:
+        list[tuple[ZipInfo, PurePosixPath]]: Each file member with its path.
+
+    Raises:
+        RuntimeError: If a member would be written outside the destination, or
+            no executable is found to rename.
+        NotImplementedError: If several executables are found to rename.
+    """
+    members = [(info, path) for info in zf.infolist()
+               if (path := _member_path(info, strip_top)) is not None]
+
+    if rename_exe:
+        exes = [path for _, path in members
+                if len(path.parts) == 1 and path.suffix.lower() == '.exe']
+        if len(exes) > 1:
+            raise NotImplementedError('Multiple executables found in zip.')
+        if not exes:
+            raise RuntimeError('No executable found in zip.')
+        members = [(info, PurePosixPath(f'{rename_exe}.exe') if path == exes[0] else path)
+                   for info, path in members]
+
+    return members
+
+
+def _extract_native(source: os.PathLike, target: Path, strip_top: bool, rename_exe: str | None) -> dict[str, FileDigest] | None:
+    """Extract a zip file with `zipfile`, hashing the files as they are written.
+
+    Returns:
+        dict[str, FileDigest] | None: Checksums of the extracted files, or None
+            if `zipfile` cannot read the archive, in which case nothing has
+            been extracted.
+    """
+    if not _readable(source):
+        return None
+
+    digests: dict[str, FileDigest] = {}
+    with zipfile.ZipFile(source) as zf:
+        for info, path in _layout(zf, strip_top, rename_exe):
+            dest = target.joinpath(path)
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            # a file left by a previous run may be hardlinked to the download
+            # cache or to its duplicates, so it is replaced, not truncated
+            dest.unlink(True)
+            hasher = Hasher()
+            with zf.open(info) as src, open(dest, 'wb') as dst:
+                while chunk := src.read(CHUNK_SIZE):
+                    hasher.update(chunk)
+                    dst.write(chunk)
+
+            mtime = time.mktime(info.date_time + (0, 0, -1))
+            os.utime(dest, (mtime, mtime))
+            # the CRC-32 was checked against the member by `zipfile` while reading
+            digests[path.as_posix()] = {**hasher.digest(), 'crc32': info.CRC}
+
+    return digests
+
+
+def _extract_external(source: os.PathLike, target: Path, strip_top: bool, rename_exe: str | None) -> list[Path]:
+    """Extract an archive with 7-Zip or PowerShell, then lay out the files as `extract` does.
+
+    Returns:
+        list[Path]: Paths of the top-level files and directories laid out in the target.
+    """
+    with tempfile.TemporaryDirectory(dir=target, prefix='.extract-') as staging:
+        staging = Path(staging)
+        if unzip(source, staging) != 0:
+            raise RuntimeError('Failed to extract zip file.')
+
+        if strip_top:
+            for directory in [p for p in staging.iterdir() if p.is_dir()]:
+                for file in directory.iterdir():
+                    shutil.move(file, staging.joinpath(file.name))
+                directory.rmdir()
+
+        if rename_exe:
+            if len(exe := glob.glob('*.exe', root_dir=staging)) > 1:
+                raise NotImplementedError('Multiple executables found in zip.')
+            if not exe:
+                raise RuntimeError('No executable found in zip.')
+            staging.joinpath(exe[0]).rename(
+                staging.joinpath(f'{rename_exe}.exe'))
+
+        moved = []
+        for file in staging.iterdir():
+            moved.append(Path(shutil.move(file, target.joinpath(file.name))))
+        return moved
+
+
+def extract(source: os.PathLike, target: os.PathLike, strip_top: bool = False, rename_exe: str | None = None,
+            crc32: bool = False) -> dict[str, FileDigest]:
+    """Extract an archive into the target directory.
+
+    Zip files readable by `zipfile` are extracted in-process, and hashed while
+    they are written; other archives are handed to 7-Zip or PowerShell, and
+    the extracted files are hashed afterward.
+
+    Args:
+        source (os.PathLike): Path to the archive.
+        target (os.PathLike): Directory to extract files to.
+        strip_top (bool): Extract the content of top-level directories directly
+            into the target. Defaults to False.
+        rename_exe (str | None): New name, without extension, of the single
+            executable at the top level of the extracted files.
+        crc32 (bool): Compute the CRC-32 of files extracted by 7-Zip or
+            PowerShell. Files extracted in-process always have it, from the
+            zip file. Defaults to False.
+
+    Returns:
+        dict[str, FileDigest]: Checksums of the extracted files, by path
+            relative to the target.
+
+    Raises:
+        RuntimeError: If the extraction fails, or no executable is found to rename.
+        NotImplementedError: If several executables are found to rename.
+    """
+    target = Path(target)
+    target.mkdir(parents=True, exist_ok=True)
+
+    if (digests := _extract_native(source, target, strip_top, rename_exe)) is not None:
+        return digests
+
+    digests = {}
+    for moved in _extract_external(source, target, strip_top, rename_exe):
+        for path in [moved] if moved.is_file() else sorted(p for p in moved.rglob('*') if p.is_file()):
+            digests[path.relative_to(target).as_posix()] = Hasher.file(path, crc32)
+    return digests
+
+
+def _deflate_into(path: Path, dst: BinaryIO, level: int) -> tuple[int, int]:
+    """Compress a file into a raw deflate stream.
+
+    Args:
+        path (Path): Path to the file.
+        dst (BinaryIO): Stream to write the compressed data to.
+        level (int): Deflate level.
+
+    Returns:
+        tuple[int, int]: CRC-32 of the file and size of the compressed data.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    crc = size = 0
+    with open(path, 'rb') as src:
+        while chunk := src.read(CHUNK_SIZE):
+            crc = zlib.crc32(chunk, crc)
+            size += dst.write(compressor.compress(chunk))
+        size += dst.write(compressor.flush())
+    return crc, size
+
+
+def _deflate(path: Path, spool: Path, level: int) -> tuple[int, int]:
+    """Compress a file into a spool file, on a worker process, see `_deflate_into`.
+    """
+    with open(spool, 'wb') as dst:
+        return _deflate_into(path, dst, level)
+
+
+def compressible(path: str | Path, size: int | None = None) -> bool:
+    """Guess whether compressing a file is worth it.
+
+    Files with the suffix of an already compressed format are not. Other files
+    are sampled at their start, middle and end, and are worth compressing if
+    the samples shrink to less than `COMPRESSIBLE_RATIO` of their size.
+
+    Args:
+        path (str | Path): Path to the file.
+        size (int | None): Size of the file, if already known.
+    """
+    path = Path(path)
+    if path.suffix.lower() in INCOMPRESSIBLE_SUFFIXES:
+        return False
+
+    size = path.stat().st_size if size is None else size
+    if size <= SAMPLE_SIZE:
+        offsets = [0]
+    else:
+        offsets = [0, (size - SAMPLE_SIZE) // 2, size - SAMPLE_SIZE]
+
+    raw = compressed = 0
+    with open(path, 'rb') as f:
+        for offset in offsets:
+            f.seek(offset)
+            sample = f.read(SAMPLE_SIZE)
+            raw += len(sample)
+            compressed += len(zlib.compress(sample, 1))
+
+    return raw > 0 and compressed < raw * COMPRESSIBLE_RATIO
+
+
+def _walk(path: Path, arcname: str) -> Iterator[tuple[Path, str]]:
+    """List a file, or a directory and its content, with their names in the archive.
+    """
+    yield path, arcname
+    if path.is_dir():
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(dirs) + sorted(files):
+                child = Path(root, name)
+                yield child, f'{arcname}/{child.relative_to(path).as_posix()}'
+
+
+def _entries(*source: str | Path) -> Iterator[tuple[Path, str]]:
+    """List the files and directories to archive, with their name in the archive.
+
+    Each source is placed at the root of the archive under its own name, with
+    the content of directories below it.
+    """
+    for src in source:
+        yield from _walk(Path(src), Path(src).name)
+
+
+def crc32(path: str | Path) -> int:
+    """Compute the CRC-32 of a file.
+    """
+    crc = 0
+    with open(path, 'rb') as f:
+        while chunk := f.read(CHUNK_SIZE):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def _unchanged(entry: ZipInfo, info: ZipInfo, path: Path, digest: FileDigest | None = None) -> bool:
+    """Whether a file has the same content as an entry of an existing archive.
+
+    When its size matches but its modification time does not, the CRC-32 of
+    the file is taken from its digest if known, and read from the file otherwise.
+    """
+    if entry.is_dir() or entry.file_size != info.file_size:
+        return False
+    # zip files store modification times with a 2 seconds resolution
+    if entry.date_time[:5] == info.date_time[:5] and entry.date_time[5] // 2 == info.date_time[5] // 2:
+        return True
+    if digest and digest['crc32'] is not None and digest['size'] == info.file_size:
+        return digest['crc32'] == entry.CRC
+    return crc32(path) == entry.CRC
+
+
+def _content_key(path: Path, digests: dict[Path, FileDigest] | None) -> tuple | None:
+    """Key identifying the content of a file without reading it.
+
+    Files with the same SHA-256 hash and size in their digest, or hardlinks to
+    the same file, share a key. Other files have none.
+    """
+    if digests and (digest := digests.get(path.absolute())) and digest['sha256']:
+        return digest['sha256'], digest['size']
+    stat = path.stat()
+    return (stat.st_dev, stat.st_ino) if stat.st_nlink > 1 else None
+
+
+def zip(target: os.PathLike, *source: os.PathLike, level: int = 5, workers: int | None = None, update: bool = False,
+        digests: dict[Path, FileDigest] | None = None) -> list[ZipInfo]:
     """Create a zip archive from source files or directories.
 
+    Entries worth compressing (see `compressible`) are deflated on a pool of
+    worker processes, while the others are stored as they are. Entries are
+    written in a deterministic order regardless of which worker finishes first.
+
+    Files with the same content (see `_content_key`) are only compressed
+    once: the compressed data of the first one is written for each of them.
+
+    When updating an existing archive, the entries of files that did not
+    change, by size, modification time and CRC-32, are copied from it byte for
+    byte without being compressed again. Only new and changed files are
+    compressed, and entries of removed files are dropped.
+
     Args:
         target (os.PathLike): Path for the output zip file.
         *source (os.PathLike): Paths to files or directories to archive.
-        level (int): Compression level (0-9). Defaults to 5.
-        silent (bool): Suppress console output if True. Defaults to True.
+        level (int): Compression level (0-9), 0 storing every entry. Defaults to 5.
+        workers (int | None): Number of worker processes. Defaults to the number of CPUs.
+        update (bool): Reuse the unchanged entries of the existing archive at
+            `target`, if any. Defaults to False.
+        digests (dict[Path, FileDigest] | None): Known checksums of source
+            files by absolute path, such as those of a `manifest.Manifest`,
+            used to find identical files and trusted instead of reading the
+            files when updating.
 
     Returns:
-        int: Exit code of the compression process (0 for success).
+        list[ZipInfo]: Entries of the archive.
     """
-    stream = subprocess.DEVNULL if silent else None
-    cmd = ([LIB7ZIP, 'a', str(target), " ".join(source), f'-mx{level}']
-           if LIB7ZIP
-           else ['powershell', 'Compress-Archive', '-Path', ','.join(source),
-                 '-DestinationPath', str(target), '-CompressionLevel',
-                 'NoCompression' if level == 0 else 'Fastest' if level < 5 else 'Optimal',
-                 '-Force']
-           )
-    return subprocess.run(cmd, stdout=stream, stderr=stream).returncode
+    target = Path(target)
+    workers = workers or os.cpu_count() or 1
+    pending: collections.deque[Callable[[], ZipInfo]] = collections.deque()
+
+    def write_deflated(info: ZipInfo, path: Path, future: Future, spool: Path, last: bool = True) -> ZipInfo:
+        info.CRC, info.compress_size = future.result()
+        info.compress_type = ZIP_DEFLATED
+        if info.compress_size >= info.file_size:
+            entry = writer.write_file(info, path)
+        else:
+            with open(spool, 'rb') as f:
+                entry = writer.write_raw(info, f)
+        if last:
+            spool.unlink()
+        return entry
+
+    partial = target.with_name(f'.{target.name}.tmp')
+    try:
+        with (contextlib.ExitStack() as stack,
+              tempfile.TemporaryDirectory(dir=target.parent, prefix='.zip-') as scratch,
+              ProcessPoolExecutor(workers) as executor,
+              ZipWriter(partial) as writer):
+            existing: dict[str, ZipInfo] = {}
+            if update and zipfile.is_zipfile(target):
+                with zipfile.ZipFile(target) as base:
+                    existing = {info.filename: info for info in base.infolist()}
+                base = stack.enter_context(open(target, 'rb'))
+
+            entries = list(_entries(*source))
+            keys = {path: key for path, _ in entries
+                    if path.is_file() and (key := _content_key(path, digests))}
+            # spools of compressed files kept for the files with the same content
+            uses = collections.Counter(keys.values())
+            compressed: dict[tuple, tuple[Future, Path]] = {}
+
+            for n, (path, arcname) in enumerate(entries):
+                info = ZipInfo.from_file(path, arcname, strict_timestamps=False)
+                if key := keys.get(path):
+                    uses[key] -= 1
+
+                if info.is_dir():
+                    pending.append(functools.partial(
+                        writer.write_directory, info))
+                elif ((entry := existing.get(info.filename))
+                      and _unchanged(entry, info, path, digests and digests.get(path.absolute()))):
+                    entry.date_time = info.date_time
+                    pending.append(functools.partial(
+                        writer.copy_from, base, entry))
+                elif key in compressed:
+                    future, spool = compressed[key] if uses[key] else compressed.pop(key)
+                    pending.append(functools.partial(
+                        write_deflated, info, path, future, spool, not uses[key]))
+                elif level > 0 and compressible(path, info.file_size):
+                    spool = Path(scratch, str(n))
+                    future = executor.submit(_deflate, path, spool, level)
+                    if key and uses[key]:
+                        compressed[key] = future, spool
+                    pending.append(functools.partial(
+                        write_deflated, info, path, future, spool, not (key and uses[key])))
+                else:
+                    pending.append(functools.partial(
+                        writer.write_file, info, path))
+
+                # bound the scratch space to the data compressed ahead of the writer
+                while len(pending) > 2 * workers:
+                    pending.popleft()()
+
+            while pending:
+                pending.popleft()()
+    except BaseException:
+        partial.unlink(True)
+        raise
+
+    os.replace(writer.path, target)
+    return writer.entries
+
+
+class ArchiveStream:
+    """A zip archive written while items are organized, without an intermediate directory tree.
+
+    Files are compressed by the calling thread (zlib releases the GIL, so
+    concurrent callers compress in parallel) and appended under a lock. Members
+    of downloaded zip files are copied into the archive byte for byte under
+    their new names, without being extracted.
+
+    The archive is written to a temporary file next to the target, opened when
+    entering the context of the stream. It is moved to the target by `finish`
+    once complete; otherwise it is kept as a partial archive when leaving the
+    context, which a later stream can resume from.
+    """
+
+    target: Path
+    """Path of the complete archive.
+    """
+
+    level: int
+    """Compression level (0-9), 0 storing every entry.
+    """
+
+    resume: bool
+    """Whether the entries of the partial archive left by a previous stream are kept.
+    """
+
+    def __init__(self, target: str | Path, level: int = 5, resume: bool = False):
+        self.target = Path(target)
+        self.level = level
+        self.resume = resume
+        self._lock = threading.Lock()
+        self._groups = threading.local()
+        self._dirs: set[str] = set()
+        self._writer: ZipWriter | None = None
+        self._finished = False
+
+    def __enter__(self):
+        self._writer = ZipWriter(
+            self.target.with_name(f'.{self.target.name}.tmp'))
+
+        if self.resume and zipfile.is_zipfile(self.path_partial):
+            with zipfile.ZipFile(self.path_partial) as zf:
+                infos = zf.infolist()
+            with open(self.path_partial, 'rb') as f:
+                for info in infos:
+                    self._writer.copy_from(f, info)
+            self._dirs.update(info.filename for info in infos if info.is_dir())
+
+        return self
+
+    def __exit__(self, *_):
+        self.finish(False)
+
+    @property
+    def path_partial(self) -> Path:
+        """Path of the partial archive kept when a stream is not complete.
+        """
+        return self.target.with_name(f'.{self.target.name}.partial')
+
+    @contextlib.contextmanager
+    def group(self) -> Iterator[list[ZipInfo]]:
+        """Group the entries written by the current thread, removing them all if an error occurs.
+
+        Removed entries are left out of the central directory, so readers
+        ignore them.
+
+        Yields:
+            list[ZipInfo]: Entries written in the group so far.
+        """
+        self._groups.current = entries = []
+        try:
+            yield entries
+        except BaseException:
+            removed = {id(entry) for entry in entries}
+            with self._lock:
+                self._writer.entries = [entry for entry in self._writer.entries
+                                        if id(entry) not in removed]
+                self._dirs.difference_update(entry.filename for entry in entries)
+            raise
+        finally:
+            self._groups.current = None
+
+    def _write(self, write: Callable[..., ZipInfo], info: ZipInfo, *args) -> ZipInfo:
+        """Write an entry and its missing parent directories. The caller must hold the lock.
+        """
+        parents = PurePosixPath(info.filename).parents
+        for parent in reversed(list(parents)[:-1]):
+            if (name := f'{parent.as_posix()}/') not in self._dirs:
+                directory = ZipInfo(name, time.localtime()[:6])
+                directory.external_attr = 0o40755 << 16 | 0x10
+                self._record(self._writer.write_directory(directory))
+                self._dirs.add(name)
+
+        return self._record(write(info, *args))
+
+    def _record(self, entry: ZipInfo) -> ZipInfo:
+        if (entries := getattr(self._groups, 'current', None)) is not None:
+            entries.append(entry)
+        return entry
+
+    def add_file(self, arcname: str, path: str | Path):
+        """Add a file, compressed if it is worth it (see `compressible`).
+
+        Args:
+            arcname (str): Name of the entry.
+            path (str | Path): Path to the file.
+        """
+        info = ZipInfo.from_file(path, arcname, strict_timestamps=False)
+
+        if self.level > 0 and compressible(path, info.file_size):
+            with tempfile.TemporaryFile(dir=self.target.parent) as spool:
+                info.CRC, info.compress_size = _deflate_into(
+                    Path(path), spool, self.level)
+                if info.compress_size < info.file_size:
+                    info.compress_type = ZIP_DEFLATED
+                    spool.seek(0)
+                    with self._lock:
+                        self._write(self._writer.write_raw, info, spool)
+                    return
+
+        with self._lock:
+            self._write(self._writer.write_file, info, path)
+
+    def add_path(self, arcname: str, path: str | Path):
+        """Add a file, or a directory and its content.
+
+        Args:
+            arcname (str): Name of the entry of the file or directory.
+            path (str | Path): Path to the file or directory.
+        """
+        for child, name in _walk(Path(path), arcname):
+            if child.is_dir():
+                with self._lock:
+                    if f'{name}/' not in self._dirs:
+                        self._write(self._writer.write_directory,
+                                    ZipInfo.from_file(child, name, strict_timestamps=False))
+                        self._dirs.add(f'{name}/')
+            else:
+                self.add_file(name, child)
+
+    def add_zip(self, arcname: str, source: str | Path, strip_top: bool = False, rename_exe: str | None = None):
+        """Add the content of a zip file under a directory, laid out as `extract` does.
+
+        Members are copied without being decompressed. Archives `zipfile`
+        cannot read are extracted to a temporary directory first.
+
+        Args:
+            arcname (str): Name of the directory entry.
+            source (str | Path): Path to the zip file.
+            strip_top (bool): Drop the top-level directory of the members. Defaults to False.
+            rename_exe (str | None): New name, without extension, of the single
+                executable at the top level.
+        """
+        if not _readable(source):
+            with tempfile.TemporaryDirectory(dir=self.target.parent) as staging:
+                _extract_external(source, Path(staging), strip_top, rename_exe)
+                self.add_path(arcname, staging)
+            return
+
+        with zipfile.ZipFile(source) as zf, open(source, 'rb') as fp:
+            members = _layout(zf, strip_top, rename_exe)
+            with self._lock:
+                for info, path in members:
+                    entry = copy.copy(info)
+                    entry.filename = f'{arcname}/{path.as_posix()}'
+                    self._write(functools.partial(
+                        self._writer.copy_from, fp), entry)
+
+    def finish(self, complete: bool = True):
+        """Write the central directory and move the archive into place.
+
+        Args:
+            complete (bool): Whether every item has been added. An incomplete
+                archive is kept at `path_partial` instead of the target.
+        """
+        with self._lock:
+            if self._finished:
+                return
+            self._finished = True
+            self._writer.close()
+
+        if complete:
+            os.replace(self._writer.path, self.target)
+            self.path_partial.unlink(True)
+        else:
+            os.replace(self._writer.path, self.path_partial)
+
+
+DELTA_MANIFEST = '.delta.json'
+"""Name of the entry of a delta pack describing how to rebuild the archive.
+"""
+
+
+class DeltaEntry(TypedDict):
+    name: str
+    """Name of the entry in the rebuilt archive."""
+    crc: int
+    """CRC-32 of the entry content."""
+    sha256: str | None
+    """SHA-256 hash of the entry content, if recorded in a bundled manifest."""
+    size: int
+    """Uncompressed size of the entry."""
+    date_time: list[int]
+    """Modification time of the entry."""
+    source: Literal['base', 'delta']
+    """Archive the entry data is copied from."""
+    base_name: str | None
+    """Name of the entry in the base archive, for entries copied from it."""
+
+
+class DeltaManifest(TypedDict):
+    entries: list[DeltaEntry]
+    """Entries of the rebuilt archive, in order."""
+    deleted: list[str]
+    """Names of the entries of the base archive missing from the rebuilt one."""
+
+
+def _archived_digests(zf: zipfile.ZipFile) -> dict[str, FileDigest]:
+    """Checksums of the entries of an archive, from the manifests bundled in it.
+
+    Every `manifest.MANIFEST_NAME` entry is read as the manifest of the
+    directory it is in. Digests that do not match the size or CRC-32 of their
+    entry, such as those of files changed after being recorded, are left out.
+    """
+    infos = {info.filename: info for info in zf.infolist()}
+    digests: dict[str, FileDigest] = {}
+    for name in infos:
+        if PurePosixPath(name).name != MANIFEST_NAME:
+            continue
+        try:
+            items = json.loads(zf.read(name))['items']
+        except (ValueError, KeyError, TypeError):
+            continue
+        root = PurePosixPath(name).parent
+        for key, item in items.items():
+            for file, digest in item['files'].items():
+                entry = root.joinpath(key, file).as_posix()
+                info = infos.get(entry)
+                if (info and digest['sha256'] and digest['size'] == info.file_size
+                        and digest['crc32'] in (None, info.CRC)):
+                    digests[entry] = digest
+    return digests
+
+
+def _delta_key(info: ZipInfo, digests: dict[str, FileDigest]) -> tuple:
+    """Key identifying the content of an entry: its SHA-256 hash and size if
+    recorded, and its CRC-32 and size otherwise.
+    """
+    if digest := digests.get(info.filename):
+        return 'sha256', digest['sha256'], info.file_size
+    return 'crc32', info.CRC, info.file_size
+
+
+def delta(target: os.PathLike, base: os.PathLike, new: os.PathLike) -> DeltaManifest:
+    """Create a delta pack holding the entries of an archive that a base archive lacks.
+
+    Entries are compared by the SHA-256 hash and size recorded for them in the
+    manifests bundled in both archives (see `manifest.Manifest`), so no entry
+    data is read or decompressed. Entries missing from the manifests, such as
+    included files or the manifests themselves, are compared by the CRC-32 and
+    size of the central directories instead. An entry is taken from the base
+    archive if the base has an entry with the same content, under the same
+    name or another one; otherwise its compressed data is copied into the
+    delta pack as it is.
+
+    Args:
+        target (os.PathLike): Path for the delta pack.
+        base (os.PathLike): Path to the previous archive.
+        new (os.PathLike): Path to the new archive.
+
+    Returns:
+        DeltaManifest: The manifest stored in the delta pack.
+    """
+    target = Path(target)
+    with zipfile.ZipFile(base) as zf:
+        base_infos = zf.infolist()
+        base_digests = _archived_digests(zf)
+    with zipfile.ZipFile(new) as zf:
+        new_infos = zf.infolist()
+        new_digests = _archived_digests(zf)
+
+    by_name = {info.filename: info for info in base_infos}
+    by_content: dict[tuple, str] = {}
+    for info in base_infos:
+        if not info.is_dir():
+            by_content.setdefault(_delta_key(info, base_digests), info.filename)
+
+    manifest: DeltaManifest = {
+        'entries': [],
+        'deleted': sorted(by_name.keys() - {info.filename for info in new_infos}),
+    }
+
+    partial = target.with_name(f'.{target.name}.tmp')
+    try:
+        with open(new, 'rb') as fp, ZipWriter(partial) as writer:
+            for info in new_infos:
+                content = _delta_key(info, new_digests)
+                base_name = None
+                if not info.is_dir():
+                    old = by_name.get(info.filename)
+                    base_name = (old.filename if old and _delta_key(old, base_digests) == content
+                                 else by_content.get(content))
+
+                manifest['entries'].append({'name': info.filename,
+                                            'crc': info.CRC,
+                                            'sha256': content[1] if content[0] == 'sha256' else None,
+                                            'size': info.file_size,
+                                            'date_time': list(info.date_time),
+                                            'source': 'delta' if base_name is None else 'base',
+                                            'base_name': base_name})
+                if base_name is None:
+                    writer.copy_from(fp, copy.copy(info))
+
+            data = json.dumps(manifest).encode()
+            writer.write_stream(ZipInfo(DELTA_MANIFEST, time.localtime()[:6]),
+                                io.BytesIO(data), 9, len(data))
+    except BaseException:
+        partial.unlink(True)
+        raise
+
+    os.replace(partial, target)
+    return manifest
+
+
+def apply_delta(base: os.PathLike, delta: os.PathLike, target: os.PathLike) -> list[ZipInfo]:
+    """Rebuild an archive from a base archive and a delta pack created by `delta`.
+
+    Entry data is copied from both archives without being decompressed. Entries
+    taken from the base archive are checked against the CRC-32 and size
+    recorded in the delta pack, and against its SHA-256 hash if recorded.
+
+    Args:
+        base (os.PathLike): Path to the base archive the delta pack was created against.
+        delta (os.PathLike): Path to the delta pack.
+        target (os.PathLike): Path for the rebuilt archive.
+
+    Returns:
+        list[ZipInfo]: Entries of the rebuilt archive.
+
+    Raises:
+        ValueError: If the base archive lacks an entry the delta pack relies on.
+    """
+    target = Path(target)
+    with zipfile.ZipFile(delta) as zf:
+        manifest: DeltaManifest = json.loads(zf.read(DELTA_MANIFEST))
+        delta_infos = {info.filename: info for info in zf.infolist()}
+    with zipfile.ZipFile(base) as zf:
+        base_infos = {info.filename: info for info in zf.infolist()}
+        base_digests = _archived_digests(zf)
+
+    partial = target.with_name(f'.{target.name}.tmp')
+    try:
+        with (open(base, 'rb') as base_fp, open(delta, 'rb') as delta_fp,
+              ZipWriter(partial) as writer):
+            for entry in manifest['entries']:
+                if entry['source'] == 'delta':
+                    writer.copy_from(delta_fp, delta_infos[entry['name']])
+                    continue
+
+                info = base_infos.get(entry['base_name'])
+                digest = base_digests.get(entry['base_name'])
+                sha256 = digest['sha256'] if digest else None
+                if (info is None or (info.CRC, info.file_size) != (entry['crc'], entry['size'])
+                        or entry.get('sha256') not in (None, sha256)):
+                    raise ValueError(
+                        f'Base archive does not match the delta pack: {entry['base_name']}')
+                info = copy.copy(info)
+                info.filename = entry['name']
+                info.date_time = tuple(entry['date_time'])
+                writer.copy_from(base_fp, info)
+    except BaseException:
+        partial.unlink(True)
+        raise
+
+    os.replace(partial, target)
+    return writer.entries
@@ -0,0 +1,553 @@
+"""Browser session management module.
+
+This module launches the headless Firefox sessions used by the URL resolvers
+in `url.py` and manages a pool of them, so that several claw prizes can be
+resolved concurrently.
+
+A resolver call can be given a hard deadline (see `watchdog`): a session still
+busy when it expires is killed, so the call fails instead of hanging, and the
+pool replaces the session. The pool also recycles sessions after a number of
+resolves, bounding the memory a long-lived browser accumulates.
+
+Sessions can use a lean profile, for resolvers that opt into it (see
+`url.lean`): the page load strategy is `eager`, images, web fonts and media
+are not loaded, and requests to URLs matching `BLOCKED_URLS` are refused. Every
+session records the network cost of the pages it visits, so the savings of the
+lean profile can be compared against the standard one.
+"""
+
+import contextlib
+import json
+import os
+import signal
+import threading
+import time
+from pathlib import Path
+from typing import Iterator, TypedDict
+from urllib.parse import quote
+
+import urllib3
+from selenium import webdriver
+from selenium.common.exceptions import (InvalidSessionIdException,
+                                        WebDriverException)
+from selenium.webdriver import Remote
+
+BLOCKED_URLS = [
+    '*google-analytics.com*',
+    '*googletagmanager.com*',
+    '*doubleclick.net*',
+    '*googlesyndication.com*',
+    '*facebook.net*',
+    '*hotjar.com*',
+    '*adobedtm.com*',
+    '*demdex.net*',
+    '*omtrdc.net*',
+    '*clarity.ms*',
+    '*bing.com*',
+    '*linkedin.com*',
+    '*tiktok.com*',
+    '*fonts.googleapis.com*',
+    '*fonts.gstatic.com*',
+    '*use.typekit.net*',
+    '*youtube.com*',
+    '*ytimg.com*',
+    '*vimeo.com*',
+]
+"""Shell-style patterns of URLs refused by lean sessions.
+
+Only the scheme and host of HTTPS URLs are visible to the matcher, so patterns
+of HTTPS resources should target hosts.
+"""
+
+LEAN_PREFERENCES = {
+    # images
+    'permissions.default.image': 2,
+    # web fonts
+    'gfx.downloadable_fonts.enabled': False,
+    # audio and video
+    'media.autoplay.default': 5,
+    'media.preload.default': 0,
+    'media.preload.auto': 0,
+    # trackers
+    'privacy.trackingprotection.enabled': True,
+    'privacy.trackingprotection.socialtracking.enabled': True,
+    'privacy.trackingprotection.cryptomining.enabled': True,
+    'privacy.trackingprotection.fingerprinting.enabled': True,
+}
+"""Firefox preferences of lean sessions.
+"""
+
+_JS_PAGE_COST = '''
+const navigation = performance.getEntriesByType('navigation')[0];
+const resources = performance.getEntriesByType('resource');
+return {
+    bytes: (navigation ? navigation.transferSize : 0)
+        + resources.reduce((total, entry) => total + entry.transferSize, 0),
+    requests: resources.length + 1,
+};
+'''
+"""Script returning the bytes transferred and the number of requests of the current page.
+"""
+
+
+class PageCost(TypedDict):
+    url: str
+    """URL of the page."""
+    bytes: int
+    """Bytes transferred for the page and its resources, as reported by the Resource Timing API."""
+    requests: int
+    """Number of requests made by the page."""
+    seconds: float
+    """Seconds the page took to load, until the browser handed control back."""
+    started: float
+    """Time the page load started, in seconds since the epoch."""
+    lean: bool
+    """Whether the page was loaded with the lean profile."""
+
+
+class Firefox(webdriver.Firefox):
+    """A Firefox session recording the network cost of every page it loads.
+    """
+
+    lean: bool
+    """Whether the session uses the lean profile.
+    """
+
+    def __init__(self, lean: bool = False, **kwargs):
+        super().__init__(**kwargs)
+        self.lean = lean
+        self._costs: list[PageCost] = []
+        self._loading: tuple[str, float, float] | None = None
+
+    def get(self, url: str) -> None:
+        self._record()
+        started = time.time()
+        super().get(url)
+        self._loading = (url, started, time.time() - started)
+
+    def page_costs(self) -> list[PageCost]:
+        """Take the costs of the pages loaded since the last call.
+
+        Returns:
+            list[PageCost]: Cost of each page, in loading order.
+        """
+        self._record()
+        costs, self._costs = self._costs, []
+        return costs
+
+    def _record(self):
+        if self._loading is None:
+            return
+
+        url, started, seconds = self._loading
+        self._loading = None
+        try:
+            cost = self.execute_script(_JS_PAGE_COST)
+        except WebDriverException:
+            return
+
+        self._costs.append({'url': url,
+                            'bytes': cost['bytes'],
+                            'requests': cost['requests'],
+                            'seconds': seconds,
+                            'started': started,
+                            'lean': self.lean})
+
+
+def _blocking_pac(patterns: list[str]) -> str:
+    """Build a proxy auto-config script refusing requests to the given URL patterns.
+
+    Matching requests are sent to the discard port of the loopback interface,
+    so they fail immediately.
+
+    Returns:
+        str: `data:` URL of the script.
+    """
+    script = ('function FindProxyForURL(url, host) {'
+              f'var blocked = {json.dumps(patterns)};'
+              'for (var i = 0; i < blocked.length; i++) {'
+              'if (shExpMatch(url, blocked[i])) return "PROXY 127.0.0.1:9";'
+              '}'
+              'return "DIRECT";'
+              '}')
+    return f'data:application/x-ns-proxy-autoconfig,{quote(script)}'
+
+
+def new_browser(lean: bool = False, profile_dir: str | Path | None = None,
+                page_load_timeout: float | None = None, blocked: list[str] = BLOCKED_URLS) -> Firefox:
+    """Launch a new headless Firefox session.
+
+    Args:
+        lean (bool): Use the lean profile. Defaults to False.
+        profile_dir (str | Path | None): Profile directory kept across runs, so
+            the HTTP cache of the browser is reused. Defaults to a temporary profile.
+        page_load_timeout (float | None): Maximum number of seconds a page may take to load.
+        blocked (list[str]): URL patterns refused by the lean profile.
+
+    Returns:
+        Firefox: The WebDriver session. The caller is responsible for quitting it.
+    """
+    options = webdriver.FirefoxOptions()
+    options.set_preference('intl.accept_languages', 'zh-Hant')
+    options.add_argument('--headless')
+
+    if lean:
+        options.page_load_strategy = 'eager'
+        for name, value in LEAN_PREFERENCES.items():
+            options.set_preference(name, value)
+        if blocked:
+            options.set_preference('network.proxy.type', 2)
+            options.set_preference(
+                'network.proxy.autoconfig_url', _blocking_pac(blocked))
+
+    if profile_dir:
+        Path(profile_dir).mkdir(parents=True, exist_ok=True)
+        options.add_argument('-profile')
+        options.add_argument(str(profile_dir))
+
+    driver = Firefox(lean, options=options)
+    if page_load_timeout:
+        driver.set_page_load_timeout(page_load_timeout)
+
+    return driver
+
+
+def kill(remote: Remote):
+    """Forcibly end a session, without waiting for the browser to answer.
+
+    The browser and driver processes are killed, so WebDriver calls blocked on
+    the session fail.
+    """
+    with contextlib.suppress(Exception):
+        if pid := remote.capabilities.get('moz:processID'):
+            os.kill(pid, getattr(signal, 'SIGKILL', signal.SIGTERM))
+    with contextlib.suppress(Exception):
+        remote.service.process.kill()
+
+
+def crashed(remote: Remote, e: Exception) -> bool:
+    """Whether an error raised by a WebDriver call means the session is gone.
+    """
+    if isinstance(e, (InvalidSessionIdException, urllib3.exceptions.HTTPError, ConnectionError)):
+        return True
+    process = getattr(getattr(remote, 'service', None), 'process', None)
+    return process is not None and process.poll() is not None
+
+
+class _Watchdog:
+    """Timer killing a session once its deadline expires, which can be suspended.
+    """
+
+    expired: threading.Event
+    """Set once the deadline has expired and the session was killed.
+    """
+
+    def __init__(self, remote: Remote, seconds: float):
+        self.expired = threading.Event()
+        self._remote = remote
+        self._remaining = seconds
+        self._lock = threading.Lock()
+        self._timer: threading.Timer | None = None
+        self._started = 0.0
+        # timers of earlier runs that fired while being stopped are ignored
+        self._generation = 0
+
+    def start(self):
+        """Run the rest of the deadline.
+        """
+        with self._lock:
+            if self._timer or self.expired.is_set():
+                return
+            self._generation += 1
+            self._started = time.monotonic()
+            self._timer = threading.Timer(self._remaining, self._expire, (self._generation,))
+            self._timer.daemon = True
+            self._timer.start()
+
+    def stop(self):
+        """Suspend the deadline, keeping the time left.
+        """
+        with self._lock:
+            if self._timer is None:
+                return
+            self._timer.cancel()
+            self._timer = None
+            self._generation += 1
+            self._remaining = max(0.0, self._remaining - (time.monotonic() - self._started))
+
+    def _expire(self, generation: int):
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._timer = None
+            self.expired.set()
+        kill(self._remote)
+
+
+_watchdogs = threading.local()
+
+
+@contextlib.contextmanager
+def watchdog(remote: Remote, seconds: float | None) -> Iterator[threading.Event]:
+    """Kill a session if the calls made within the context take too long.
+
+    The deadline does not run while the calls wait on something other than
+    the session, see `unwatched`.
+
+    Args:
+        remote (Remote): The session.
+        seconds (float | None): Deadline in seconds, or None for no deadline.
+
+    Yields:
+        threading.Event: Set once the deadline has expired and the session was
+            killed. The session cannot be used any more.
+    """
+    if not seconds:
+        yield threading.Event()
+        return
+
+    dog = _Watchdog(remote, seconds)
+    previous = getattr(_watchdogs, 'current', None)
+    _watchdogs.current = dog
+    dog.start()
+    try:
+        yield dog.expired
+    finally:
+        dog.stop()
+        _watchdogs.current = previous
+
+
+@contextlib.contextmanager
+def unwatched() -> Iterator[None]:
+    """Suspend the `watchdog` of the current thread, if any, while it waits on
+    something other than its session, such as a page loaded by another session.
+    """
+    dog: _Watchdog | None = getattr(_watchdogs, 'current', None)
+    if dog:
+        dog.stop()
+    try:
+        yield
+    finally:
+        if dog:
+            dog.start()
+
+
+@contextlib.contextmanager
+def get_browser():
+    driver = new_browser()
+
+    try:
+        yield driver
+    finally:
+        driver.quit()
+
+
+class PageCostBaseline:
+    """Costs of pages loaded with the standard profile, to compute the savings of the lean one.
+
+    The baseline is kept in memory, or persisted if a path is given.
+    """
+
+    def __init__(self, path: str | Path | None = None):
+        self.path = Path(path) if path else None
+        self._lock = threading.Lock()
+        self._costs: dict[str, PageCost] = {}
+
+        if self.path:
+            with contextlib.suppress(FileNotFoundError, ValueError):
+                with open(self.path) as f:
+                    self._costs = json.load(f)
+
+    def compare(self, cost: PageCost) -> tuple[int, float] | None:
+        """Record the cost of a page and compare a lean page load with the baseline.
+
+        Args:
+            cost (PageCost): Cost of a page.
+
+        Returns:
+            tuple[int, float] | None: Bytes and seconds saved compared to the last
+                standard load of the same page, or None if the page was loaded
+                with the standard profile or has no baseline.
+        """
+        with self._lock:
+            if not cost['lean']:
+                self._costs[cost['url']] = cost
+                if self.path:
+                    with open(self.path, 'w') as f:
+                        json.dump(self._costs, f)
+                return None
+
+            if (baseline := self._costs.get(cost['url'])) is None:
+                return None
+            return baseline['bytes'] - cost['bytes'], baseline['seconds'] - cost['seconds']
+
+
+class BrowserPool:
+    """A fixed-size pool of browser sessions.
+
+    Sessions are launched on demand, the first time a caller acquires one while
+    every launched session is busy, up to `size` sessions in total. Standard
+    and lean sessions share the pool; an idle session of the other kind is
+    quit to make room when the pool is full.
+
+    A session is quit instead of being returned to the pool when it was
+    discarded (see `discard`), or once it made `recycle_after` resolves.
+    """
+
+    size: int
+    """Maximum number of concurrent browser sessions.
+    """
+
+    lean: bool
+    """Whether callers asking for a lean session get one, rather than a standard session.
+    """
+
+    profile_dir: Path | None
+    """Directory of the browser profiles kept across runs, one per session, if any.
+    """
+
+    page_load_timeout: float | None
+    """Maximum number of seconds a page may take to load, if any.
+    """
+
+    baseline: PageCostBaseline
+    """Page costs of the standard profile.
+    """
+
+    recycle_after: int | None
+    """Number of resolves after which a session is quit when released, if any.
+    """
+
+    def __init__(self, size: int = 1, lean: bool = False, profile_dir: str | Path | None = None,
+                 page_load_timeout: float | None = None, recycle_after: int | None = None):
+        if size < 1:
+            raise ValueError('Browser pool size must be at least 1.')
+
+        self.size = size
+        self.lean = lean
+        self.profile_dir = Path(profile_dir) if profile_dir else None
+        self.page_load_timeout = page_load_timeout
+        self.baseline = PageCostBaseline(
+            self.profile_dir.joinpath('page-costs.json') if self.profile_dir else None)
+        self.recycle_after = recycle_after
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle: dict[bool, list[Remote]] = {False: [], True: []}
+        self._sessions: dict[Remote, Path | None] = {}
+        self._uses: dict[Remote, int] = {}
+        self._discarded: set[Remote] = set()
+        self._launching = 0
+        self._reserved: set[Path] = set()
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    @contextlib.contextmanager
+    def acquire(self, lean: bool = False) -> Iterator[Remote]:
+        """Borrow a browser session from the pool, blocking until one is free.
+
+        Args:
+            lean (bool): Ask for a lean session. Only honoured if the pool is `lean`.
+
+        Yields:
+            Remote: A browser session used exclusively by the caller.
+        """
+        lean = lean and self.lean
+
+        with self._slots:
+            with self._lock:
+                remote = self._idle[lean].pop() if self._idle[lean] else None
+                stale = None
+                if remote is None:
+                    if len(self._sessions) + self._launching >= self.size:
+                        stale = self._idle[not lean].pop()
+                        self._forget(stale)
+                    self._launching += 1
+
+            if remote is None:
+                try:
+                    # quit outside the lock, as it can take seconds
+                    if stale is not None:
+                        with contextlib.suppress(Exception):
+                            stale.quit()
+                    remote = self._launch(lean)
+                finally:
+                    with self._lock:
+                        self._launching -= 1
+
+            try:
+                yield remote
+            finally:
+                with self._lock:
+                    discarded = remote in self._discarded
+                    expired = (self.recycle_after is not None
+                               and self._uses.get(remote, 0) >= self.recycle_after)
+                    if not (discarded or expired):
+                        self._idle[lean].append(remote)
+                    else:
+                        self._sessions.pop(remote, None)
+                        self._uses.pop(remote, None)
+                        self._discarded.discard(remote)
+                if discarded:
+                    kill(remote)
+                elif expired:
+                    with contextlib.suppress(Exception):
+                        remote.quit()
+
+    def count(self, remote: Remote):
+        """Count a resolve made on a session, see `recycle_after`.
+        """
+        with self._lock:
+            self._uses[remote] = self._uses.get(remote, 0) + 1
+
+    def discard(self, remote: Remote):
+        """Mark a broken session, such as a killed one, to be dropped when released.
+        """
+        with self._lock:
+            self._discarded.add(remote)
+
+    def _launch(self, lean: bool) -> Remote:
+        """Launch a session, with its own profile directory if profiles are kept.
+        """
+        profile = None
+        if self.profile_dir:
+            # reserved until the session is registered, so concurrent launches pick different ones
+            with self._lock:
+                used = set(self._sessions.values()) | self._reserved
+                kind = 'lean' if lean else 'standard'
+                profile = next(path for n in range(self.size + 1)
+                               if (path := self.profile_dir.joinpath(f'{kind}-{n}')) not in used)
+                self._reserved.add(profile)
+
+        try:
+            remote = new_browser(lean, profile, self.page_load_timeout)
+            with self._lock:
+                self._sessions[remote] = profile
+        finally:
+            with self._lock:
+                self._reserved.discard(profile)
+        return remote
+
+    def _forget(self, remote: Remote):
+        """Remove a session from the pool, leaving it to the caller to quit. The
+        caller must hold the lock.
+        """
+        del self._sessions[remote]
+        self._uses.pop(remote, None)
+
+    def close(self):
+        """Quit every browser session launched by the pool.
+        """
+        with self._lock:
+            sessions = list(self._sessions)
+            self._sessions.clear()
+            self._uses.clear()
+            self._discarded.clear()
+            self._idle = {False: [], True: []}
+
+        for remote in sessions:
+            with contextlib.suppress(Exception):
+                remote.quit()
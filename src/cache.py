@@ -0,0 +1,390 @@
+"""Persistent download cache module.
+
+Downloaded files are stored by the SHA-256 hash of their content and indexed by
+URL together with the validators (ETag and Last-Modified) returned by the
+server, so a later run can revalidate them with a conditional request instead
+of downloading them again.
+
+Download URLs located by the resolvers in `url.py` are cached as well, for a
+limited time, so a run does not need to visit the vendor pages at all while
+every cached URL is fresh.
+"""
+
+import contextlib
+import functools
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Iterator, TypedDict
+
+import requests
+
+from manifest import FileDigest, ManifestItem
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+
+@contextlib.contextmanager
+def _file_lock(path: Path) -> Iterator[None]:
+    """Hold an exclusive lock on a lock file, against the other processes sharing it.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'a+b') as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                # gives up after about 10 seconds of retries
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class CacheEntry(TypedDict):
+    sha256: str
+    """SHA-256 hash of the cached file, which is also its key in the object store."""
+    fname: str
+    """Name of the downloaded file."""
+    etag: str | None
+    """ETag returned by the server."""
+    last_modified: str | None
+    """Last-Modified date returned by the server."""
+    crc32: int | None
+    """CRC-32 of the cached file, if it was computed."""
+
+
+class DownloadCache:
+    """A content-addressed store of downloaded files shared across runs and output directories.
+
+    Files are evicted in least recently used order once the store grows beyond
+    `capacity` bytes.
+
+    Concurrent runs may share the cache: the index is read again under a lock
+    file before every change, so the entries of the other runs are kept and
+    their use counts toward eviction.
+    """
+
+    root: Path
+    """Directory of the cache.
+    """
+
+    capacity: int
+    """Maximum total size of the cached files in bytes.
+    """
+
+    def __init__(self, root: str | Path, capacity: int):
+        self.root = Path(root)
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._urls: dict[str, CacheEntry] = {}
+        self._objects: dict[str, dict[str, float]] = {}
+
+    @property
+    def path_index(self) -> Path:
+        """Path to the index file.
+        """
+        return self.root.joinpath('index.json')
+
+    @contextlib.contextmanager
+    def _index(self) -> Iterator[None]:
+        """Hold the index against the other threads and processes, read again
+        with the changes they saved.
+        """
+        with self._lock, _file_lock(self.root.joinpath('index.lock')):
+            try:
+                with open(self.path_index) as f:
+                    index = json.load(f)
+                self._urls, self._objects = index['urls'], index['objects']
+            except (FileNotFoundError, ValueError, KeyError):
+                self._urls, self._objects = {}, {}
+            yield
+
+    @staticmethod
+    def hash_file(path: str | Path) -> str:
+        """Compute the SHA-256 hash of a file.
+        """
+        with open(path, 'rb') as f:
+            return hashlib.file_digest(f, 'sha256').hexdigest()
+
+    def path_object(self, sha256: str) -> Path:
+        """Path to the stored file with the given hash.
+        """
+        return self.root.joinpath('objects', sha256[:2], sha256)
+
+    def lookup(self, url: str) -> CacheEntry | None:
+        """Find the cached file of a URL.
+
+        A hit counts as a use of the file, so it is not the next one evicted
+        while it is being revalidated.
+
+        Args:
+            url (str): Download URL.
+
+        Returns:
+            CacheEntry | None: The cache entry, or None if the URL is not cached.
+        """
+        with self._index():
+            entry = self._urls.get(url)
+            obj = self._objects.get(entry['sha256']) if entry else None
+            if obj is None or not self.path_object(entry['sha256']).exists():
+                return None
+            obj['used'] = time.time()
+            self._save()
+            return entry
+
+    @staticmethod
+    def conditional_headers(entry: CacheEntry | ManifestItem | None) -> dict[str, str]:
+        """Build the request headers to revalidate a cache entry.
+
+        Args:
+            entry (CacheEntry | ManifestItem | None): The cache entry, or the
+                manifest record of a file already in place.
+
+        Returns:
+            dict[str, str]: `If-None-Match` and `If-Modified-Since` headers, as
+                far as the entry has validators.
+        """
+        headers = {}
+        if entry and entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def add(self, url: str, path: str | Path, fname: str, resp: requests.Response,
+            digest: FileDigest | None = None) -> CacheEntry:
+        """Store a downloaded file and index it by URL.
+
+        The file is hardlinked into the store when possible, so the caller can
+        still move or delete it afterward.
+
+        Args:
+            url (str): Download URL.
+            path (str | Path): Path to the downloaded file.
+            fname (str): Name of the downloaded file.
+            resp (requests.Response): Response the file was downloaded from.
+            digest (FileDigest | None): Checksums of the file computed while it
+                was downloaded, trusted instead of hashing the file again.
+
+        Returns:
+            CacheEntry: The new cache entry.
+        """
+        sha256 = digest['sha256'] if digest and digest['sha256'] else self.hash_file(path)
+        entry: CacheEntry = {'sha256': sha256,
+                             'fname': fname,
+                             'etag': resp.headers.get('ETag'),
+                             'last_modified': resp.headers.get('Last-Modified'),
+                             'crc32': digest['crc32'] if digest else None}
+
+        with self._index():
+            target = self.path_object(sha256)
+            if not target.exists():
+                target.parent.mkdir(parents=True, exist_ok=True)
+                self._link(path, target)
+
+            self._urls[url] = entry
+            self._objects[sha256] = {'size': target.stat().st_size,
+                                     'used': time.time()}
+            self._evict()
+            self._save()
+
+        return entry
+
+    def materialize(self, entry: CacheEntry, dest: str | Path) -> Path | None:
+        """Place a cached file at the given path, by hardlink or copy.
+
+        Args:
+            entry (CacheEntry): The cache entry.
+            dest (str | Path): Destination path.
+
+        Returns:
+            Path | None: The destination path, or None if the file was evicted
+                since the entry was looked up.
+        """
+        dest = Path(dest)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        dest.unlink(True)
+
+        with self._index():
+            obj = self._objects.get(entry['sha256'])
+            if obj is None:
+                return None
+            try:
+                self._link(self.path_object(entry['sha256']), dest)
+            except FileNotFoundError:
+                return None
+            obj['used'] = time.time()
+            self._save()
+
+        return dest
+
+    @staticmethod
+    def _link(source: Path, dest: Path):
+        try:
+            os.link(source, dest)
+        except OSError:
+            shutil.copyfile(source, dest)
+
+    def _evict(self):
+        """Remove least recently used files until the store fits its capacity.
+        """
+        total = sum(obj['size'] for obj in self._objects.values())
+
+        for sha256, obj in sorted(self._objects.items(), key=lambda item: item[1]['used']):
+            if total <= self.capacity:
+                break
+
+            self.path_object(sha256).unlink(True)
+            del self._objects[sha256]
+            total -= obj['size']
+
+            for url in [url for url, entry in self._urls.items() if entry['sha256'] == sha256]:
+                del self._urls[url]
+
+    def _save(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.path_index.with_suffix('.tmp'), 'w') as f:
+            json.dump({'urls': self._urls, 'objects': self._objects}, f)
+        os.replace(self.path_index.with_suffix('.tmp'), self.path_index)
+
+
+class UrlCache:
+    """A persisted cache of download URLs located by resolvers.
+
+    Entries are keyed by the resolver function and the arguments bound to it
+    with `functools.partial`. They expire after the TTL of the resolver (see
+    `url.cache_ttl`), or the cache-wide `ttl` if the resolver does not set one.
+
+    The cache file is read again under a lock file before every change, so
+    concurrent runs sharing it keep each other's entries.
+    """
+
+    path: Path
+    """Path to the cache file.
+    """
+
+    ttl: float
+    """Default number of seconds a resolved URL stays fresh.
+    """
+
+    def __init__(self, path: str | Path, ttl: float):
+        self.path = Path(path)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: dict[str, dict[str, str | float]] = {}
+        self._read()
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                self._entries = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self._entries = {}
+
+    @contextlib.contextmanager
+    def _changing(self) -> Iterator[None]:
+        """Hold the cache file against the other threads and processes, read
+        again with the changes they saved.
+        """
+        with self._lock, _file_lock(self.path.with_suffix('.lock')):
+            self._read()
+            yield
+
+    @staticmethod
+    def key(resolver: Callable) -> str:
+        """Build the cache key of a resolver.
+
+        Args:
+            resolver (Callable): Resolver function, possibly a `functools.partial`.
+
+        Returns:
+            str: Qualified name of the function and its bound arguments.
+        """
+        args, keywords = (), {}
+        if isinstance(resolver, functools.partial):
+            resolver, args, keywords = resolver.func, resolver.args, resolver.keywords
+
+        return (f'{resolver.__module__}.{resolver.__qualname__}('
+                f'{', '.join([repr(arg) for arg in args]
+                             + [f'{k}={v!r}' for k, v in sorted(keywords.items())])})')
+
+    def ttl_of(self, resolver: Callable) -> float:
+        """Number of seconds the URL located by a resolver stays fresh.
+        """
+        return getattr(getattr(resolver, 'func', resolver), 'ttl', self.ttl)
+
+    def get(self, resolver: Callable) -> str | None:
+        """Find the fresh cached URL of a resolver.
+
+        Args:
+            resolver (Callable): Resolver function.
+
+        Returns:
+            str | None: The cached URL, or None if it is missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(self.key(resolver))
+
+        if entry and time.time() - entry['resolved_at'] < self.ttl_of(resolver):
+            return entry['url']
+        return None
+
+    def resolved_at(self, resolver: Callable) -> float | None:
+        """Time the cached URL of a resolver was located, in seconds since the epoch.
+
+        Args:
+            resolver (Callable): Resolver function.
+
+        Returns:
+            float | None: The time, or None if the resolver has no cached URL.
+        """
+        with self._lock:
+            entry = self._entries.get(self.key(resolver))
+        return entry['resolved_at'] if entry else None
+
+    def put(self, resolver: Callable, url: str) -> None:
+        """Cache the URL located by a resolver.
+
+        Args:
+            resolver (Callable): Resolver function.
+            url (str): Download URL.
+        """
+        with self._changing():
+            self._entries[self.key(resolver)] = {'url': url,
+                                                 'resolved_at': time.time()}
+            self._save()
+
+    def invalidate(self, resolver: Callable) -> None:
+        """Remove the cached URL of a resolver.
+
+        Args:
+            resolver (Callable): Resolver function.
+        """
+        with self._changing():
+            if self._entries.pop(self.key(resolver), None):
+                self._save()
+
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path.with_suffix('.tmp'), 'w') as f:
+            json.dump(self._entries, f)
+        os.replace(self.path.with_suffix('.tmp'), self.path)
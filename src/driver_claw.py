@@ -1,41 +1,45 @@
 """Driver clawing and download automation module.
 """
 
+import asyncio
+import collections
 import contextlib
 import functools
-import glob
 import importlib.util
+import itertools
 import json
-import os
+import math
 import pickle
+import queue
 import re
 import shutil
 import sys
-import tempfile
+import threading
+import time
+import weakref
+from concurrent.futures import Future
 from pathlib import Path
-from typing import Callable, Literal, TypedDict
+from typing import Any, Callable, Hashable, Literal, TypedDict
 from urllib.parse import urlparse
 
 import requests
-from selenium import webdriver
 from selenium.webdriver import Remote
 from tqdm import tqdm
 
 import archive
+import transfer
+from browser import BrowserPool, PageCost, crashed, watchdog
+from cache import DownloadCache, UrlCache
+from engine import DownloadEngine, RangeError, Response, Throughput
+from manifest import FileDigest, Hasher, Manifest, ManifestItem
+from retry import Backoff, CircuitBreaker, retry_after, transient
+from tracing import Tracer
+from url import budget_of, fast_path_of, lean_of, snapshots, track_waits
 
 
-@contextlib.contextmanager
-def get_browser():
-    options = webdriver.FirefoxOptions()
-    options.set_preference('intl.accept_languages', 'zh-Hant')
-    options.add_argument('--headless')
-
-    driver = webdriver.Firefox(options=options)
-
-    try:
-        yield driver
-    finally:
-        driver.quit()
+RESOLVE_ATTEMPTS = 2
+"""Number of browser sessions an item is tried on when its session hangs or crashes.
+"""
 
 
 class ClawPrize(TypedDict):
@@ -55,12 +59,138 @@ class DriverClaw:
     """Directory to save downloaded files.
     """
 
+    browsers: int
+    """Number of browser sessions used to resolve download URLs concurrently.
+    """
+
+    downloaders: int
+    """Number of concurrent downloads, run by the `engine`.
+    """
+
+    extractors: int
+    """Number of downloaded files extracted and organized concurrently.
+    """
+
+    queue_size: int
+    """Maximum number of items waiting between two pipeline stages.
+    """
+
+    segments: int
+    """Number of concurrent byte range requests used to download a large file.
+    """
+
+    segment_threshold: int
+    """Minimum file size in bytes for a download to be segmented.
+    """
+
+    retries: int
+    """Number of times an interrupted download is resumed within a run.
+    """
+
+    cache: DownloadCache | None
+    """Persistent cache of downloaded files, if any.
+    """
+
+    client: transfer.HttpClient
+    """HTTP settings shared by the downloads and the browserless fast paths.
+    """
+
+    engine: DownloadEngine
+    """Engine running the downloads.
+    """
+
+    throughput: Throughput
+    """Bytes downloaded and download rates overall and per host, in the last run.
+    """
+
+    crc32: bool
+    """Whether the CRC-32 of downloaded and extracted files is computed along with their SHA-256 hash.
+    """
+
+    manifest: Manifest
+    """Integrity manifest of the destination directory, updated as items are organized.
+    """
+
+    incremental: bool
+    """Whether items left in the destination directory by a previous run are
+    kept when the download URL and the validators of the server still match
+    their manifest record.
+    """
+
+    wait_times: dict[int, float]
+    """Seconds spent waiting for vendor pages to be ready, by item index, in the last run.
+    """
+
+    url_cache: UrlCache | None
+    """Persistent cache of resolved download URLs, if any.
+    """
+
+    lean_browser: bool
+    """Whether resolvers opting into the lean browser profile (see `url.lean`) get it.
+    """
+
+    browser_profile: Path | None
+    """Directory of the browser profiles kept across runs, if any.
+    """
+
+    page_load_timeout: float | None
+    """Maximum number of seconds a vendor page may take to load, if any.
+    """
+
+    resolve_timeout: float | None
+    """Maximum number of seconds a resolver may run on a browser session before
+    the session is killed, if any.
+    """
+
+    recycle_after: int | None
+    """Number of resolves after which a browser session is replaced, if any.
+    """
+
+    resolve_retries: int
+    """Number of times locating a download URL is retried after a failure.
+    """
+
+    download_retries: int
+    """Number of times a download failing with a transient error (see
+    `retry.transient`) is retried, on top of resuming interrupted transfers.
+    """
+
+    backoff: Backoff
+    """Delays between the attempts of an item.
+    """
+
+    breaker: CircuitBreaker
+    """Failure tracking of vendor and download hosts, shared by URL resolution and downloads.
+    """
+
+    tracer: Tracer
+    """Recorder of the timing of every phase of a run.
+    """
+
+    page_costs: dict[int, list[PageCost]]
+    """Network cost of the vendor pages loaded to resolve each item, by item index, in the last run.
+    """
+
+    stream: archive.ArchiveStream | None
+    """Archive the items are written to directly, instead of the destination directory, if any.
+    """
+
+    keep_tree: bool
+    """Whether items written to the `stream` are also organized into the destination directory.
+    """
+
     @property
     def path_error_log(self) -> Path:
         """Path to the error log file.
         """
         return self.dest.joinpath('.failscrapes.pkl')
 
+    @property
+    def path_partials(self) -> Path:
+        """Directory of partially downloaded files, kept to resume them later.
+        """
+        return self.dest.joinpath('.partial')
+
     @staticmethod
     def load_json(path: str | Path) -> dict[str, list[ClawPrize]]:
         """Load driver configuration from a JSON file.
@@ -93,8 +223,48 @@ class DriverClaw:
         with open(path, 'rb') as f:
             return pickle.load(f)
 
-    def __init__(self, destination: str | Path):
+    def __init__(self, destination: str | Path, *, browsers: int = 1, downloaders: int = 2, extractors: int = 1,
+                 queue_size: int = 4,
+                 segments: int = 4, segment_threshold: int = 64 * 1024 * 1024, retries: int = 2,
+                 cache: DownloadCache | None = None, url_cache: UrlCache | None = None,
+                 lean_browser: bool = False, browser_profile: str | Path | None = None,
+                 page_load_timeout: float | None = None, stream: archive.ArchiveStream | None = None,
+                 keep_tree: bool = False, client: transfer.HttpClient | None = None,
+                 bandwidth: float | None = None, crc32: bool = False, incremental: bool = False,
+                 resolve_timeout: float | None = None, recycle_after: int | None = None,
+                 resolve_retries: int = 2, download_retries: int = 2, backoff: Backoff | None = None,
+                 breaker: CircuitBreaker | None = None, tracer: Tracer | None = None):
         self.dest = Path(destination)
+        self.browsers = browsers
+        self.downloaders = downloaders
+        self.extractors = extractors
+        self.queue_size = queue_size
+        self.segments = segments
+        self.segment_threshold = segment_threshold
+        self.retries = retries
+        self.cache = cache
+        self.url_cache = url_cache
+        self.lean_browser = lean_browser
+        self.browser_profile = Path(browser_profile) if browser_profile else None
+        self.page_load_timeout = page_load_timeout
+        self.resolve_timeout = resolve_timeout
+        self.recycle_after = recycle_after
+        self.resolve_retries = resolve_retries
+        self.download_retries = download_retries
+        self.backoff = backoff or Backoff()
+        self.breaker = breaker or CircuitBreaker()
+        self.tracer = tracer or Tracer()
+        self.stream = stream
+        self.keep_tree = keep_tree
+        self.client = client or transfer.HttpClient()
+        self.engine = DownloadEngine(self.client, downloaders, bandwidth)
+        self.crc32 = crc32
+        self.manifest = Manifest(self.dest)
+        self.incremental = incremental
+        self.wait_times = {}
+        self.page_costs = {}
+        self.throughput = self.engine.throughput()
+        self._transfers: weakref.WeakValueDictionary[str, asyncio.Lock] = weakref.WeakValueDictionary()
 
     def load_failed(self):
         """Load previously failed downloads from the error log.
@@ -105,6 +275,21 @@ class DriverClaw:
     def start(self, targets: dict[str, list[ClawPrize]], on_error: Literal['exit', 'log', 'ignore']) -> dict[str, list[ClawPrize]]:
         """Start downloading drivers based on provided targets.
 
+        Items flow through three concurrent stages: URL resolution on the browser
+        pool, downloading on the `engine` and organizing, fed through a bounded
+        queue. Each stage has its own number of workers, so scraping, network
+        transfer and extraction of different items overlap. Downloads waiting for
+        the engine start longest first.
+
+        Browser sessions are only launched when an item actually needs one, so a
+        run where every URL is given, fresh in the `url_cache` or located by a
+        browserless fast path (see `url.fast_path`) starts none.
+
+        Failed items are retried within the run after a backoff delay, during
+        which other items go ahead, and requests to a host that keeps failing
+        are held back (see `breaker`). Only the items still failing after their
+        retries are reported.
+
         Args:
             targets (dict[str, list[ClawPrize]]): Driver configurations by category.
             on_error (Literal['exit', 'log', 'ignore']): Error handling mode.
@@ -112,50 +297,477 @@ class DriverClaw:
         Returns:
             dict[str, list[ClawPrize]]: Dictionary of failed downloads claw configurations by category.
         """
-        failed_downloads: dict[str, list[ClawPrize]] = {}
+        scrape_items = [{**item, 'category': category}
+                        for category, items in targets.items()
+                        for item in items]
+
+        # the error log is written there even if no item gets organized
+        self.dest.mkdir(parents=True, exist_ok=True)
 
-        with get_browser() as browser:
-            scrape_items = [{**item, 'category': category}
-                            for category, items in targets.items()
-                            for item in items]
+        started = time.time()
+        for i, item in enumerate(scrape_items):
+            self.tracer.label(i, f'[{item['category']}] {item['path']}')
+
+        snapshots.clear()
+        self.wait_times = {}
+        self.page_costs = {}
+        stop = threading.Event()
+        errors: dict[int, Exception] = {}
+        resolved: dict[int, float] = {}
+        # download URL of each item, and whether it came from the URL cache
+        sources: dict[int, tuple[str, bool]] = {}
+        resolve_tries: collections.Counter[int] = collections.Counter()
+        download_tries: collections.Counter[int] = collections.Counter()
+        # resolution lanes by the monotonic time they may start at
+        lanes: queue.PriorityQueue[tuple[float, int, list[int] | None]] = queue.PriorityQueue()
+        order = itertools.count()
+        page_hosts: dict[Callable, str] = {}
+        entered: set[int] = set()
+        downloads: list[Future[tuple[Path, str, ManifestItem] | None]] = []
+        downloaded: queue.Queue[tuple[int, Future[tuple[Path, str, ManifestItem] | None], bool] | None] = queue.Queue()
+        collected = threading.Semaphore(0)
+        to_organize: queue.Queue[tuple[int, tuple[Path, str, ManifestItem]] | None] = queue.Queue(
+            self.queue_size)
+
+        def enter(i: int):
+            print(f'Processing {i+1:>2}/{len(scrape_items)}: '
+                  f'[{scrape_items[i]['category']}] {scrape_items[i]['path']}')
+
+        def report(i: int, message: str):
+            print(f'{i+1:>2}/{len(scrape_items)} {message}')
+
+        def fail(i: int, e: Exception):
+            errors[i] = e
+            report(i, f'┴ Failed: {e}')
+            if on_error == 'exit':
+                stop.set()
+                for future in list(downloads):
+                    future.cancel()
+
+        def measure(i: int, remote: Remote):
+            self.page_costs[i] = remote.page_costs()
+            for cost in self.page_costs[i]:
+                self.tracer.record('resolve.page_load', i, cost['started'], cost['seconds'], url=cost['url'],
+                                   bytes=cost['bytes'], requests=cost['requests'], lean=cost['lean'])
+                message = (f'├ Loaded {cost['url']}: {cost['bytes'] / 1024:.0f} KiB '
+                           f'in {cost['requests']} requests, {cost['seconds']:.1f}s')
+                if saved := pool.baseline.compare(cost):
+                    message += f' (saved {saved[0] / 1024:.0f} KiB, {saved[1]:.1f}s)'
+                report(i, message)
+
+        def host_of(resolver: Callable[[Remote], str]) -> str | None:
+            if url := getattr(resolver, 'keywords', {}).get('url'):
+                return urlparse(url).netloc
+            return page_hosts.get(getattr(resolver, 'func', resolver))
+
+        def defer(lane: list[int], delay: float):
+            lanes.put((time.monotonic() + delay, next(order), lane))
+
+        def schedule():
+            while (job := lanes.get())[2] is not None:
+                ready_at, _, lane = job
+                try:
+                    stop.wait(ready_at - time.monotonic())
+                    resolve(lane)
+                finally:
+                    lanes.task_done()
+
+        def resolve(lane: list[int]):
+            with contextlib.ExitStack() as lease:
+                remote = None
+                for n, i in enumerate(lane):
+                    if stop.is_set():
+                        return
+                    resolver = scrape_items[i]['url']
+                    started, details = time.time(), {'attempt': resolve_tries[i]}
+                    try:
+                        if i not in entered:
+                            entered.add(i)
+                            enter(i)
+                        report(i, '├ Locating download URL...')
+                        url = self.url_cache.get(
+                            resolver) if self.url_cache else None
+                        if cached := url is not None:
+                            details['source'] = 'cache'
+                            report(i, '├ Using cached download URL.')
+                        elif url := self._fast_path(resolver, session):
+                            details['source'] = 'fast_path'
+                            report(i, '├ Located without a browser.')
+                            if self.url_cache:
+                                self.url_cache.put(resolver, url)
+                        else:
+                            if (wait := self.breaker.retry_in(host := host_of(resolver))) > 0:
+                                report(i, f'├ {host} keeps failing, coming back in {wait:.0f}s.')
+                                details['deferred'] = wait
+                                defer(lane[n:], wait)
+                                return
+                            details['source'] = 'browser'
+                            for attempt in range(RESOLVE_ATTEMPTS):
+                                if remote is None:
+                                    with self.tracer.span('resolve.browser', i, lean=lean_of(resolver)):
+                                        remote = lease.enter_context(pool.acquire(lean_of(resolver)))
+                                pool.count(remote)
+                                try:
+                                    url, waited = self._browse(resolver, remote, i)
+                                    break
+                                except Exception as e:
+                                    if not (isinstance(e, TimeoutError) or crashed(remote, e)):
+                                        with contextlib.suppress(Exception):
+                                            page_hosts[getattr(resolver, 'func', resolver)] = \
+                                                urlparse(remote.current_url).netloc
+                                        raise
+                                    # release the dead session, the pool drops it
+                                    pool.discard(remote)
+                                    lease.close()
+                                    remote = None
+                                    if attempt == RESOLVE_ATTEMPTS - 1:
+                                        raise
+                                    report(i, f'├ Browser session lost ({e}), retrying on a new session...')
+                            self.breaker.success(host_of(resolver))
+                            self.wait_times[i] = waited
+                            measure(i, remote)
+                            report(i, f'├ Located after waiting {waited:.1f}s for the page.')
+                            if self.url_cache:
+                                self.url_cache.put(resolver, url)
+                    except Exception as e:
+                        details['error'] = str(e)
+                        if self.breaker.failure(host := host_of(resolver)):
+                            report(i, f'├ {host} keeps failing, pausing it for {self.breaker.cooldown:.0f}s.')
+                        if resolve_tries[i] >= self.resolve_retries:
+                            fail(i, e)
+                            continue
+                        delay = max(self.backoff.delay(resolve_tries[i]), self.breaker.retry_in(host))
+                        resolve_tries[i] += 1
+                        report(i, f'├ {e}. Retrying in {delay:.1f}s...')
+                        defer(lane[n:], delay)
+                        return
+                    finally:
+                        self.tracer.record('resolve', i, started, time.time() - started, **details)
+                    download(i, url, cached)
+
+        def download(i: int, url: str, cached: bool = False, delay: float = 0):
+            if stop.is_set():
+                return
+            sources[i] = url, cached
+            if (wait := self.breaker.retry_in(urlparse(url).netloc)) > delay:
+                report(i, f'├ {urlparse(url).netloc} keeps failing, coming back in {wait:.0f}s.')
+                delay = wait
+            resolved[i] = (cached and self.url_cache.resolved_at(scrape_items[i]['url'])) or time.time()
+            known = self.manifest.items.get(key := self._key(scrape_items[i]))
+            if not (self.incremental and known and known['url'] == url and self.manifest.intact(key)):
+                known = None
+            report(i, '├ Checking for changes...' if known else '├ Downloading...')
+            submitted, details = time.time(), {'url': url, 'attempt': download_tries[i]}
+
+            async def job() -> tuple[Path, str, ManifestItem] | None:
+                started = time.time()
+                self.tracer.record('download.queue', i, submitted, started - submitted, delay=delay)
+                try:
+                    result = await self._download(
+                        url, scrape_items[i]['file_type'], f'{i+1:>2}/{len(scrape_items)}', known, details)
+                    details['bytes'] = result[2]['download']['size'] if result else 0
+                    return result
+                except BaseException as e:
+                    details['error'] = str(e)
+                    raise
+                finally:
+                    self.tracer.record('download', i, started, time.time() - started, **details)
 
-            for i, item in enumerate(scrape_items):
-                category = item['category']
-                fullpath = self.dest.joinpath(category, item['path'])
-                fullpath.mkdir(parents=True, exist_ok=True)
+            future = self.engine.submit(url, job, delay)
+            downloads.append(future)
+            future.add_done_callback(lambda future: downloaded.put((i, future, cached)))
 
+        def collect(i: int, future: Future[tuple[Path, str, ManifestItem] | None], cached: bool):
+            item = scrape_items[i]
+            try:
+                if stop.is_set():
+                    if not future.cancelled() and future.exception() is None and future.result():
+                        future.result()[0].unlink(True)
+                    return
                 try:
-                    print(f'Processing {i+1:>2}/{len(scrape_items)}: '
-                          f'[{category}] {item['path']}')
+                    result = future.result()
+                    self.breaker.success(urlparse(sources[i][0]).netloc)
+                    if result is None:
+                        self.manifest.put(self._key(item), {**self.manifest.items[self._key(item)],
+                                                            'resolved_at': resolved[i]})
+                        report(i, '┴ Unchanged, kept.')
+                        return
+                except (ValueError, requests.HTTPError) as e:
+                    if not cached or not self._is_stale(e):
+                        raise
+                    report(i, '├ Cached download URL is stale, locating again...')
+                    self.url_cache.invalidate(item['url'])
+                    # located again on a resolve thread, like a cache miss, and
+                    # queued before this attempt is counted as collected
+                    defer([i], 0)
+                    return
+                to_organize.put((i, result))
+            except Exception as e:
+                url, cached = sources[i]
+                if not transient(e):
+                    fail(i, e)
+                    return
+                if self.breaker.failure(host := urlparse(url).netloc):
+                    report(i, f'├ {host} keeps failing, pausing it for {self.breaker.cooldown:.0f}s.')
+                if download_tries[i] >= self.download_retries or stop.is_set():
+                    fail(i, e)
+                    return
+                delay = max(self.backoff.delay(download_tries[i]), retry_after(e))
+                download_tries[i] += 1
+                report(i, f'├ {e}. Retrying in {delay:.1f}s...')
+                # queued before this attempt is counted as collected
+                download(i, url, cached, delay)
+            finally:
+                collected.release()
 
-                    print('├ Locating download URL...')
-                    url = (item['url']
-                           if type(item['url']) is str
-                           else item['url'](browser))
+        def organize(i: int, downloaded: tuple[Path, str, ManifestItem]):
+            item = scrape_items[i]
+            source, fname, record = downloaded
+            try:
+                if stop.is_set():
+                    return
+                path = self.dest.joinpath(item['category'], item['path'])
+                # the files of a previous version of the item
+                self.manifest.discard(self._key(item))
+                with self.tracer.span('organize', i, stream=self.stream is not None) as span:
+                    if self.stream:
+                        report(i, '├ Writing downloaded file to the archive...')
+                        files = self.archive(source, fname, item['file_type'], item['rename_as'],
+                                             f'{self.dest.name}/{item['category']}/{item['path']}',
+                                             path if self.keep_tree else None, record['download'])
+                    else:
+                        report(i, '├ Organizing downloaded file...')
+                        files = self.organize(source, fname, item['file_type'], item['rename_as'], path,
+                                              record['download'])
+                    span['files'] = len(files)
+                self.manifest.put(self._key(item),
+                                  {**record, 'resolved_at': resolved[i], 'files': files})
+            except Exception as e:
+                fail(i, e)
+            else:
+                report(i, '┴ Completed.')
+            finally:
+                source.unlink(True)
 
-                    print('├ Downloading...')
-                    self.download_and_save(
-                        url, item['file_type'], item['rename_as'], fullpath)
-                except Exception as e:
-                    print(f'┴ Failed: {e}')
+        session = self.client.session
+        try:
+            with BrowserPool(self.browsers, self.lean_browser, self.browser_profile,
+                             self.page_load_timeout, self.recycle_after) as pool:
+                collectors = self._run_stage(downloaded, collect, 1)
+                organizers = self._run_stage(
+                    to_organize, organize, self.extractors)
 
-                    if on_error == 'exit':
-                        sys.exit(1)
-                    if on_error == 'log':
-                        failed_downloads.setdefault(category, [])
-                        failed_downloads[category].append(item)
-                    continue
+                resolvers = [threading.Thread(target=schedule, daemon=True)
+                             for _ in range(self.browsers)]
+                for lane in self._lanes(scrape_items):
+                    defer(lane, 0)
+                for thread in resolvers:
+                    thread.start()
 
-                print('┴ Completed.')
+                for i, item in enumerate(scrape_items):
+                    if type(item['url']) is str:
+                        enter(i)
+                        download(i, item['url'])
+
+                # lanes deferred by a retry are queued before their attempt is
+                # done, and downloads are submitted before their lane is done,
+                # so neither stage has work left once both are drained in a row
+                done = 0
+                while True:
+                    lanes.join()
+                    # waiting for the futures themselves could miss the last ones,
+                    # as waiters are woken before done callbacks are run
+                    while done < len(downloads):
+                        collected.acquire()
+                        done += 1
+                    if not lanes.unfinished_tasks:
+                        break
+                for _ in resolvers:
+                    lanes.put((math.inf, next(order), None))
+                for thread in resolvers:
+                    thread.join()
+
+                for stage, workers in ((downloaded, collectors), (to_organize, organizers)):
+                    for _ in workers:
+                        stage.put(None)
+                    for worker in workers:
+                        worker.join()
+        finally:
+            self.throughput = self.engine.throughput()
+            self.engine.close()
+
+        self.tracer.record('run', None, started, time.time() - started, items=len(scrape_items),
+                           failed=len(errors), bytes=self.throughput['bytes'])
+
+        if downloads:
+            print(f'Downloaded {self.throughput['bytes'] / 1024 ** 2:.1f} MiB '
+                  f'at {self.throughput['rate'] / 1024 ** 2:.1f} MiB/s')
+            for host, rate in sorted(self.throughput['hosts'].items()):
+                print(f'  {host}: {rate['bytes'] / 1024 ** 2:.1f} MiB '
+                      f'at {rate['rate'] / 1024 ** 2:.1f} MiB/s')
+
+        if stop.is_set():
+            sys.exit(1)
+
+        failed_downloads: dict[str, list[ClawPrize]] = {}
+        if on_error == 'log':
+            for i in sorted(errors):
+                failed_downloads.setdefault(scrape_items[i]['category'], [])
+                failed_downloads[scrape_items[i]['category']].append(
+                    scrape_items[i])
 
         if on_error == 'log' and len(failed_downloads) > 0:
             self._dump_failed(failed_downloads)
 
         if len(failed_downloads) == 0:
             self.path_error_log.unlink(True)
+            shutil.rmtree(self.path_partials, ignore_errors=True)
 
         return failed_downloads
 
+    def _browse(self, resolver: Callable[[Remote], str], remote: Remote, item: int | None = None) -> tuple[str, float]:
+        """Locate a download URL on a browser session, within `resolve_timeout`.
+
+        Args:
+            resolver (Callable[[Remote], str]): The resolver.
+            remote (Remote): The browser session.
+            item (int | None): Index of the item, under which the waits are traced.
+
+        Returns:
+            tuple[str, float]: The download URL, and the number of seconds spent
+                waiting for pages to be ready.
+
+        Raises:
+            TimeoutError: If the resolver ran out of time. The session was killed
+                and cannot be used any more.
+        """
+        with track_waits(budget_of(resolver)) as ledger, watchdog(remote, self.resolve_timeout) as expired:
+            try:
+                return resolver(remote), ledger.waited
+            finally:
+                for start, seconds in ledger.waits:
+                    self.tracer.record('resolve.wait', item, start, seconds)
+                if expired.is_set():
+                    raise TimeoutError(f'Gave up locating the download URL after {self.resolve_timeout:g}s.')
+
+    @staticmethod
+    def _key(item: ClawPrize) -> str:
+        """Key of the manifest record of an item, the path of its directory relative to the destination.
+        """
+        return f'{item['category']}/{item['path']}'
+
+    def prune(self, targets: dict[str, list[ClawPrize]]) -> list[str]:
+        """Delete the items of the destination directory missing from a configuration.
+
+        Args:
+            targets (dict[str, list[ClawPrize]]): Driver configurations by category.
+
+        Returns:
+            list[str]: Paths of the directories of the deleted items, relative
+                to the destination.
+        """
+        return self.manifest.prune({self._key({**item, 'category': category})
+                                    for category, items in targets.items()
+                                    for item in items})
+
+    @staticmethod
+    def _fast_path(resolver: Callable[[Remote], str], session: requests.Session) -> str | None:
+        """Locate a download URL without a browser, if the resolver has a fast path.
+
+        Args:
+            resolver (Callable[[Remote], str]): Resolver of the item.
+            session (requests.Session): HTTP session shared by the fast paths.
+
+        Returns:
+            str | None: The download URL, or None if the resolver needs a browser.
+        """
+        if (fast := fast_path_of(resolver)) is None:
+            return None
+        try:
+            return fast(session)
+        except Exception:
+            return None
+
+    @staticmethod
+    def _is_stale(e: Exception) -> bool:
+        """Check whether a download failed because its URL went stale.
+
+        Args:
+            e (Exception): Error raised by `download`.
+
+        Returns:
+            bool: True if the server answered with an HTML page or reported the file as gone.
+        """
+        if isinstance(e, requests.HTTPError):
+            return e.response is not None and e.response.status_code in (404, 410)
+        return isinstance(e, ValueError)
+
+    @staticmethod
+    def _lanes(items: list[ClawPrize]) -> list[list[int]]:
+        """Group items that require a browser into resolution lanes.
+
+        Each lane is resolved one item after another on a single browser session.
+        Items whose resolver is marked as stateful (see `url.stateful`) share one
+        lane in configuration order, and so do items whose resolver has a page
+        affinity (see `url.page_affinity`) and the same `url` argument. Every
+        other item gets a lane of its own.
+
+        Args:
+            items (list[ClawPrize]): Claw prizes to resolve.
+
+        Returns:
+            list[list[int]]: Indices of the items in each lane.
+        """
+        lanes: list[list[int]] = []
+        pinned: dict[Hashable, list[int]] = {}
+
+        for i, item in enumerate(items):
+            if type(item['url']) is str:
+                continue
+
+            resolver, keywords = item['url'], {}
+            while isinstance(resolver, functools.partial):
+                resolver, keywords = resolver.func, {
+                    **resolver.keywords, **keywords}
+
+            if getattr(resolver, 'stateful', False):
+                key = resolver
+            elif getattr(resolver, 'page_affinity', False):
+                key = (resolver, keywords.get('url'))
+            else:
+                lanes.append([i])
+                continue
+
+            if key not in pinned:
+                lanes.append(pinned.setdefault(key, []))
+            pinned[key].append(i)
+
+        return lanes
+
+    @staticmethod
+    def _run_stage(source: queue.Queue, func: Callable[..., None], workers: int) -> list[threading.Thread]:
+        """Start the worker threads of a pipeline stage.
+
+        Every worker takes jobs from `source` until it receives `None`.
+
+        Args:
+            source (queue.Queue): Queue of argument tuples for `func`.
+            func (Callable[..., None]): Function processing a single job.
+            workers (int): Number of worker threads.
+
+        Returns:
+            list[threading.Thread]: The started worker threads.
+        """
+        def work():
+            while (job := source.get()) is not None:
+                func(*job)
+
+        threads = [threading.Thread(target=work, daemon=True)
+                   for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        return threads
+
     def download_and_save(self, url: str, file_type: Literal['exe', 'zip', 'zip/exe', 'zip/folder'], rename_as: str | None,  path: str | Path) -> None:
         """Download and save a file from a URL, organizing it based on file type.
 
@@ -170,49 +782,278 @@ class DriverClaw:
             RuntimeError: If zip extraction fails.
             NotImplementedError: If multiple executables are found in zip/exe.
         """
-        path = Path(path)
-        headers = {} if 'sourceforge' in url or 'geeks3d' in url else {
-            'referer': urlparse(url).hostname,
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:138.0) Gecko/20100101 Firefox/138.0'
-        }
+        temp, fname, record = self.download(url, file_type)
+        try:
+            print('├ Organizing downloaded file...')
+            self.organize(temp, fname, file_type, rename_as, path, record['download'])
+        finally:
+            temp.unlink(True)
+
+    def download(self, url: str, file_type: Literal['exe', 'zip', 'zip/exe', 'zip/folder'], desc: str | None = None,
+                 known: ManifestItem | None = None) -> tuple[Path, str, ManifestItem] | None:
+        """Download a file from a URL into a temporary file, on the `engine`.
+
+        The file is first downloaded as a partial file under the output directory. If a
+        transfer is interrupted, it is retried up to `retries` times, resuming from
+        the bytes already received when the server supports byte ranges and the
+        resource has not changed. A partial file left by a failed run is resumed
+        the same way, e.g. when retrying with `load_failed`.
+
+        With a `cache`, the request is made conditional on the validators of the
+        cached file, which is reused if the server reports it as not modified.
+
+        The file is hashed while it is written (see `transfer.Partial`), and a
+        cached file is not hashed again.
+
+        With a `known` manifest record of the same URL, the request is made
+        conditional on its validators instead, and nothing is downloaded if the
+        server reports the file as not modified, or answers with the same
+        validators and size.
+
+        Args:
+            url (str): Download URL.
+            file_type (Literal["exe", "zip", "zip/exe", "zip/folder"]): Type of file.
+            desc (str | None): Optional label of the progress bar.
+            known (ManifestItem | None): Manifest record of the file already in place, if any.
+
+        Returns:
+            tuple[Path, str, ManifestItem] | None: Path to the temporary file,
+                which the caller is responsible for deleting, the name of the
+                downloaded file, and its manifest record, with no `files` and
+                the time of the download as `resolved_at`. None if the `known`
+                file did not change.
+
+        Raises:
+            ValueError: If the response is an HTML page.
+        """
+        return self.engine.submit(url, functools.partial(self._download, url, file_type, desc, known)).result()
+
+    async def _download(self, url: str, file_type: Literal['exe', 'zip', 'zip/exe', 'zip/folder'], desc: str | None,
+                        known: ManifestItem | None = None,
+                        details: dict[str, Any] | None = None) -> tuple[Path, str, ManifestItem] | None:
+        """Coroutine of `download`, run by the `engine`.
+
+        `details` of the download span are told whether the file was served
+        from the download cache.
+        """
+        # downloads of the same URL share a partial file, so they take turns
+        async with self._transfers.setdefault(url, asyncio.Lock()):
+            partial = transfer.Partial(self.path_partials, url, self.crc32)
+            cached = self.cache.lookup(url) if self.cache else None
+            suffix = '.zip' if 'zip' in file_type else ''
+
+            resp = await self._retry_transfer(
+                url, DownloadCache.conditional_headers(known or cached), partial, desc, known)
 
-        with requests.get(url, stream=True, headers=headers, allow_redirects=True) as resp:
+            if known and self._unchanged(resp, known):
+                return None
+
+            if resp.status_code == 304:
+                path = await asyncio.to_thread(
+                    self.cache.materialize, cached, partial.destination(suffix))
+                if path is not None:
+                    if details is not None:
+                        details['cached'] = True
+                    digest: FileDigest = {'sha256': cached['sha256'],
+                                          'crc32': cached.get('crc32'),
+                                          'size': path.stat().st_size}
+                    if self.crc32 and digest['crc32'] is None:
+                        digest = await asyncio.to_thread(Hasher.file, path, True)
+                    return path, cached['fname'], {'url': url,
+                                                   'resolved_at': time.time(),
+                                                   'fname': cached['fname'],
+                                                   'etag': cached['etag'],
+                                                   'last_modified': cached['last_modified'],
+                                                   'download': digest,
+                                                   'files': {}}
+                # evicted by another download since it was looked up
+                resp = await self._retry_transfer(url, {}, partial, desc)
+
+            fname = (re.findall('filename=(.+)', resp.headers['Content-Disposition'])[0]
+                     if 'Content-Disposition' in resp.headers
+                     else urlparse(url).path.split('/')[-1]).strip('\"')
+            # only the bytes that were not hashed while being written are read
+            digest = await asyncio.to_thread(partial.digest)
+            path = await asyncio.to_thread(partial.complete, suffix)
+
+            if self.cache:
+                # copied into the store when it is on another file system
+                await asyncio.to_thread(self.cache.add, url, path, fname, resp, digest)
+
+            return path, fname, {'url': url,
+                                 'resolved_at': time.time(),
+                                 'fname': fname,
+                                 'etag': resp.headers.get('ETag'),
+                                 'last_modified': resp.headers.get('Last-Modified'),
+                                 'download': digest,
+                                 'files': {}}
+
+    async def _retry_transfer(self, url: str, headers: dict[str, str], partial: transfer.Partial,
+                              desc: str | None, known: ManifestItem | None = None) -> Response:
+        """`_transfer`, retried up to `retries` times if the connection fails.
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                return await self._transfer(url, headers, partial, desc, known)
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError):
+                if attempt == self.retries:
+                    raise
+
+    async def _transfer(self, url: str, headers: dict[str, str], partial: transfer.Partial, desc: str | None,
+                        known: ManifestItem | None = None, ranges: bool = True) -> Response:
+        """Download the missing bytes of a partial file.
+
+        The connection slot of the initial request is released before fetching
+        segments, which need slots of their own. If the server does not honour
+        the range requests of the segments after all, such as a mirror behind
+        the same URL without byte ranges, the file is downloaded again as a
+        single stream.
+
+        Args:
+            url (str): Download URL.
+            headers (dict[str, str]): Request headers added to those of the host
+                policy, possibly conditional.
+            partial (transfer.Partial): Partial file to complete.
+            desc (str | None): Optional label of the progress bar.
+            known (ManifestItem | None): Manifest record of the file already in
+                place, whose body is not read if unchanged.
+            ranges (bool): Whether the file may be fetched in byte ranges.
+
+        Returns:
+            Response: The closed response of the initial request. Its status is
+                304 if the server reported the cached file as not modified.
+
+        Raises:
+            ValueError: If the response is an HTML page.
+        """
+        async with self.engine.open('GET', url, headers) as resp:
             resp.raise_for_status()
-            if 'html' in resp.headers['content-type']:
+            if resp.status_code == 304 or (known and self._unchanged(resp, known)):
+                return resp
+            if 'html' in resp.headers.get('content-type', ''):
                 raise ValueError('Received an HTML page instead of a file.')
 
-            resp.raw.read = functools.partial(
-                resp.raw.read, decode_content=True)
-
-            with tempfile.TemporaryFile(delete_on_close=False, suffix='.zip' if 'zip' in file_type else None) as temp:
-                with tqdm.wrapattr(resp.raw, 'read', total=int(resp.headers.get('Content-Length', 0))) as content:
-                    shutil.copyfileobj(content, temp)
-                temp.close()
-
-                print('├ Organizing downloaded file...')
-                if 'zip' in file_type:
-                    if (archive.unzip(temp.name, path) != 0):
-                        raise RuntimeError('Failed to extract zip file.')
-
-                    if file_type == 'zip/folder':
-                        for directory in os.listdir(path):
-                            for file in glob.glob('*', root_dir=path.joinpath(directory)):
-                                shutil.move(
-                                    path.joinpath(directory, file), path)
-                            shutil.rmtree(path.joinpath(directory))
-
-                    if rename_as:
-                        if len(exe := glob.glob(str(path.joinpath('*.exe')))) > 1:
-                            raise NotImplementedError(
-                                'Multiple executables found in zip.')
-                        shutil.move(exe[0], path.joinpath(f'{rename_as}.exe'))
-                else:
-                    fname = (re.findall('filename=(.+)', resp.headers['Content-Disposition'])[0]
-                             if 'Content-Disposition' in resp.headers
-                             else urlparse(url).path.split('/')[-1])
-                    if rename_as:
-                        fname = f'{rename_as}.{fname.split('.')[-1]}'
-                    shutil.move(temp.name, path.joinpath(fname.strip('\"')))
+            size = int(resp.headers.get('Content-Length', 0))
+            resume = ranges and partial.resumable(resp)
+            if not resume:
+                partial.reset(resp, self.segments
+                              if ranges and size >= self.segment_threshold and transfer.supports_ranges(resp)
+                              else 1)
+
+            bar = tqdm(total=size, initial=partial.received, unit='B', unit_scale=True, unit_divisor=1024,
+                       desc=desc, leave=False)
+            if not resume and len(partial.segments) == 1:
+                with bar:
+                    await self.engine.fetch_stream(resp, partial, bar.update)
+                return resp
+
+        try:
+            with bar:
+                await self.engine.fetch_partial(
+                    resp.url, {k: v for k, v in headers.items() if not k.startswith('If-')},
+                    partial, bar.update)
+        except RangeError:
+            return await self._transfer(url, headers, partial, desc, known, ranges=False)
+
+        return resp
+
+    @staticmethod
+    def _unchanged(resp: Response, known: ManifestItem) -> bool:
+        """Check whether a response is for the same file as a manifest record.
+
+        Args:
+            resp (Response): Response of a GET request, conditional on the
+                validators of the record.
+            known (ManifestItem): Manifest record.
+
+        Returns:
+            bool: True if the server reported the file as not modified, or
+                ignored the condition but answered with the same validators and size.
+        """
+        if resp.status_code == 304:
+            return True
+        if resp.status_code != 200 or not (resp.headers.get('ETag') or resp.headers.get('Last-Modified')):
+            return False
+        return (resp.headers.get('ETag') == known['etag']
+                and resp.headers.get('Last-Modified') == known['last_modified']
+                and int(resp.headers.get('Content-Length', -1)) == known['download']['size'])
+
+    def organize(self, source: str | Path, fname: str, file_type: Literal['exe', 'zip', 'zip/exe', 'zip/folder'], rename_as: str | None, path: str | Path,
+                 digest: FileDigest | None = None) -> dict[str, FileDigest]:
+        """Move or extract a downloaded file into its destination, based on file type.
+
+        Args:
+            source (str | Path): Path to the downloaded file.
+            fname (str): Name of the downloaded file.
+            file_type (Literal["exe", "zip", "zip/exe", "zip/folder"]): Type of file.
+            rename_as (str | None): Optional rename for the file.
+            path (str | Path): Destination path for the file.
+            digest (FileDigest | None): Checksums of the downloaded file, computed
+                if not given and the file is not extracted.
+
+        Returns:
+            dict[str, FileDigest]: Checksums of the organized files, by path
+                relative to the destination path.
+
+        Raises:
+            RuntimeError: If zip extraction fails.
+            NotImplementedError: If multiple executables are found in zip/exe.
+        """
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+
+        if 'zip' in file_type:
+            with self.tracer.span('organize.extract', bytes=Path(source).stat().st_size):
+                return archive.extract(source, path, strip_top=file_type == 'zip/folder',
+                                       rename_exe=rename_as, crc32=self.crc32)
+
+        if rename_as:
+            fname = f'{rename_as}.{fname.split('.')[-1]}'
+        # moving across file systems copies into an existing file, which may be
+        # hardlinked to the download cache or to its duplicates
+        path.joinpath(fname).unlink(True)
+        shutil.move(source, path.joinpath(fname))
+        return {fname: digest or Hasher.file(path.joinpath(fname), self.crc32)}
+
+    def archive(self, source: str | Path, fname: str, file_type: Literal['exe', 'zip', 'zip/exe', 'zip/folder'], rename_as: str | None,
+                arcname: str, path: str | Path | None = None, digest: FileDigest | None = None) -> dict[str, FileDigest]:
+        """Write a downloaded file into the `stream` archive, laid out as `organize` does.
+
+        Zip files are not extracted: their members are copied into the archive
+        under the directory entry, so only their CRC-32 is known.
+
+        Args:
+            source (str | Path): Path to the downloaded file.
+            fname (str): Name of the downloaded file.
+            file_type (Literal["exe", "zip", "zip/exe", "zip/folder"]): Type of file.
+            rename_as (str | None): Optional rename for the file.
+            arcname (str): Name of the directory entry of the item in the archive.
+            path (str | Path | None): Destination path to also organize the file
+                into, if any. The archive entries are then read from there.
+            digest (FileDigest | None): Checksums of the downloaded file, computed
+                if not given and the file is not a zip file.
+
+        Returns:
+            dict[str, FileDigest]: Checksums of the files of the item, by path
+                relative to the directory entry.
+        """
+        with self.stream.group() as entries:
+            if path is not None:
+                files = self.organize(source, fname, file_type, rename_as, path, digest)
+                self.stream.add_path(arcname, path)
+                return files
+
+            if 'zip' in file_type:
+                self.stream.add_zip(arcname, source, file_type == 'zip/folder', rename_as)
+                return {entry.filename.removeprefix(f'{arcname}/'): {'sha256': None,
+                                                                     'crc32': entry.CRC,
+                                                                     'size': entry.file_size}
+                        for entry in entries if not entry.is_dir()}
+
+            if rename_as:
+                fname = f'{rename_as}.{fname.split('.')[-1]}'
+            self.stream.add_file(f'{arcname}/{fname}', source)
+            return {fname: digest or Hasher.file(source, self.crc32)}
 
     def _dump_failed(self, failed: dict[str, list[ClawPrize]]):
         """Save failed downloads to the error log.
@@ -0,0 +1,753 @@
+"""Asynchronous download engine.
+
+Downloads run as coroutines of a single event loop, on a thread of its own, so
+any number of them proceed next to the synchronous browser sessions without a
+thread each. Requests are made over asyncio streams with h11 (already required
+by Selenium), with the settings and host policies of a `transfer.HttpClient`:
+connections are kept alive per host, and the number of concurrent connections
+is capped per host and in total.
+
+Proxies configured in the environment are honoured as `requests` honours
+them: HTTPS requests are tunnelled through the proxy with CONNECT, and plain
+HTTP requests are sent to it. Only `http://` proxies are supported.
+
+Queued downloads start longest first, by the `Content-Length` answered to a
+HEAD request, so that a large file queued last does not extend the run on its
+own. The bandwidth of all downloads can be capped, in which case it is shared
+fairly between hosts rather than between connections.
+"""
+
+import asyncio
+import base64
+import collections
+import concurrent.futures
+import contextlib
+import itertools
+import ssl
+import threading
+import time
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, Iterator, TypedDict, TypeVar
+from urllib.parse import SplitResult, urljoin, urlsplit, urlunsplit
+
+import certifi
+import h11
+import requests
+from requests.structures import CaseInsensitiveDict
+
+import transfer
+
+T = TypeVar('T')
+
+MAX_REDIRECTS = 10
+"""Maximum number of redirects followed by a request.
+"""
+
+_REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+
+WRITE_BATCH = 1024 * 1024
+"""Number of bytes received before they are handed to a worker thread to be
+written and hashed.
+"""
+
+
+class RangeError(RuntimeError):
+    """A server did not honour a byte range request, or sent less than the range.
+    """
+
+
+@contextlib.contextmanager
+def _network_errors() -> Iterator[None]:
+    """Raise network failures as the `requests` exceptions the download retries handle.
+    """
+    try:
+        yield
+    except requests.RequestException:
+        raise
+    except TimeoutError as e:
+        raise requests.Timeout('Timed out waiting for the server.') from e
+    except (OSError, h11.ProtocolError) as e:
+        raise requests.ConnectionError(e) from e
+
+
+class Response:
+    """Status and headers of an HTTP response, with its body left to stream.
+
+    Provides the attributes of `requests.Response` used by `transfer.Partial`
+    and `cache.DownloadCache`.
+    """
+
+    url: str
+    """URL of the response, after redirects.
+    """
+
+    status_code: int
+    """HTTP status code.
+    """
+
+    headers: CaseInsensitiveDict
+    """Response headers.
+    """
+
+    def __init__(self, url: str, status_code: int, headers: CaseInsensitiveDict):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self._body: AsyncIterator[bytes] | None = None
+
+    def raise_for_status(self) -> None:
+        """Raise `requests.HTTPError` for an error status.
+        """
+        if self.status_code >= 400:
+            raise requests.HTTPError(f'{self.status_code} Error for url: {self.url}', response=self)
+
+    def iter_content(self) -> AsyncIterator[bytes]:
+        """Iterate over the body, in chunks of at most `transfer.CHUNK_SIZE` bytes.
+
+        The body can only be iterated once, while the response is open.
+        """
+        if self._body is None:
+            raise RuntimeError('The response body was already consumed.')
+        body, self._body = self._body, None
+        return body
+
+
+class _BatchWriter:
+    """Writes the chunks of a response in a worker thread, a batch at a time,
+    while the next batch is received.
+
+    The event loop only collects chunks, so disk writes and hashing do not hold
+    up the other transfers. At most one batch is being written at a time.
+    """
+
+    def __init__(self, write: Callable[[list[bytes]], object]):
+        self._write = write
+        self._batch: list[bytes] = []
+        self._size = 0
+        self._pending: asyncio.Future | None = None
+
+    async def add(self, chunk: bytes):
+        """Queue a chunk, handing the batch over once it is large enough.
+        """
+        self._batch.append(chunk)
+        self._size += len(chunk)
+        if self._size >= WRITE_BATCH:
+            await self._flush()
+
+    async def _wait(self):
+        # a cancelled transfer still waits for the thread, which writes to a
+        # file the caller is about to close
+        if self._pending:
+            try:
+                await asyncio.shield(self._pending)
+            finally:
+                if self._pending.done():
+                    self._pending = None
+
+    async def _flush(self):
+        await self._wait()
+        if self._batch:
+            self._pending = asyncio.ensure_future(asyncio.to_thread(self._write, self._batch))
+            self._batch, self._size = [], 0
+
+    async def close(self):
+        """Write the chunks left and wait for every write, including after an
+        error, so the bytes received can be resumed from.
+        """
+        await self._wait()
+        await self._flush()
+        await self._wait()
+
+
+class _Connection:
+    """An HTTP/1.1 connection to a host.
+    """
+
+    def __init__(self, key: tuple[str, str, int], reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                 forward: dict[str, str] | None = None):
+        self.key = key
+        self.reader = reader
+        self.writer = writer
+        self.h11 = h11.Connection(h11.CLIENT)
+        self.reused = False
+        # headers of the proxy plain HTTP requests are sent to, if any
+        self.forward = forward
+
+    async def send(self, *events: h11.Event):
+        for event in events:
+            if data := self.h11.send(event):
+                self.writer.write(data)
+        await self.writer.drain()
+
+    async def receive(self, timeout: float) -> h11.Event:
+        while (event := self.h11.next_event()) is h11.NEED_DATA:
+            self.h11.receive_data(await asyncio.wait_for(
+                self.reader.read(transfer.CHUNK_SIZE), timeout))
+        return event
+
+    @property
+    def reusable(self) -> bool:
+        """Whether the last exchange completed, so the connection can take another request.
+        """
+        return self.h11.our_state is h11.DONE and self.h11.their_state is h11.DONE
+
+    @property
+    def closed(self) -> bool:
+        return self.writer.is_closing() or self.reader.at_eof()
+
+    def close(self):
+        self.writer.close()
+
+
+class HostRate(TypedDict):
+    bytes: int
+    """Bytes received."""
+    seconds: float
+    """Seconds between the first and the last bytes received."""
+    rate: float
+    """Average bytes received per second."""
+
+
+class Throughput(TypedDict):
+    bytes: int
+    """Bytes received from all hosts."""
+    seconds: float
+    """Seconds between the first and the last bytes received from any host."""
+    rate: float
+    """Average bytes received per second."""
+    hosts: dict[str, HostRate]
+    """Bytes received and rate of each host."""
+
+
+class _Meter:
+    """Bytes received per host, and when.
+    """
+
+    def __init__(self):
+        self._hosts: dict[str, list[float]] = {}
+
+    def record(self, host: str, count: int):
+        now = time.monotonic()
+        entry = self._hosts.setdefault(host, [0, now, now])
+        entry[0] += count
+        entry[2] = now
+
+    def read(self) -> Throughput:
+        def rate(count: float, first: float, last: float) -> HostRate:
+            seconds = last - first
+            return {'bytes': int(count), 'seconds': seconds,
+                    'rate': count / seconds if seconds > 0 else 0}
+
+        # may be called from another thread while the loop records
+        entries = {host: list(entry) for host, entry in list(self._hosts.items())}
+        if not entries:
+            return {'bytes': 0, 'seconds': 0, 'rate': 0, 'hosts': {}}
+        overall = rate(sum(entry[0] for entry in entries.values()),
+                       min(entry[1] for entry in entries.values()),
+                       max(entry[2] for entry in entries.values()))
+        return {**overall, 'hosts': {host: rate(*entry) for host, entry in entries.items()}}
+
+
+class BandwidthLimiter:
+    """A token bucket shared by every download, handing bandwidth out fairly between hosts.
+
+    Downloads ask for tokens after receiving each chunk. Waiting requests are
+    queued per host and served one host after another, so a host downloading
+    over many connections gets the same share as a host downloading over one.
+    """
+
+    rate: float | None
+    """Maximum number of bytes per second, or None for no limit.
+    """
+
+    def __init__(self, rate: float | None = None):
+        self.rate = rate
+        self._capacity = max(rate / 4, transfer.CHUNK_SIZE) if rate else 0
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+        self._waiting: dict[str, collections.deque[tuple[int, asyncio.Future]]] = {}
+        self._dispatcher: asyncio.Task | None = None
+
+    async def acquire(self, host: str, count: int) -> None:
+        """Wait until a number of bytes may be received from a host.
+
+        Args:
+            host (str): Host the bytes are received from.
+            count (int): Number of bytes, at most `transfer.CHUNK_SIZE`.
+        """
+        if not self.rate:
+            return
+
+        granted = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(host, collections.deque()).append((count, granted))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        await granted
+
+    async def _dispatch(self):
+        while self._waiting:
+            now = time.monotonic()
+            self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+            host, waiting = next(iter(self._waiting.items()))
+            count, granted = waiting[0]
+            if granted.done():
+                waiting.popleft()
+            elif self._tokens < count:
+                await asyncio.sleep((count - self._tokens) / self.rate)
+                continue
+            else:
+                self._tokens -= count
+                waiting.popleft()
+                granted.set_result(None)
+
+            # move the host to the back of the rotation
+            del self._waiting[host]
+            if waiting:
+                self._waiting[host] = waiting
+
+
+class DownloadEngine:
+    """Runs downloads as coroutines on an event loop of its own.
+
+    The loop and its thread are started by the first submitted download and
+    stopped by `close`. Jobs are coroutine functions making their requests
+    through `open`, `fetch_stream` and `fetch_partial`; at most `workers` of
+    them run at the same time.
+    """
+
+    client: transfer.HttpClient
+    """HTTP client whose settings and host policies apply to the requests.
+    """
+
+    workers: int
+    """Maximum number of jobs running concurrently.
+    """
+
+    bandwidth: float | None
+    """Maximum number of bytes per second received by all requests, or None for no limit.
+    """
+
+    def __init__(self, client: transfer.HttpClient, workers: int = 2, bandwidth: float | None = None):
+        self.client = client
+        self.workers = workers
+        self.bandwidth = bandwidth
+        self._ssl = ssl.create_default_context(cafile=certifi.where())
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._meter = _Meter()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def _start(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever, name='download-engine', daemon=True)
+                self._thread.start()
+                asyncio.run_coroutine_threadsafe(self._setup(), self._loop).result()
+            return self._loop
+
+    async def _setup(self):
+        self._meter = _Meter()
+        self._limiter = BandwidthLimiter(self.bandwidth)
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._order = itertools.count()
+        self._idle_workers = 0
+        self._idle: dict[tuple[str, str, int], list[_Connection]] = {}
+        self._total = asyncio.Semaphore(self.client.total)
+        self._hosts: dict[str, asyncio.Semaphore] = {}
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    def submit(self, url: str, job: Callable[[], Awaitable[T]], delay: float = 0) -> concurrent.futures.Future[T]:
+        """Queue a download job.
+
+        Jobs waiting for a worker are started longest first, by the size of the
+        file at `url` as answered to a HEAD request. Files of unknown size are
+        considered the longest.
+
+        Args:
+            url (str): URL of the downloaded file.
+            job (Callable[[], Awaitable[T]]): Coroutine function running the download.
+            delay (float): Seconds to wait before queuing the job, such as before
+                a retry, without holding a worker.
+
+        Returns:
+            concurrent.futures.Future[T]: Result of the job. Cancelling it before
+                the job starts drops the job.
+        """
+        future: concurrent.futures.Future[T] = concurrent.futures.Future()
+        loop = self._start()
+        asyncio.run_coroutine_threadsafe(self._enqueue(url, job, future, delay), loop)
+        return future
+
+    async def _enqueue(self, url: str, job: Callable[[], Awaitable], future: concurrent.futures.Future, delay: float = 0):
+        size = 0
+        try:
+            if delay > 0:
+                await asyncio.sleep(delay)
+            # the order only matters when the job has to wait for a worker
+            if self._idle_workers == 0 or not self._queue.empty():
+                size = await self._preflight(url)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        self._queue.put_nowait((-size, next(self._order), job, future))
+
+    async def _preflight(self, url: str) -> float:
+        """Size of the file at a URL, or infinity if the server does not tell.
+        """
+        with contextlib.suppress(requests.RequestException, ValueError):
+            async with self.open('HEAD', url) as resp:
+                async for _ in resp.iter_content():
+                    pass
+                if resp.status_code < 400 and (size := int(resp.headers.get('Content-Length', 0))) > 0:
+                    return size
+        return float('inf')
+
+    async def _work(self):
+        while True:
+            self._idle_workers += 1
+            try:
+                _, _, job, future = await self._queue.get()
+            finally:
+                self._idle_workers -= 1
+
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(await job())
+            except asyncio.CancelledError as e:
+                future.set_exception(e)
+                raise
+            except BaseException as e:
+                future.set_exception(e)
+
+    def throughput(self) -> Throughput:
+        """Bytes received and average rates overall and per host, since the engine started.
+
+        Can be called while downloads are running.
+        """
+        return self._meter.read()
+
+    def close(self):
+        """Cancel the running and queued jobs, close the connections and stop the event loop.
+        """
+        with self._lock:
+            if self._loop is None:
+                return
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._loop = self._thread = None
+
+    async def _shutdown(self):
+        tasks = asyncio.all_tasks() - {asyncio.current_task()}
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        while not self._queue.empty():
+            *_, future = self._queue.get_nowait()
+            future.cancel()
+
+        for connections in self._idle.values():
+            for conn in connections:
+                conn.close()
+        self._idle.clear()
+
+    def _slots(self, host: str) -> asyncio.Semaphore:
+        if host not in self._hosts:
+            self._hosts[host] = asyncio.Semaphore(
+                transfer.policy_of(host).get('connections', self.client.per_host))
+        return self._hosts[host]
+
+    async def _connect(self, parts: SplitResult, reuse: bool = True) -> _Connection:
+        """Take an idle connection to the host of a URL, or open a new one.
+        """
+        https = parts.scheme == 'https'
+        key = (parts.scheme, parts.hostname or '', parts.port or (443 if https else 80))
+
+        while reuse and self._idle.get(key):
+            conn = self._idle[key].pop()
+            if not conn.closed:
+                conn.reused = True
+                return conn
+            conn.close()
+
+        proxy = self.client.proxy(urlunsplit(parts))
+        if proxy is None:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(key[1], key[2], ssl=self._ssl if https else None),
+                self.client.timeout[0])
+            return _Connection(key, reader, writer)
+
+        proxy_parts = urlsplit(proxy)
+        if proxy_parts.scheme != 'http':
+            raise requests.exceptions.InvalidProxyURL(
+                f'Unsupported proxy {proxy_parts.scheme}://{proxy_parts.hostname}: downloads only go '
+                'through http:// proxies. Set HTTP_PROXY and HTTPS_PROXY to one, or add the hosts to NO_PROXY.')
+        headers = {}
+        if (auth := requests.utils.get_auth_from_url(proxy)) != ('', ''):
+            headers['Proxy-Authorization'] = f'Basic {base64.b64encode(':'.join(auth).encode()).decode()}'
+
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(proxy_parts.hostname, proxy_parts.port or 80), self.client.timeout[0])
+        if not https:
+            return _Connection(key, reader, writer, headers)
+
+        try:
+            await asyncio.wait_for(self._tunnel(reader, writer, key, headers), self.client.timeout[0])
+        except BaseException:
+            writer.close()
+            raise
+        return _Connection(key, reader, writer)
+
+    async def _tunnel(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, key: tuple[str, str, int],
+                      headers: dict[str, str]):
+        """Open a TLS tunnel to a host through a connection to a proxy.
+        """
+        authority = f'[{key[1]}]:{key[2]}' if ':' in key[1] else f'{key[1]}:{key[2]}'
+        writer.write(''.join([f'CONNECT {authority} HTTP/1.1\r\nHost: {authority}\r\n',
+                              *(f'{name}: {value}\r\n' for name, value in headers.items()),
+                              '\r\n']).encode('latin-1'))
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+        except asyncio.IncompleteReadError as e:
+            raise requests.exceptions.ProxyError('Proxy closed the connection before answering.') from e
+        status = head.split(b'\r\n', 1)[0].decode('latin-1')
+        if len(status.split()) < 2 or not status.split()[1].startswith('2'):
+            raise requests.exceptions.ProxyError(f'Proxy refused to connect to {authority}: {status}')
+        await writer.start_tls(self._ssl, server_hostname=key[1])
+
+    def _release(self, conn: _Connection):
+        """Keep a connection for the next request to its host, if its last exchange completed.
+        """
+        idle = self._idle.setdefault(conn.key, [])
+        if conn.reusable and not conn.closed and len(idle) < self.client.per_host:
+            conn.h11.start_next_cycle()
+            idle.append(conn)
+        else:
+            conn.close()
+
+    async def _exchange(self, conn: _Connection, request: h11.Request) -> h11.Event:
+        """Send a request without a body and read the head of its final response.
+        """
+        await conn.send(request, h11.EndOfMessage())
+        while isinstance(event := await conn.receive(self.client.timeout[1]), h11.InformationalResponse):
+            pass
+        return event
+
+    async def _send(self, method: str, url: str, headers: dict[str, str]) -> tuple[Response, _Connection]:
+        """Send a request and read the head of its response, without following redirects.
+        """
+        parts = urlsplit(url)
+        conn = await self._connect(parts)
+        # a plain HTTP request sent to a proxy names the whole URL
+        target = (urlunsplit(parts._replace(fragment='')) if conn.forward is not None
+                  else (parts.path or '/') + (f'?{parts.query}' if parts.query else ''))
+        request = h11.Request(method=method, target=target,
+                              headers=[('Host', parts.netloc.rpartition('@')[2]),
+                                       ('Accept-Encoding', 'identity'),
+                                       *(conn.forward or {}).items(),
+                                       *headers.items()])
+
+        try:
+            try:
+                event = await self._exchange(conn, request)
+            except TimeoutError:
+                raise
+            except (OSError, h11.ProtocolError):
+                # the server may have closed a kept-alive connection in the meantime
+                if not conn.reused:
+                    raise
+                conn.close()
+                conn = await self._connect(parts, reuse=False)
+                event = await self._exchange(conn, request)
+        except BaseException:
+            conn.close()
+            raise
+
+        if not isinstance(event, h11.Response):
+            conn.close()
+            raise requests.ConnectionError('Connection closed before the response.')
+
+        return Response(url, event.status_code, CaseInsensitiveDict(
+            {name.decode('latin-1'): value.decode('latin-1') for name, value in event.headers})), conn
+
+    async def _body(self, conn: _Connection) -> AsyncIterator[bytes]:
+        host = conn.key[1]
+        with _network_errors():
+            while True:
+                event = await conn.receive(self.client.timeout[1])
+                if isinstance(event, h11.Data):
+                    await self._limiter.acquire(host, len(event.data))
+                    self._meter.record(host, len(event.data))
+                    yield bytes(event.data)
+                elif isinstance(event, h11.EndOfMessage):
+                    return
+                else:
+                    raise requests.exceptions.ChunkedEncodingError(
+                        'Connection closed before the end of the response.')
+
+    @contextlib.asynccontextmanager
+    async def open(self, method: str, url: str, headers: dict[str, str] | None = None) -> AsyncIterator[Response]:
+        """Open a request, once a connection slot to the host is free.
+
+        Redirects are followed, each one once a slot to the host it points to
+        is free, with the headers of that host's policy.
+
+        Args:
+            method (str): HTTP method.
+            url (str): URL to request.
+            headers (dict[str, str] | None): Headers added to those of the host policy.
+
+        Yields:
+            Response: The open response. Its connection is kept alive for the
+                next request if the body was read to the end.
+
+        Raises:
+            requests.ConnectionError: If the connection failed.
+            requests.Timeout: If the server did not answer in time.
+            requests.TooManyRedirects: If more than `MAX_REDIRECTS` redirects were followed.
+        """
+        for _ in range(MAX_REDIRECTS + 1):
+            # every hop takes a slot of its own host, so a redirect to a
+            # mirror counts against the mirror rather than the original host
+            async with self._slots(urlsplit(url).hostname or ''), self._total:
+                with _network_errors():
+                    resp, conn = await self._send(
+                        method, url, {**self.client.headers(url), **(headers or {})})
+                if resp.status_code in _REDIRECT_STATUSES and 'Location' in resp.headers:
+                    conn.close()
+                    url = urljoin(url, resp.headers['Location'])
+                    continue
+
+                resp._body = self._body(conn)
+                try:
+                    yield resp
+                finally:
+                    self._release(conn)
+                return
+
+        raise requests.TooManyRedirects(f'Exceeded {MAX_REDIRECTS} redirects.')
+
+    async def fetch_stream(self, resp: Response, partial: transfer.Partial,
+                           progress: Callable[[int], object] | None = None) -> None:
+        """Write the body of an open response to a partial file from its first byte.
+
+        Chunks are written and hashed in a worker thread (see `_BatchWriter`).
+
+        Args:
+            resp (Response): The open response.
+            partial (transfer.Partial): Partial file with a single segment.
+            progress (Callable[[int], object] | None): Called with the number of
+                bytes written, from the worker thread.
+        """
+        try:
+            with open(partial.path, 'r+b') as f:
+                def write(chunks: list[bytes]):
+                    for chunk in chunks:
+                        f.write(chunk)
+                        partial.advance(0, chunk)
+                        if progress:
+                            progress(len(chunk))
+
+                writer = _BatchWriter(write)
+                try:
+                    async for chunk in resp.iter_content():
+                        await writer.add(chunk)
+                finally:
+                    await writer.close()
+        finally:
+            partial.save()
+
+    async def fetch_range(self, url: str, headers: dict[str, str], path: str | Path, start: int, end: int,
+                          progress: Callable[[bytes], object] | None = None) -> None:
+        """Download a byte range of a file and write it at the same offset of a local file.
+
+        Args:
+            url (str): Download URL.
+            headers (dict[str, str]): Request headers.
+            path (str | Path): Preallocated local file.
+            start (int): First byte of the range.
+            end (int): Last byte of the range, inclusive.
+            progress (Callable[[bytes], object] | None): Called with every chunk
+                written, from the worker thread writing it (see `_BatchWriter`).
+
+        Raises:
+            RangeError: If the server does not honour the range request.
+        """
+        async with self.open('GET', url, {**headers, 'Range': f'bytes={start}-{end}'}) as resp:
+            resp.raise_for_status()
+            if resp.status_code != 206:
+                raise RangeError('Server ignored the byte range request.')
+
+            with open(path, 'r+b') as f:
+                f.seek(start)
+
+                def write(chunks: list[bytes]):
+                    for chunk in chunks:
+                        f.write(chunk)
+                        if progress:
+                            progress(chunk)
+
+                writer = _BatchWriter(write)
+                try:
+                    async for chunk in resp.iter_content():
+                        await writer.add(chunk)
+                finally:
+                    await writer.close()
+                written = f.tell() - start
+
+        if written != end - start + 1:
+            raise RangeError(f'Incomplete byte range {start}-{end}.')
+
+    async def fetch_partial(self, url: str, headers: dict[str, str], partial: transfer.Partial,
+                            progress: Callable[[int], object] | None = None) -> None:
+        """Download the missing segments of a partial file concurrently.
+
+        Every range request carries an `If-Range` validator, so a server holding a
+        different version of the resource answers with the whole file instead, which
+        is rejected.
+
+        The caller must not hold a connection slot while waiting, or the segments
+        may wait for it forever.
+
+        Args:
+            url (str): Download URL. The server must support byte ranges.
+            headers (dict[str, str]): Request headers.
+            partial (transfer.Partial): Partial file to complete.
+            progress (Callable[[int], object] | None): Called with the number of bytes written.
+
+        Raises:
+            RangeError: If the server does not honour a range request.
+        """
+        if partial.validator:
+            headers = {**headers, 'If-Range': partial.validator}
+
+        async def fetch(index: int, start: int, end: int):
+            def advance(chunk: bytes):
+                partial.advance(index, chunk)
+                if progress:
+                    progress(len(chunk))
+            await self.fetch_range(url, headers, partial.path, start, end, advance)
+
+        tasks = [asyncio.create_task(fetch(index, start + received, end))
+                 for index, (start, end, received) in enumerate(partial.segments)
+                 if start + received <= end]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            partial.save()
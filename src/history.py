@@ -0,0 +1,264 @@
+"""History of the metrics of past runs.
+
+Every run appends its metrics to a SQLite database: the duration of the run
+and of the archive build, and for every item the time taken to locate its
+download URL, the time and throughput of its download, and the time taken to
+extract and organize it. The metrics are collected from the spans of the run
+(see `tracing.py`).
+
+`History.regressions` compares a run with a rolling baseline, the median of
+the same metric over the previous runs, so an item whose vendor page or server
+became slower, for instance after a redesign, is pointed out as soon as it
+happens.
+"""
+
+import sqlite3
+import statistics
+import threading
+import time
+from pathlib import Path
+from typing import Any, Literal, TypedDict
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started REAL NOT NULL,
+    seconds REAL,
+    items INTEGER,
+    failed INTEGER,
+    bytes INTEGER,
+    archive_seconds REAL,
+    archive_bytes INTEGER
+);
+CREATE TABLE IF NOT EXISTS items (
+    run INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    label TEXT NOT NULL,
+    source TEXT,
+    resolve_seconds REAL,
+    download_seconds REAL,
+    bytes INTEGER,
+    cached INTEGER NOT NULL DEFAULT 0,
+    extract_seconds REAL,
+    organize_seconds REAL,
+    error TEXT,
+    PRIMARY KEY (run, label)
+);
+CREATE INDEX IF NOT EXISTS items_label ON items (label, run);
+'''
+"""Tables of the database, created when missing.
+"""
+
+MIN_BYTES = 1024 * 1024
+"""Minimum size of a download for its throughput to be compared, as the time
+of smaller downloads is mostly latency.
+"""
+
+
+class RunRecord(TypedDict):
+    started: float
+    """Start time of the run, in seconds since the epoch."""
+    seconds: float | None
+    """Duration of the run, or None if it did not scrape."""
+    items: int | None
+    """Number of items of the run."""
+    failed: int | None
+    """Number of items that failed."""
+    bytes: int | None
+    """Number of bytes downloaded."""
+    archive_seconds: float | None
+    """Time taken to build the archive, or None if it was not built."""
+    archive_bytes: int | None
+    """Uncompressed size of the archive."""
+
+
+class ItemRecord(TypedDict):
+    label: str
+    """Category and path of the item, which identify it across runs."""
+    source: str | None
+    """How its download URL was located: `cache`, `fast_path` or `browser`."""
+    resolve_seconds: float | None
+    """Time taken to locate its download URL, over all attempts."""
+    download_seconds: float | None
+    """Time taken to download it, over all attempts."""
+    bytes: int | None
+    """Size of the downloaded file, or 0 if it was unchanged."""
+    cached: bool
+    """Whether the download was served from the download cache."""
+    extract_seconds: float | None
+    """Time taken to extract it."""
+    organize_seconds: float | None
+    """Time taken to organize it, extraction included."""
+    error: str | None
+    """Last error of the item, if it failed."""
+
+
+class Regression(TypedDict):
+    label: str
+    """Item that regressed."""
+    metric: Literal['resolve', 'download']
+    """Phase that regressed: locating the download URL, or the download."""
+    value: float
+    """Value of the run: seconds to locate the URL, or bytes per second downloaded."""
+    baseline: float
+    """Median of the value over the previous runs."""
+    runs: int
+    """Number of previous runs the baseline was computed from."""
+
+
+class RunMetrics:
+    """Metrics of the current run, collected from its spans.
+
+    Thread-safe.
+    """
+
+    run: RunRecord
+    """Metrics of the run.
+    """
+
+    items: dict[str, ItemRecord]
+    """Metrics of the items, by label.
+    """
+
+    def __init__(self):
+        self.run = {'started': time.time(), 'seconds': None, 'items': None, 'failed': None, 'bytes': None,
+                    'archive_seconds': None, 'archive_bytes': None}
+        self.items = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, label: str | None, start: float, seconds: float, args: dict[str, Any]):
+        """Account for a span.
+
+        Args:
+            name (str): Name of the phase.
+            label (str | None): Label of the item, if any.
+            start (float): Start time, in seconds since the epoch.
+            seconds (float): Duration.
+            args (dict[str, Any]): Details of the span.
+        """
+        with self._lock:
+            if name == 'run':
+                self.run.update(started=start, seconds=seconds, items=args.get('items'),
+                                failed=args.get('failed'), bytes=args.get('bytes'))
+            elif name == 'archive':
+                self.run.update(archive_seconds=seconds, archive_bytes=args.get('bytes'))
+            elif label is not None and name in ('resolve', 'download', 'organize', 'organize.extract'):
+                item = self.items.setdefault(label, {
+                    'label': label, 'source': None, 'resolve_seconds': None, 'download_seconds': None,
+                    'bytes': None, 'cached': False, 'extract_seconds': None, 'organize_seconds': None,
+                    'error': None})
+                field = {'resolve': 'resolve_seconds', 'download': 'download_seconds',
+                         'organize': 'organize_seconds', 'organize.extract': 'extract_seconds'}[name]
+                item[field] = (item[field] or 0) + seconds
+                if name == 'resolve':
+                    item['source'] = args.get('source', item['source'])
+                if name == 'download':
+                    item['bytes'] = args.get('bytes', item['bytes'])
+                    item['cached'] = args.get('cached', False)
+                if name != 'organize.extract':
+                    item['error'] = args.get('error')
+
+
+class History:
+    """A SQLite database of the metrics of past runs.
+    """
+
+    path: Path
+    """Path to the database.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self._db = sqlite3.connect(self.path)
+        self._db.row_factory = sqlite3.Row
+        self._db.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def add(self, metrics: RunMetrics) -> int:
+        """Append the metrics of a run.
+
+        Returns:
+            int: Identifier of the run.
+        """
+        with self._db:
+            run = self._db.execute(
+                'INSERT INTO runs (started, seconds, items, failed, bytes, archive_seconds, archive_bytes) '
+                'VALUES (:started, :seconds, :items, :failed, :bytes, :archive_seconds, :archive_bytes)',
+                metrics.run).lastrowid
+            self._db.executemany(
+                'INSERT INTO items (run, label, source, resolve_seconds, download_seconds, bytes, cached, '
+                'extract_seconds, organize_seconds, error) VALUES (:run, :label, :source, :resolve_seconds, '
+                ':download_seconds, :bytes, :cached, :extract_seconds, :organize_seconds, :error)',
+                [{**item, 'run': run} for item in metrics.items.values()])
+        return run
+
+    def runs(self, limit: int | None = None) -> list[RunRecord]:
+        """Recorded runs, latest first, with their `id`.
+        """
+        return [dict(row) for row in self._db.execute(
+            'SELECT * FROM runs ORDER BY id DESC LIMIT ?', (-1 if limit is None else limit,))]
+
+    def items(self, run: int) -> list[ItemRecord]:
+        """Metrics of the items of a run.
+        """
+        return [{**row, 'cached': bool(row['cached'])} for row in self._db.execute(
+            'SELECT label, source, resolve_seconds, download_seconds, bytes, cached, extract_seconds, '
+            'organize_seconds, error FROM items WHERE run = ? ORDER BY rowid', (run,))]
+
+    def regressions(self, run: int, window: int = 10, threshold: float = 1.5, min_runs: int = 3,
+                    min_seconds: float = 1) -> list[Regression]:
+        """Items of a run that became slower than in the previous runs.
+
+        An item regressed when it took more than `threshold` times its baseline
+        to locate its download URL, compared with the previous runs that located
+        it the same way, or downloaded at less than its baseline throughput
+        divided by `threshold`, compared with its own previous downloads of at
+        least `MIN_BYTES` that were not served from the download cache. Both
+        baselines are per item, by label, so an item is never compared with
+        other items of the same host. Failed attempts are not compared, nor
+        phases that took less than `min_seconds`.
+
+        Args:
+            run (int): Identifier of the run.
+            window (int): Maximum number of previous runs making the baseline.
+            threshold (float): Slowdown factor from which a phase regressed.
+            min_runs (int): Minimum number of previous runs for a baseline.
+            min_seconds (float): Minimum duration of a phase to be compared.
+
+        Returns:
+            list[Regression]: Regressions, in the order of the items.
+        """
+        regressions: list[Regression] = []
+        for item in self.items(run):
+            if item['error']:
+                continue
+            previous = [dict(row) for row in self._db.execute(
+                'SELECT source, resolve_seconds, download_seconds, bytes, cached FROM items '
+                'WHERE label = ? AND run < ? AND error IS NULL ORDER BY run DESC LIMIT ?',
+                (item['label'], run, window))]
+
+            if item['resolve_seconds'] and item['resolve_seconds'] >= min_seconds:
+                baseline = [row['resolve_seconds'] for row in previous
+                            if row['source'] == item['source'] and row['resolve_seconds'] is not None]
+                if len(baseline) >= min_runs and item['resolve_seconds'] > threshold * statistics.median(baseline):
+                    regressions.append({'label': item['label'], 'metric': 'resolve', 'value': item['resolve_seconds'],
+                                        'baseline': statistics.median(baseline), 'runs': len(baseline)})
+
+            if (not item['cached'] and (item['bytes'] or 0) >= MIN_BYTES
+                    and item['download_seconds'] and item['download_seconds'] >= min_seconds):
+                rate = item['bytes'] / item['download_seconds']
+                baseline = [row['bytes'] / row['download_seconds'] for row in previous
+                            if not row['cached'] and (row['bytes'] or 0) >= MIN_BYTES and row['download_seconds']]
+                if len(baseline) >= min_runs and rate * threshold < statistics.median(baseline):
+                    regressions.append({'label': item['label'], 'metric': 'download', 'value': rate,
+                                        'baseline': statistics.median(baseline), 'runs': len(baseline)})
+        return regressions
+
+    def close(self):
+        """Close the database.
+        """
+        self._db.close()
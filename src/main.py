@@ -1,11 +1,19 @@
 import argparse
+import atexit
 import os
 import shutil
-from contextlib import contextmanager, redirect_stdout
+import time
+from contextlib import contextmanager, nullcontext, redirect_stdout
 from typing import Iterable
 
 import archive
 import config
+import history
+import manifest
+import retry
+import tracing
+import transfer
+from cache import DownloadCache, UrlCache
 from driver_claw import DriverClaw
 
 
@@ -43,6 +51,92 @@ def file_ext(choices: Iterable[str], fname: str):
     return fname
 
 
+def positive_int(value: str) -> int:
+    """Validate a positive integer command line argument.
+
+    Args:
+        value (str): Argument value to validate.
+
+    Returns:
+        int: Parsed integer.
+
+    Raises:
+        argparse.ArgumentTypeError: If the value is not a positive integer.
+    """
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError(
+            f'Invalid value: "{value}". Expected a positive integer.')
+    return number
+
+
+def dedupe(records: manifest.Manifest):
+    """Replace the duplicate files of an output directory by hardlinks, and report the space freed.
+
+    Args:
+        records (manifest.Manifest): Manifest of the output directory.
+    """
+    linked, saved = records.dedupe()
+    print(f'Replaced {linked} duplicate file(s) by hardlinks, freeing {saved / 1024 ** 2:.1f} MiB.')
+
+
+def record(path: str, metrics: history.RunMetrics):
+    """Append the metrics of the run to the history, if it scraped or built an archive.
+
+    Args:
+        path (str): Path to the history database.
+        metrics (history.RunMetrics): Metrics of the run.
+    """
+    if metrics.run['seconds'] is None and metrics.run['archive_seconds'] is None:
+        return
+    with history.History(path) as records:
+        records.add(metrics)
+
+
+def report(args: argparse.Namespace) -> int:
+    """Print the regressions of a run compared with the previous runs.
+
+    Args:
+        args (argparse.Namespace): Arguments of the report command.
+
+    Returns:
+        int: Exit status, 1 if the run regressed or no run was recorded.
+    """
+    if not os.path.exists(args.history):
+        print(f'No runs recorded in "{args.history}".')
+        return 1
+    with history.History(args.history) as records:
+        runs = [run for run in records.runs() if args.run is None or run['id'] == args.run]
+        if not runs:
+            print(f'No runs recorded in "{args.history}".' if args.run is None else f'No run {args.run}.')
+            return 1
+        run = runs[0]
+        regressions = records.regressions(run['id'], args.window, args.threshold, args.min_runs, args.min_seconds)
+
+    summary = [f'Run {run['id']} of {time.strftime('%Y-%m-%d %H:%M', time.localtime(run['started']))}']
+    if run['seconds'] is not None:
+        summary.append(f'{run['items']} item(s), {run['failed']} failed, '
+                       f'{(run['bytes'] or 0) / 1024 ** 2:.1f} MiB downloaded in {run['seconds']:.1f}s')
+    if run['archive_seconds'] is not None:
+        summary.append(f'archive built in {run['archive_seconds']:.1f}s')
+    print(', '.join(summary) + '.')
+
+    for regression in regressions:
+        if regression['metric'] == 'resolve':
+            print(f'{regression['label']}: located in {regression['value']:.1f}s, '
+                  f'{regression['value'] / regression['baseline']:.1f}x its baseline of '
+                  f'{regression['baseline']:.1f}s over {regression['runs']} run(s).')
+        else:
+            print(f'{regression['label']}: downloaded at {regression['value'] / 1024 ** 2:.1f} MiB/s, '
+                  f'{regression['baseline'] / regression['value']:.1f}x slower than its baseline of '
+                  f'{regression['baseline'] / 1024 ** 2:.1f} MiB/s over {regression['runs']} run(s).')
+    print(f'{len(regressions)} regression(s) compared with up to {args.window} previous run(s).')
+    return 1 if regressions else 0
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(
         description='Find and download the latest common hardware drivers, and diagnostic tool.')
@@ -58,6 +152,110 @@ if __name__ == '__main__':
         '-r', '--retry-failed', action='store_true',
         help='Retry failed downloads from previous run'
     )
+    parser.add_argument(
+        '-b', '--browsers', type=positive_int, default=1,
+        help='Number of browser sessions used to locate download URLs concurrently (default: 1)'
+    )
+    parser.add_argument(
+        '--downloaders', type=positive_int, default=2,
+        help='Number of concurrent downloads (default: 2)'
+    )
+    parser.add_argument(
+        '--extractors', type=positive_int, default=1,
+        help='Number of downloaded files extracted concurrently (default: 1)'
+    )
+    parser.add_argument(
+        '--queue-size', type=positive_int, default=4,
+        help='Maximum number of items waiting between two processing stages (default: 4)'
+    )
+    parser.add_argument(
+        '--segments', type=positive_int, default=4,
+        help='Number of concurrent connections used to download a large file, '
+             'if the server supports byte ranges (default: 4)'
+    )
+    parser.add_argument(
+        '--segment-threshold', type=positive_int, default=64, metavar='MIB',
+        help='Minimum file size in MiB for a download to be segmented (default: 64)'
+    )
+    parser.add_argument(
+        '--retries', type=int, default=2, choices=range(0, 10), metavar='{0-9}',
+        help='Number of times an interrupted download is resumed before giving up (default: 2)'
+    )
+    parser.add_argument(
+        '--resolve-retries', type=int, default=2, choices=range(0, 10), metavar='{0-9}',
+        help='Number of times locating a download URL is retried within the run after a failure (default: 2)'
+    )
+    parser.add_argument(
+        '--download-retries', type=int, default=2, choices=range(0, 10), metavar='{0-9}',
+        help='Number of times a download failing with a connection or server error '
+             'is retried within the run (default: 2)'
+    )
+    parser.add_argument(
+        '--backoff', type=float, default=2, metavar='SECONDS',
+        help='Base delay before a retry, doubled with every attempt and randomized (default: 2)'
+    )
+    parser.add_argument(
+        '--breaker-threshold', type=positive_int, default=3, metavar='N',
+        help='Consecutive failures after which a host is left alone for a while (default: 3)'
+    )
+    parser.add_argument(
+        '--breaker-cooldown', type=float, default=60, metavar='SECONDS',
+        help='Seconds a failing host is left alone before it is tried again (default: 60)'
+    )
+    parser.add_argument(
+        '--host-connections', type=positive_int, default=6, metavar='N',
+        help='Maximum number of concurrent connections to a single host (default: 6)'
+    )
+    parser.add_argument(
+        '--max-connections', type=positive_int, default=16, metavar='N',
+        help='Maximum number of concurrent download connections overall (default: 16)'
+    )
+    parser.add_argument(
+        '--connect-timeout', type=float, default=10, metavar='SECONDS',
+        help='Seconds to wait for a server to accept a connection (default: 10)'
+    )
+    parser.add_argument(
+        '--read-timeout', type=float, default=60, metavar='SECONDS',
+        help='Seconds to wait for a server to send data before the download is retried (default: 60)'
+    )
+    parser.add_argument(
+        '--bandwidth', type=float, metavar='MIB/S',
+        help='Maximum download rate in MiB/s, shared fairly between hosts (default: no limit)'
+    )
+    parser.add_argument(
+        '--cache-dir', type=str,
+        help='Directory of a persistent download cache shared across runs (default: no cache)'
+    )
+    parser.add_argument(
+        '--cache-size', type=positive_int, default=20, metavar='GIB',
+        help='Maximum size of the download cache in GiB (default: 20)'
+    )
+    parser.add_argument(
+        '--url-ttl', type=float, default=24, metavar='HOURS',
+        help='Hours a located download URL is reused from the cache directory '
+             'without visiting the vendor page again, 0 to disable (default: 24)'
+    )
+    parser.add_argument(
+        '--lean-browser', action='store_true',
+        help='Skip images, fonts, media and trackers on vendor pages whose resolvers support it'
+    )
+    parser.add_argument(
+        '--browser-profile', type=str, metavar='DIR',
+        help='Directory of browser profiles reused across runs, keeping the browser cache (default: temporary profiles)'
+    )
+    parser.add_argument(
+        '--page-load-timeout', type=float, metavar='SECONDS',
+        help='Maximum number of seconds a vendor page may take to load (default: no limit)'
+    )
+    parser.add_argument(
+        '--resolve-timeout', type=float, default=180, metavar='SECONDS',
+        help='Maximum number of seconds spent locating a single download URL on a browser session, '
+             'after which the session is killed and the item retried on a new one, 0 to disable (default: 180)'
+    )
+    parser.add_argument(
+        '--recycle-after', type=positive_int, metavar='N',
+        help='Replace every browser session after it located N download URLs (default: never)'
+    )
     parser.add_argument(
         '-n', '--archive-name', type=str, default='driver-pack.zip',
         help='Name of the output archive file (default: driver-pack.zip)'
@@ -66,10 +264,58 @@ if __name__ == '__main__':
         '-l', '--compress-level', type=int, default=5, choices=range(0, 10),
         help='Compression level for the archive (0-9, default: 5)'
     )
+    parser.add_argument(
+        '--archive-workers', type=positive_int, metavar='N',
+        help='Number of processes compressing archive entries (default: number of CPUs)'
+    )
+    parser.add_argument(
+        '-u', '--update-archive', action='store_true',
+        help='Update an existing archive, reusing the entries of unchanged files without compressing them again'
+    )
+    parser.add_argument(
+        '--crc32', action='store_true',
+        help='Also record the CRC-32 of downloaded files in the manifest, '
+             'so --update-archive trusts it instead of reading them'
+    )
+    parser.add_argument(
+        '--incremental', action='store_true',
+        help='Keep the output directory of the previous run, only downloading items whose file changed '
+             'and deleting items removed from the configuration'
+    )
+    parser.add_argument(
+        '--dedupe', action='store_true',
+        help='Replace identical files of different items in the output directory by hardlinks'
+    )
+    parser.add_argument(
+        '--delta-from', type=str, metavar='ARCHIVE',
+        help='Also create a delta pack holding the entries missing from a previous archive, '
+             'named after the archive with a .delta.zip extension'
+    )
+    parser.add_argument(
+        '--apply-delta', type=str, nargs=2, metavar=('BASE', 'DELTA'),
+        help='Rebuild an archive named --archive-name from a previous archive and a delta pack, then exit'
+    )
     parser.add_argument(
         '-i', '--include-files', type=str, nargs='+', action='extend',
         help='Additional files or directories to include in archive'
     )
+    parser.add_argument(
+        '--trace', type=str, metavar='PATH',
+        help='Write the timing of every phase of the run to a JSON lines file'
+    )
+    parser.add_argument(
+        '--chrome-trace', type=str, metavar='PATH',
+        help='Write the timing of every phase of the run as Chrome trace events, '
+             'to open in chrome://tracing or Perfetto'
+    )
+    parser.add_argument(
+        '--history', type=str, default='driver-claw-history.db', metavar='PATH',
+        help='SQLite database the metrics of every run are appended to (default: driver-claw-history.db)'
+    )
+    parser.add_argument(
+        '--no-history', action='store_true',
+        help='Do not record the metrics of the run'
+    )
     parser.add_argument(
         '-s', '--silent', action='store_true', help='Suppress all output messages'
     )
@@ -87,18 +333,117 @@ if __name__ == '__main__':
         '-x', '--no-archive', action='store_true',
         help='Skip creating zip archive'
     )
+    group_archive.add_argument(
+        '--stream-archive', action='store_true',
+        help='Write downloaded files directly into the archive, without organizing them into the output directory'
+    )
+    parser.add_argument(
+        '--keep-tree', action='store_true',
+        help='With --stream-archive, also organize downloaded files into the output directory'
+    )
+
+    commands = parser.add_subparsers(dest='command', title='commands')
+    parser_report = commands.add_parser(
+        'report', help='Report the items of a run that became slower than in the previous runs, then exit',
+        description='Report the items of a run that took longer to locate or downloaded slower than '
+                    'the median of the previous runs. Exits with status 1 if any did.')
+    parser_report.add_argument(
+        '--history', type=str, default=argparse.SUPPRESS, metavar='PATH',
+        help='SQLite database of the metrics of the runs (default: driver-claw-history.db)'
+    )
+    parser_report.add_argument(
+        '--run', type=positive_int, metavar='ID',
+        help='Run to report (default: the latest)'
+    )
+    parser_report.add_argument(
+        '--window', type=positive_int, default=10, metavar='N',
+        help='Number of previous runs the baseline of an item is computed from (default: 10)'
+    )
+    parser_report.add_argument(
+        '--threshold', type=float, default=1.5, metavar='FACTOR',
+        help='Slowdown compared with the baseline from which an item regressed (default: 1.5)'
+    )
+    parser_report.add_argument(
+        '--min-runs', type=positive_int, default=3, metavar='N',
+        help='Minimum number of previous runs for an item to have a baseline (default: 3)'
+    )
+    parser_report.add_argument(
+        '--min-seconds', type=float, default=1, metavar='SECONDS',
+        help='Minimum duration of a phase to be compared, as shorter ones are mostly noise (default: 1)'
+    )
 
     args = parser.parse_args()
+    if args.command == 'report':
+        exit(report(args))
+    if args.dedupe and args.stream_archive:
+        parser.error('argument --dedupe: not allowed with argument --stream-archive')
+    if args.incremental and args.stream_archive:
+        parser.error('argument --incremental: not allowed with argument --stream-archive')
+    if args.keep_tree and not args.stream_archive:
+        parser.error('argument --keep-tree: only allowed with argument --stream-archive')
+
+    metrics = None if args.no_history else history.RunMetrics()
+    tracer = tracing.Tracer(args.trace, args.chrome_trace, metrics)
+    # the run exits from several places
+    atexit.register(tracer.close)
+    if metrics:
+        atexit.register(record, args.history, metrics)
 
     with setup_print(args.silent):
         if archive.LIB7ZIP is None:
-            print('Unable to locate 7zip, falling back to system\'s built-in tools.')
+            print('Unable to locate 7zip, falling back to system\'s built-in tools to extract archives.')
+
+        if args.apply_delta:
+            archive.apply_delta(*args.apply_delta, args.archive_name)
+            print(f'Rebuilt "{args.archive_name}" from "{args.apply_delta[0]}" and "{args.apply_delta[1]}".')
+            exit(0)
+
+        delta_base = args.delta_from
+        if (delta_base and os.path.exists(args.archive_name)
+                and os.path.samefile(delta_base, args.archive_name)):
+            # keep the previous archive, as the new one replaces it
+            delta_base = os.path.join(os.path.dirname(args.archive_name) or '.',
+                                      f'.{os.path.basename(args.archive_name)}.base')
+            if os.path.exists(delta_base):
+                os.remove(delta_base)
+            os.link(args.archive_name, delta_base)
 
         if not args.archive_only:
-            if not args.retry_failed and os.path.exists(args.output_dir):
+            if not (args.retry_failed or args.incremental) and os.path.exists(args.output_dir):
                 shutil.rmtree(args.output_dir)
 
-            claw = DriverClaw(args.output_dir)
+            stream = (archive.ArchiveStream(args.archive_name, args.compress_level, resume=args.retry_failed)
+                      if args.stream_archive else None)
+
+            claw = DriverClaw(args.output_dir,
+                              browsers=args.browsers,
+                              downloaders=args.downloaders,
+                              extractors=args.extractors,
+                              queue_size=args.queue_size,
+                              segments=args.segments,
+                              segment_threshold=args.segment_threshold * 1024 * 1024,
+                              retries=args.retries,
+                              cache=DownloadCache(args.cache_dir, args.cache_size * 1024 ** 3)
+                              if args.cache_dir else None,
+                              url_cache=UrlCache(os.path.join(args.cache_dir, 'urls.json'), args.url_ttl * 3600)
+                              if args.cache_dir and args.url_ttl > 0 else None,
+                              lean_browser=args.lean_browser,
+                              browser_profile=args.browser_profile,
+                              page_load_timeout=args.page_load_timeout,
+                              stream=stream,
+                              keep_tree=args.keep_tree,
+                              client=transfer.HttpClient(args.host_connections, args.max_connections,
+                                                         (args.connect_timeout, args.read_timeout)),
+                              bandwidth=args.bandwidth * 1024 * 1024 if args.bandwidth else None,
+                              crc32=args.crc32,
+                              incremental=args.incremental,
+                              resolve_timeout=args.resolve_timeout or None,
+                              recycle_after=args.recycle_after,
+                              resolve_retries=args.resolve_retries,
+                              download_retries=args.download_retries,
+                              backoff=retry.Backoff(args.backoff),
+                              breaker=retry.CircuitBreaker(args.breaker_threshold, args.breaker_cooldown),
+                              tracer=tracer)
 
             if args.retry_failed:
                 try:
@@ -116,7 +461,23 @@ if __name__ == '__main__':
             else:
                 targets = config.CLAW_PRIZES
 
-            failed = claw.start(targets, args.error_handling)
+            if args.incremental and not args.retry_failed:
+                for key in claw.prune(targets):
+                    print(f'Removed "{key}", no longer in the configuration.')
+
+            with stream or nullcontext():
+                failed = claw.start(targets, args.error_handling)
+
+                if stream and len(failed) == 0:
+                    for path in args.include_files or []:
+                        stream.add_path(os.path.basename(os.path.normpath(path)), path)
+                    if claw.manifest.path.exists():
+                        stream.add_file(f'{os.path.basename(os.path.normpath(args.output_dir))}/{manifest.MANIFEST_NAME}',
+                                        claw.manifest.path)
+                    stream.finish()
+
+            if args.dedupe and not args.stream_archive:
+                dedupe(claw.manifest)
 
             if len(failed) > 0:
                 print(
@@ -125,16 +486,44 @@ if __name__ == '__main__':
             if args.no_archive:
                 exit(0)
 
-        if not os.path.exists(args.output_dir):
-            print(
-                f'Error: Output directory "{args.output_dir}" does not exist.')
-            exit(1)
-        if not os.listdir(args.output_dir):
-            print(f'Error: Output directory "{args.output_dir}" is empty.')
-            exit(1)
-
-        archive.zip(args.archive_name,
-                    *(args.include_files or []),
-                    args.output_dir,
-                    level=args.compress_level,
-                    silent=args.silent)
+        if not args.stream_archive:
+            if not os.path.exists(args.output_dir):
+                print(
+                    f'Error: Output directory "{args.output_dir}" does not exist.')
+                exit(1)
+            if not os.listdir(args.output_dir):
+                print(f'Error: Output directory "{args.output_dir}" is empty.')
+                exit(1)
+
+            records = manifest.Manifest(args.output_dir)
+            if args.dedupe and args.archive_only:
+                dedupe(records)
+            digests = records.digests()
+            if duplicates := records.duplicates():
+                print(f'Compressing {sum(len(paths) - 1 for paths in duplicates)} duplicate file(s) of '
+                      f'{sum((len(paths) - 1) * digests[paths[0]]['size'] for paths in duplicates) / 1024 ** 2:.1f} MiB '
+                      'only once.')
+
+            with tracer.span('archive', update=args.update_archive) as span:
+                entries = archive.zip(args.archive_name,
+                                      *(args.include_files or []),
+                                      args.output_dir,
+                                      level=args.compress_level,
+                                      workers=args.archive_workers,
+                                      update=args.update_archive,
+                                      digests=digests)
+                span['entries'] = len(entries)
+                span['bytes'] = sum(entry.file_size for entry in entries)
+
+        if delta_base:
+            delta_name = f'{os.path.splitext(args.archive_name)[0]}.delta.zip'
+            with tracer.span('delta'):
+                delta_manifest = archive.delta(delta_name, delta_base, args.archive_name)
+            changed = sum(entry['source'] == 'delta' and not entry['name'].endswith('/')
+                          for entry in delta_manifest['entries'])
+            print(f'Created delta pack "{delta_name}": {changed} new or changed and '
+                  f'{len(delta_manifest['deleted'])} removed entries, '
+                  f'{os.path.getsize(delta_name) / 1024 ** 2:.1f} of '
+                  f'{os.path.getsize(args.archive_name) / 1024 ** 2:.1f} MiB.')
+            if delta_base != args.delta_from:
+                os.remove(delta_base)
@@ -0,0 +1,250 @@
+"""Integrity manifest of the output directory.
+
+Every organized item is recorded in `manifest.json` at the root of the output
+directory, and so bundled into the archive: the download URL, when it was
+located, the validators of the server, and the checksums and sizes of the
+downloaded file and of every file laid out for the item.
+
+Checksums are computed while the bytes are written, by the downloads and the
+extraction, so later steps can trust the manifest instead of reading the files
+again.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import zlib
+from pathlib import Path
+from typing import TypedDict
+
+MANIFEST_NAME = 'manifest.json'
+"""Name of the manifest file at the root of the output directory.
+"""
+
+CHUNK_SIZE = 1024 * 1024
+"""Number of bytes read at a time when hashing a file.
+"""
+
+
+class FileDigest(TypedDict):
+    sha256: str | None
+    """SHA-256 hash of the file, or None if it was not computed."""
+    crc32: int | None
+    """CRC-32 of the file, or None if it was not computed."""
+    size: int
+    """Size of the file in bytes."""
+
+
+class ManifestItem(TypedDict):
+    url: str
+    """Download URL."""
+    resolved_at: float
+    """Time the download URL was located, in seconds since the epoch."""
+    fname: str
+    """Name of the downloaded file."""
+    etag: str | None
+    """ETag returned by the server."""
+    last_modified: str | None
+    """Last-Modified date returned by the server."""
+    download: FileDigest
+    """Checksums of the downloaded file."""
+    files: dict[str, FileDigest]
+    """Checksums of the files of the item, by path relative to its directory."""
+
+
+class Hasher:
+    """SHA-256, and optionally CRC-32, of data fed in order.
+    """
+
+    size: int
+    """Number of bytes hashed so far.
+    """
+
+    def __init__(self, crc32: bool = False):
+        self.size = 0
+        self._sha256 = hashlib.sha256()
+        self._crc32 = 0 if crc32 else None
+
+    def update(self, data: bytes) -> None:
+        """Hash the next bytes.
+        """
+        self._sha256.update(data)
+        if self._crc32 is not None:
+            self._crc32 = zlib.crc32(data, self._crc32)
+        self.size += len(data)
+
+    def update_from(self, path: str | Path) -> None:
+        """Hash the bytes of a file past the ones hashed so far.
+        """
+        with open(path, 'rb') as f:
+            f.seek(self.size)
+            while chunk := f.read(CHUNK_SIZE):
+                self.update(chunk)
+
+    def digest(self) -> FileDigest:
+        """Checksums of the bytes hashed so far.
+        """
+        return {'sha256': self._sha256.hexdigest(), 'crc32': self._crc32, 'size': self.size}
+
+    @classmethod
+    def file(cls, path: str | Path, crc32: bool = False) -> FileDigest:
+        """Compute the checksums of a file.
+        """
+        hasher = cls(crc32)
+        hasher.update_from(path)
+        return hasher.digest()
+
+
+class Manifest:
+    """The manifest of an output directory, saved every time an item is recorded.
+    """
+
+    root: Path
+    """Output directory.
+    """
+
+    items: dict[str, ManifestItem]
+    """Recorded items, by path of their directory relative to `root`.
+    """
+
+    def __init__(self, root: str | Path):
+        self.root = Path(root)
+        self._lock = threading.Lock()
+
+        try:
+            with open(self.path) as f:
+                self.items = json.load(f)['items']
+        except (FileNotFoundError, ValueError, KeyError):
+            self.items = {}
+
+    @property
+    def path(self) -> Path:
+        """Path to the manifest file.
+        """
+        return self.root.joinpath(MANIFEST_NAME)
+
+    def put(self, key: str, item: ManifestItem) -> None:
+        """Record an item, replacing its previous record.
+
+        Args:
+            key (str): Path of the directory of the item relative to `root`.
+            item (ManifestItem): The item.
+        """
+        with self._lock:
+            self.items[key] = item
+            self._save()
+
+    def intact(self, key: str) -> bool:
+        """Check whether the files of an item are still in place, by size.
+
+        Args:
+            key (str): Path of the directory of the item relative to `root`.
+
+        Returns:
+            bool: False if the item is not recorded or a file is missing or was resized.
+        """
+        with self._lock:
+            item = self.items.get(key)
+        if item is None:
+            return False
+        try:
+            return all(self.root.joinpath(key, name).stat().st_size == digest['size']
+                       for name, digest in item['files'].items())
+        except OSError:
+            return False
+
+    def discard(self, key: str) -> None:
+        """Delete the recorded files of an item and forget it.
+
+        Directories left empty are removed, up to `root`.
+
+        Args:
+            key (str): Path of the directory of the item relative to `root`.
+        """
+        with self._lock:
+            item = self.items.pop(key, None)
+            if item is None:
+                return
+
+            for name in item['files']:
+                path = self.root.joinpath(key, name)
+                path.unlink(True)
+                for parent in path.parents:
+                    if parent == self.root or not parent.is_relative_to(self.root):
+                        break
+                    try:
+                        parent.rmdir()
+                    except OSError:
+                        break
+            self._save()
+
+    def prune(self, keys: set[str]) -> list[str]:
+        """Discard the items missing from a set of keys.
+
+        Args:
+            keys (set[str]): Keys of the items to keep.
+
+        Returns:
+            list[str]: Keys of the discarded items.
+        """
+        with self._lock:
+            removed = [key for key in self.items if key not in keys]
+        for key in removed:
+            self.discard(key)
+        return removed
+
+    def duplicates(self) -> list[list[Path]]:
+        """Recorded files with the same content, by SHA-256 hash and size.
+
+        Returns:
+            list[list[Path]]: Groups of two or more files with the same content,
+                in the order they were recorded.
+        """
+        groups: dict[tuple[str, int], list[Path]] = {}
+        for path, digest in self.digests().items():
+            if digest['sha256']:
+                groups.setdefault((digest['sha256'], digest['size']), []).append(path)
+        return [paths for paths in groups.values() if len(paths) > 1]
+
+    def dedupe(self) -> tuple[int, int]:
+        """Replace the duplicates of recorded files by hardlinks to the first of their group.
+
+        Files already linked are left alone, and files that cannot be linked,
+        such as on file systems without hardlinks, are kept as they are.
+
+        Returns:
+            tuple[int, int]: Number of files replaced by a hardlink, and bytes freed.
+        """
+        linked = saved = 0
+        for first, *others in self.duplicates():
+            for path in others:
+                link = path.with_name(f'.{path.name}.link')
+                try:
+                    if path.samefile(first):
+                        continue
+                    size = path.stat().st_size
+                    link.unlink(True)
+                    os.link(first, link)
+                    os.replace(link, path)
+                except OSError:
+                    link.unlink(True)
+                    continue
+                linked += 1
+                saved += size
+        return linked, saved
+
+    def digests(self) -> dict[Path, FileDigest]:
+        """Checksums of the recorded files, by absolute path.
+        """
+        with self._lock:
+            return {self.root.joinpath(key, name).absolute(): digest
+                    for key, item in self.items.items()
+                    for name, digest in item['files'].items()}
+
+    def _save(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.path.with_suffix('.tmp'), 'w') as f:
+            json.dump({'items': self.items}, f, indent=1)
+        os.replace(self.path.with_suffix('.tmp'), self.path)
+
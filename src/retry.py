@@ -0,0 +1,130 @@
+"""Retries of transient failures within a run.
+
+Failed items are tried again after a jittered exponential delay (see
+`Backoff`), rather than waiting for a later run with `--retry-failed`. A
+circuit breaker per host (see `CircuitBreaker`) stops sending requests to a
+host that keeps failing, so other hosts are served in the meantime and the
+failing one is tried again once it had time to recover.
+"""
+
+import email.utils
+import random
+import threading
+import time
+
+import requests
+
+TRANSIENT_STATUS_CODES = frozenset({408, 425, 429, 500, 502, 503, 504})
+"""HTTP status codes of failures worth retrying.
+"""
+
+
+def transient(e: Exception) -> bool:
+    """Whether a download error is likely to go away when retried, such as a
+    dropped connection or a server error.
+    """
+    if isinstance(e, requests.HTTPError):
+        return e.response is not None and e.response.status_code in TRANSIENT_STATUS_CODES
+    return isinstance(e, (requests.ConnectionError, requests.Timeout,
+                          requests.exceptions.ChunkedEncodingError, ConnectionError, TimeoutError))
+
+
+def retry_after(e: Exception) -> float:
+    """Seconds the server asked to wait before retrying, from the `Retry-After`
+    header of an HTTP error, or 0.
+    """
+    response = getattr(e, 'response', None)
+    if response is None or not (value := response.headers.get('Retry-After')):
+        return 0
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return 0
+
+
+class Backoff:
+    """Exponential delays between the attempts of an item, with full jitter.
+
+    The delay before retry `n` (from 0) is drawn uniformly between 0 and
+    `base * 2 ** n`, capped at `cap`, so items failing together do not come
+    back together.
+    """
+
+    base: float
+    """Upper bound of the delay before the first retry, in seconds.
+    """
+
+    cap: float
+    """Maximum delay in seconds.
+    """
+
+    def __init__(self, base: float = 2, cap: float = 60):
+        self.base = base
+        self.cap = cap
+
+    def delay(self, attempt: int) -> float:
+        """Seconds to wait before a retry.
+
+        Args:
+            attempt (int): Number of retries made so far.
+        """
+        return random.uniform(0, min(self.cap, self.base * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """Failure tracking per host.
+
+    A host, by name and port, whose requests failed `threshold` times in a row
+    is cut off for `cooldown` seconds. Afterwards, its next request decides: a
+    success closes the breaker, a failure cuts the host off again.
+
+    Thread-safe.
+    """
+
+    threshold: int
+    """Number of consecutive failures after which a host is cut off.
+    """
+
+    cooldown: float
+    """Seconds a host is cut off for.
+    """
+
+    def __init__(self, threshold: int = 3, cooldown: float = 60):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures: dict[str, int] = {}
+        self._until: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def retry_in(self, host: str | None) -> float:
+        """Seconds until requests to a host may be sent again, 0 if they may now.
+        """
+        with self._lock:
+            return max(0, self._until.get(host, 0) - time.monotonic())
+
+    def success(self, host: str | None):
+        """Record a successful request to a host, closing its breaker.
+        """
+        with self._lock:
+            self._failures.pop(host, None)
+            self._until.pop(host, None)
+
+    def failure(self, host: str | None) -> bool:
+        """Record a failed request to a host.
+
+        Returns:
+            bool: Whether the host was cut off by this failure, rather than
+                already cut off or still below `threshold`.
+        """
+        if host is None:
+            return False
+        with self._lock:
+            self._failures[host] = self._failures.get(host, 0) + 1
+            if self._failures[host] < self.threshold:
+                return False
+            now = time.monotonic()
+            opened = self._until.get(host, 0) <= now
+            self._until[host] = now + self.cooldown
+            return opened
@@ -0,0 +1,161 @@
+"""Timing trace of a run.
+
+A `Tracer` records spans, the phases of the run and of every item (locating
+the download URL, launching a browser, loading pages, waiting for elements,
+downloading, extracting and organizing), with their start time, duration and
+details such as the number of bytes downloaded.
+
+Spans are written as they end, as JSON lines and, optionally, as Chrome trace
+events, which can be opened in `chrome://tracing` or https://ui.perfetto.dev
+for a timeline with one row per item. They can also be accounted for in the
+metrics of the run kept in the history of past runs (see `history.py`). A
+tracer without outputs records nothing and costs next to nothing.
+"""
+
+import contextlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Iterator
+
+from history import RunMetrics
+
+
+class Tracer:
+    """Span recorder writing JSON lines and Chrome trace events.
+
+    Spans opened with `span` nest: spans of the same thread without an item of
+    their own belong to the item of the innermost span that has one.
+
+    Thread-safe.
+    """
+
+    enabled: bool
+    """Whether spans are recorded, i.e. the tracer has an output.
+    """
+
+    metrics: RunMetrics | None
+    """Metrics of the run the spans are accounted for in, if any.
+    """
+
+    def __init__(self, jsonl: str | Path | None = None, chrome: str | Path | None = None,
+                 metrics: RunMetrics | None = None):
+        self.enabled = bool(jsonl or chrome or metrics)
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._labels: dict[int, str] = {}
+        self._jsonl = open(jsonl, 'w') if jsonl else None
+        self._chrome = open(chrome, 'w') if chrome else None
+        if self._chrome:
+            # the array format, which viewers read even if it is not closed
+            self._chrome.write('[\n')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def label(self, item: int, label: str):
+        """Name an item, in the JSON lines and as the row of its spans in the Chrome trace.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self._labels[item] = label
+            self._emit_chrome({'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(),
+                               'tid': item + 1, 'args': {'name': label}})
+
+    def span(self, name: str, item: int | None = None, **args: Any) -> contextlib.AbstractContextManager[dict[str, Any]]:
+        """Time a block of code.
+
+        Args:
+            name (str): Name of the phase.
+            item (int | None): Index of the item, if any. Defaults to the item
+                of the enclosing span of the thread.
+            **args: Details of the span.
+
+        Returns:
+            contextlib.AbstractContextManager[dict[str, Any]]: Context yielding
+                the details of the span, which can be completed within the block.
+                An error leaving the block is recorded as the `error` detail.
+        """
+        if not self.enabled:
+            return contextlib.nullcontext(args)
+        return self._span(name, item, args)
+
+    @contextlib.contextmanager
+    def _span(self, name: str, item: int | None, args: dict[str, Any]) -> Iterator[dict[str, Any]]:
+        if not hasattr(self._local, 'items'):
+            self._local.items = []
+        stack: list[int | None] = self._local.items
+        if item is None and stack:
+            item = stack[-1]
+        stack.append(item)
+        start = time.time()
+        try:
+            yield args
+        except BaseException as e:
+            args['error'] = repr(e)
+            raise
+        finally:
+            stack.pop()
+            self.record(name, item, start, time.time() - start, **args)
+
+    def record(self, name: str, item: int | None, start: float, seconds: float, **args: Any):
+        """Record a span measured by the caller.
+
+        Spans with a `bytes` detail also get their `rate`, in bytes per second.
+
+        Args:
+            name (str): Name of the phase.
+            item (int | None): Index of the item, if any. Defaults to the item
+                of the enclosing span of the thread.
+            start (float): Start time, in seconds since the epoch.
+            seconds (float): Duration.
+            **args: Details of the span.
+        """
+        if not self.enabled:
+            return
+        if item is None and (stack := getattr(self._local, 'items', None)):
+            item = stack[-1]
+        if 'bytes' in args and seconds > 0:
+            args['rate'] = args['bytes'] / seconds
+        if self.metrics:
+            self.metrics.add(name, self._labels.get(item), start, seconds, args)
+
+        with self._lock:
+            if self._jsonl:
+                self._jsonl.write(json.dumps({'name': name, 'item': item, 'label': self._labels.get(item),
+                                              'start': start, 'seconds': seconds, **args},
+                                             default=str) + '\n')
+                self._jsonl.flush()
+            self._emit_chrome({'name': name, 'cat': name.split('.')[0], 'ph': 'X',
+                               'ts': round(start * 1e6), 'dur': round(seconds * 1e6),
+                               'pid': os.getpid(), 'tid': 0 if item is None else item + 1,
+                               'args': args})
+
+    def _emit_chrome(self, event: dict[str, Any]):
+        """Append a Chrome trace event. The caller must hold the lock.
+        """
+        if self._chrome:
+            self._chrome.write(json.dumps(event, default=str) + ',\n')
+            self._chrome.flush()
+
+    def close(self):
+        """Close the outputs.
+        """
+        with self._lock:
+            if self._jsonl:
+                self._jsonl.close()
+                self._jsonl = None
+            if self._chrome:
+                # a final event, as the array may not end with a comma
+                self._chrome.write(json.dumps({'name': 'process_name', 'ph': 'M', 'pid': os.getpid(),
+                                               'args': {'name': 'driver-claw'}}) + '\n]\n')
+                self._chrome.close()
+                self._chrome = None
+            self.enabled = False
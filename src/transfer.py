@@ -0,0 +1,374 @@
+"""HTTP transfer helpers for downloading driver packages.
+
+This module supports segmented and resumable downloads: when a server
+supports byte range requests, a large file is fetched over several concurrent
+connections, each writing its own part of a preallocated file. Progress is
+recorded in a sidecar file, so an interrupted download can be resumed later.
+The transfers themselves are run by `engine.DownloadEngine`.
+
+An `HttpClient` holds the settings of the requests of a run: connection caps
+per host and in total, connect and read timeouts, and the headers of the
+policy of each host (see `HOST_POLICIES`).
+"""
+
+import hashlib
+import itertools
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import TypedDict
+from urllib.parse import urlparse
+
+import requests
+
+from manifest import FileDigest, Hasher
+
+CHUNK_SIZE = 64 * 1024
+"""Number of bytes read from a response at a time.
+"""
+
+
+class HostPolicy(TypedDict, total=False):
+    headers: dict[str, str]
+    """Headers sent with every request to the host."""
+    referer: bool
+    """Whether the host name is sent as referer."""
+    connections: int
+    """Maximum number of concurrent connections to the host, overriding the client-wide cap."""
+
+
+DEFAULT_POLICY: HostPolicy = {
+    'headers': {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:138.0) Gecko/20100101 Firefox/138.0'},
+    'referer': True,
+}
+"""Policy of hosts missing from `HOST_POLICIES`.
+"""
+
+HOST_POLICIES: dict[str, HostPolicy] = {
+    # both serve downloads through mirrors rejecting browser-like requests
+    'sourceforge.net': {'headers': {}, 'referer': False},
+    'geeks3d.com': {'headers': {}, 'referer': False},
+}
+"""Request policies by domain, also applying to its subdomains.
+"""
+
+
+def policy_of(host: str) -> HostPolicy:
+    """Find the request policy of a host, see `HOST_POLICIES`.
+
+    Args:
+        host (str): Host name.
+
+    Returns:
+        HostPolicy: Policy of the most specific domain matching the host, or
+            `DEFAULT_POLICY`.
+    """
+    parts = host.lower().split('.')
+    for i in range(len(parts)):
+        if (policy := HOST_POLICIES.get('.'.join(parts[i:]))) is not None:
+            return policy
+    return DEFAULT_POLICY
+
+
+class HttpClient:
+    """HTTP settings shared by the requests of a run.
+
+    Downloads hold a connection slot for as long as a response is open, so at
+    most `per_host` responses from a host, and at most `total` responses
+    overall, are streamed at the same time (see `engine.DownloadEngine`).
+    """
+
+    per_host: int
+    """Default maximum number of concurrent connections to a host.
+    """
+
+    total: int
+    """Maximum number of concurrent connections overall.
+    """
+
+    timeout: tuple[float, float]
+    """Connect and read timeouts in seconds. The read timeout applies to every
+    read of the response, not to the whole transfer.
+    """
+
+    session: requests.Session
+    """Session for short synchronous requests, such as those of the browserless fast paths.
+    """
+
+    def __init__(self, per_host: int = 6, total: int = 16, timeout: tuple[float, float] = (10, 60)):
+        self.per_host = per_host
+        self.total = total
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=32,
+            pool_maxsize=max([per_host] + [policy.get('connections', 0) for policy in HOST_POLICIES.values()]))
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def proxy(self, url: str) -> str | None:
+        """Proxy for a URL, picked from the environment (`HTTP_PROXY`,
+        `HTTPS_PROXY`, `ALL_PROXY` and `NO_PROXY`) the way `requests` does.
+
+        Returns:
+            str | None: URL of the proxy, or None to connect directly.
+        """
+        if not self.session.trust_env:
+            return None
+        proxy = requests.utils.select_proxy(url, requests.utils.get_environ_proxies(url))
+        return requests.utils.prepend_scheme_if_needed(proxy, 'http') if proxy else None
+
+    def headers(self, url: str) -> dict[str, str]:
+        """Headers sent to the host of a URL, following its policy.
+        """
+        host = urlparse(url).hostname or ''
+        policy = policy_of(host)
+        headers = dict(policy.get('headers', {}))
+        if policy.get('referer'):
+            headers['referer'] = host
+        return headers
+
+    def close(self):
+        """Close the pooled connections of the session.
+        """
+        self.session.close()
+
+
+def supports_ranges(resp: requests.Response) -> bool:
+    """Check whether a response can be fetched again in byte ranges.
+
+    Args:
+        resp (requests.Response): Response of a plain GET request.
+
+    Returns:
+        bool: True if the server advertises byte ranges and a content length,
+            and the body is not transfer-encoded.
+    """
+    return (resp.headers.get('Accept-Ranges', '').lower() == 'bytes'
+            and int(resp.headers.get('Content-Length', 0)) > 0
+            and resp.headers.get('Content-Encoding', 'identity') == 'identity')
+
+
+def split_ranges(size: int, segments: int) -> list[tuple[int, int]]:
+    """Split a file size into contiguous, inclusive byte ranges.
+
+    Args:
+        size (int): Size of the file in bytes.
+        segments (int): Number of ranges to split into.
+
+    Returns:
+        list[tuple[int, int]]: First and last byte of each range.
+    """
+    segments = max(1, min(segments, size))
+    step = -(-size // segments)
+    return [(start, min(start + step, size) - 1) for start in range(0, size, step)]
+
+
+class Partial:
+    """A partially downloaded file and its sidecar metadata.
+
+    The sidecar records the URL, the validators (ETag, Last-Modified and size)
+    of the resource and the number of bytes received in each segment, so the
+    download can be resumed by a later attempt, even from another process.
+
+    Received bytes are hashed as they are written, as long as they extend the
+    beginning of the file; `digest` only reads back the others, such as the
+    later segments of a segmented download.
+    """
+
+    path: Path
+    """Path to the partially downloaded file.
+    """
+
+    url: str
+    """Download URL.
+    """
+
+    etag: str | None
+    """ETag of the resource when the download started.
+    """
+
+    last_modified: str | None
+    """Last-Modified date of the resource when the download started.
+    """
+
+    size: int
+    """Size of the resource in bytes, or 0 if unknown.
+    """
+
+    segments: list[list[int]]
+    """First byte, last byte (inclusive) and number of bytes received of each segment.
+    """
+
+    crc32: bool
+    """Whether the CRC-32 of the file is computed along with its SHA-256 hash.
+    """
+
+    SAVE_INTERVAL = 1
+    """Minimum number of seconds between two sidecar updates during a transfer.
+    """
+
+    _completed = itertools.count()
+
+    def __init__(self, directory: str | Path, url: str, crc32: bool = False):
+        key = hashlib.sha256(url.encode()).hexdigest()[:32]
+
+        self.path = Path(directory).joinpath(f'{key}.part')
+        self.url = url
+        self.etag = None
+        self.last_modified = None
+        self.size = 0
+        self.segments = []
+        self.crc32 = crc32
+        self._hasher = Hasher(crc32)
+        self._lock = threading.Lock()
+        self._saved_at = 0
+
+        try:
+            with open(self._sidecar) as f:
+                meta = json.load(f)
+            if meta['url'] == url and self.path.exists():
+                self.etag = meta['etag']
+                self.last_modified = meta['last_modified']
+                self.size = meta['size']
+                self.segments = meta['segments']
+        except (FileNotFoundError, ValueError, KeyError):
+            pass
+
+    @property
+    def _sidecar(self) -> Path:
+        return self.path.with_suffix('.json')
+
+    @property
+    def received(self) -> int:
+        """Number of bytes received so far.
+        """
+        return sum(received for _, _, received in self.segments)
+
+    @property
+    def validator(self) -> str | None:
+        """Strong validator of the resource, suitable for an `If-Range` header.
+        """
+        if self.etag and not self.etag.startswith('W/'):
+            return self.etag
+        return self.last_modified
+
+    def resumable(self, resp: requests.Response) -> bool:
+        """Check whether the partial file can be completed from the resource of a response.
+
+        Args:
+            resp (requests.Response): Response of a plain GET request to the resource.
+
+        Returns:
+            bool: True if some bytes were received, the server supports byte ranges
+                and the resource has not changed since.
+        """
+        return (self.received > 0
+                and self.validator is not None
+                and supports_ranges(resp)
+                and resp.headers.get('ETag') == self.etag
+                and resp.headers.get('Last-Modified') == self.last_modified
+                and int(resp.headers.get('Content-Length', 0)) == self.size)
+
+    def reset(self, resp: requests.Response, segments: int) -> None:
+        """Start the partial file over for the resource of a response.
+
+        Args:
+            resp (requests.Response): Response of a plain GET request to the resource.
+            segments (int): Number of segments to split the file into.
+        """
+        self.etag = resp.headers.get('ETag')
+        self.last_modified = resp.headers.get('Last-Modified')
+        self.size = int(resp.headers.get('Content-Length', 0))
+        self.segments = ([[start, end, 0] for start, end in split_ranges(self.size, segments)]
+                         if self.size > 0 else [[0, -1, 0]])
+        self._hasher = Hasher(self.crc32)
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'wb') as f:
+            f.truncate(self.size)
+        self.save()
+
+    def advance(self, index: int, chunk: bytes) -> None:
+        """Record bytes received in a segment.
+
+        Args:
+            index (int): Index of the segment.
+            chunk (bytes): Bytes written to the partial file, following those
+                received before in the segment.
+        """
+        with self._lock:
+            start, _, received = self.segments[index]
+            if start + received == self._hasher.size:
+                self._hasher.update(chunk)
+            self.segments[index][2] += len(chunk)
+            if time.monotonic() - self._saved_at >= self.SAVE_INTERVAL:
+                self._save()
+
+    def save(self) -> None:
+        """Write the sidecar metadata.
+        """
+        with self._lock:
+            self._save()
+
+    def _save(self):
+        with open(self._sidecar.with_suffix('.tmp'), 'w') as f:
+            json.dump({'url': self.url,
+                       'etag': self.etag,
+                       'last_modified': self.last_modified,
+                       'size': self.size,
+                       'segments': self.segments}, f)
+        os.replace(self._sidecar.with_suffix('.tmp'), self._sidecar)
+        self._saved_at = time.monotonic()
+
+    def digest(self) -> FileDigest:
+        """Checksums of the received file.
+
+        Bytes that were not hashed while being written are read back from the
+        partial file, which must be complete.
+        """
+        with self._lock:
+            self._hasher.update_from(self.path)
+            return self._hasher.digest()
+
+    def complete(self, suffix: str = '') -> Path:
+        """Finish the download, removing the sidecar metadata.
+
+        Args:
+            suffix (str): Suffix given to the completed file.
+
+        Returns:
+            Path: Path to the completed file, which the caller is responsible for deleting.
+
+        Raises:
+            RuntimeError: If some bytes are still missing.
+        """
+        if self.size > 0 and self.received != self.size:
+            raise RuntimeError(
+                f'Incomplete download: {self.received} of {self.size} bytes received.')
+
+        self._sidecar.unlink(True)
+        return self.path.replace(self.destination(suffix))
+
+    def destination(self, suffix: str = '') -> Path:
+        """Unused path for a completed file, so files completed from the same
+        URL do not replace one another.
+
+        Args:
+            suffix (str): Suffix of the file.
+        """
+        return self.path.with_name(f'{self.path.stem}-{next(self._completed)}{suffix}')
+
+    def discard(self) -> None:
+        """Remove the partial file and its sidecar metadata.
+        """
+        self.path.unlink(True)
+        self._sidecar.unlink(True)
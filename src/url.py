@@ -7,16 +7,440 @@ drivers and system utilities from vendor websites.
 
 Each function targets a specific vendor or tool, navigating their support
 pages and locating the appropriate download link using XPath or CSS selectors.
+
+Vendor pages listing several drivers are captured once per run as a page
+snapshot, holding every candidate download link of the page, so that resolvers
+targeting different drivers of the same page do not load it again.
+
+Resolvers wait for explicit readiness conditions (see `wait`) rather than for a
+fixed amount of time. Every resolver has a time budget for all of its waits,
+and the time actually spent waiting is recorded (see `track_waits`).
+
+Resolvers of static pages also have a browserless fast path (see `fast_path`),
+which fetches the page with a plain HTTP session and parses it with lxml. The
+browser is only used when the fast path is unavailable or fails.
 """
 
 
+import contextlib
+import functools
+import threading
 import time
-from typing import Literal
+from typing import Any, Callable, Hashable, Iterator, Literal
+from urllib.parse import urldefrag
 
+import requests
 from selenium import webdriver
+from selenium.common.exceptions import (StaleElementReferenceException,
+                                        TimeoutException)
 from selenium.webdriver.common.by import By
+from selenium.webdriver.remote.webelement import WebElement
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.wait import WebDriverWait
+
+from browser import unwatched
+
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+DEFAULT_BUDGET = 30
+"""Default number of seconds a resolver may spend waiting for pages to be ready.
+"""
+
+HTTP_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:138.0) Gecko/20100101 Firefox/138.0',
+    'Accept-Language': 'zh-Hant',
+}
+"""Headers of the requests made by fast paths.
+"""
+
+
+def stateful(func: Callable[..., str]) -> Callable[..., str]:
+    """Mark a resolver as depending on the browser state left by its previous calls.
+
+    Claw prizes using a stateful resolver are resolved one after another on the
+    same browser session, in configuration order.
+    """
+    func.stateful = True
+    return func
+
+
+def budget(seconds: float) -> Callable[[Callable[..., str]], Callable[..., str]]:
+    """Set how many seconds a resolver may spend waiting for pages to be ready, in total.
+
+    Resolvers without a budget get `DEFAULT_BUDGET` seconds.
+
+    Args:
+        seconds (float): Number of seconds.
+    """
+    def decorator(func: Callable[..., str]) -> Callable[..., str]:
+        func.budget = seconds
+        return func
+    return decorator
+
+
+def budget_of(resolver: Callable[..., str]) -> float:
+    """Number of seconds a resolver may spend waiting, see `budget`.
+    """
+    return getattr(getattr(resolver, 'func', resolver), 'budget', DEFAULT_BUDGET)
+
+
+def fast_path(http_resolver: Callable[..., str]) -> Callable[[Callable[..., str]], Callable[..., str]]:
+    """Give a resolver a browserless variant, tried before launching a browser.
+
+    The variant takes a `requests.Session` in place of the WebDriver instance,
+    followed by the same arguments as the resolver.
+
+    Args:
+        http_resolver (Callable[..., str]): Browserless variant of the resolver.
+    """
+    def decorator(func: Callable[..., str]) -> Callable[..., str]:
+        func.fast_path = http_resolver
+        return func
+    return decorator
+
+
+def fast_path_of(resolver: Callable[..., str]) -> Callable[[requests.Session], str] | None:
+    """Browserless variant of a resolver with its arguments bound, see `fast_path`.
+
+    Returns:
+        Callable[[requests.Session], str] | None: The variant, or None if the
+            resolver has none or lxml is not installed.
+    """
+    func = getattr(getattr(resolver, 'func', resolver), 'fast_path', None)
+    if func is None or lxml is None:
+        return None
+    if isinstance(resolver, functools.partial):
+        return functools.partial(func, *resolver.args, **resolver.keywords)
+    return func
+
+
+def page_affinity(func: Callable[..., str]) -> Callable[..., str]:
+    """Mark a resolver as reusing the page left open by a previous call with the same `url` argument.
+
+    Claw prizes using the resolver with the same `url` are resolved one after
+    another on the same browser session, in configuration order.
+    """
+    func.page_affinity = True
+    return func
+
+
+def lean(func: Callable[..., str]) -> Callable[..., str]:
+    """Mark a resolver as working with the lean browser profile (see `browser.new_browser`).
+
+    Such resolvers only read links from the page, so images, web fonts, media
+    and trackers can be left out, and they do not need to wait for the page to
+    be fully loaded.
+    """
+    func.lean = True
+    return func
+
+
+def lean_of(resolver: Callable[..., str]) -> bool:
+    """Whether a resolver works with the lean browser profile, see `lean`.
+    """
+    return getattr(getattr(resolver, 'func', resolver), 'lean', False)
+
+
+def cache_ttl(seconds: float) -> Callable[[Callable[..., str]], Callable[..., str]]:
+    """Set how long the URL located by a resolver may be reused from the URL cache.
+
+    Resolvers without a TTL use the default of the cache (see `cache.UrlCache`).
+
+    Args:
+        seconds (float): Number of seconds a located URL stays fresh. 0 disables caching.
+    """
+    def decorator(func: Callable[..., str]) -> Callable[..., str]:
+        func.ttl = seconds
+        return func
+    return decorator
+
+
+class WaitLedger:
+    """Time budget and time spent waiting of a resolver call.
+    """
+
+    deadline: float
+    """Monotonic time at which the budget runs out.
+    """
+
+    waited: float
+    """Number of seconds spent waiting so far.
+    """
+
+    waits: list[tuple[float, float]]
+    """Start time, in seconds since the epoch, and duration of every wait so far.
+    """
+
+    def __init__(self, seconds: float):
+        self.deadline = time.monotonic() + seconds
+        self.waited = 0.0
+        self.waits = []
+
+
+_ledgers = threading.local()
+
+
+@contextlib.contextmanager
+def track_waits(seconds: float) -> Iterator[WaitLedger]:
+    """Give the resolver calls of the current thread a time budget for waiting.
+
+    Args:
+        seconds (float): Number of seconds, e.g. from `budget_of`.
+
+    Yields:
+        WaitLedger: The ledger recording the time spent waiting.
+    """
+    _ledgers.current = WaitLedger(seconds)
+    try:
+        yield _ledgers.current
+    finally:
+        _ledgers.current = None
+
+
+def wait(remote: webdriver.Remote, condition: Callable[[webdriver.Remote], Any], timeout: float | None = None) -> Any:
+    """Wait until a condition holds, within the remaining budget of the current resolver call.
+
+    Args:
+        remote (webdriver.Remote): Selenium WebDriver instance.
+        condition (Callable[[webdriver.Remote], Any]): Condition, e.g. from
+            `selenium.webdriver.support.expected_conditions`, returning a truthy
+            value once it holds.
+        timeout (float | None): Optional shorter timeout in seconds.
+
+    Returns:
+        Any: The value returned by the condition.
+
+    Raises:
+        TimeoutException: If the condition does not hold in time.
+    """
+    ledger: WaitLedger | None = getattr(_ledgers, 'current', None)
+    remaining = (max(0, ledger.deadline - time.monotonic())
+                 if ledger else DEFAULT_BUDGET)
+    started = time.time()
+
+    try:
+        return (WebDriverWait(remote, remaining if timeout is None else min(timeout, remaining),
+                              poll_frequency=0.2, ignored_exceptions=(StaleElementReferenceException,))
+                .until(condition))
+    finally:
+        if ledger:
+            ledger.waits.append((started, time.time() - started))
+            ledger.waited += ledger.waits[-1][1]
+
+
+def attribute_populated(by: str, value: str, attribute: str = 'href') -> Callable[[webdriver.Remote], str | bool]:
+    """Condition that an element is present with a non-empty attribute.
+
+    Args:
+        by (str): Locator strategy.
+        value (str): Locator.
+        attribute (str): Name of the attribute. Defaults to `href`.
+
+    Returns:
+        Callable[[webdriver.Remote], str | bool]: Condition returning the
+            attribute of the first matching element once populated.
+    """
+    def condition(remote: webdriver.Remote) -> str | bool:
+        for element in remote.find_elements(by, value):
+            if (populated := element.get_attribute(attribute)):
+                return populated
+        return False
+    return condition
+
+
+class PageSnapshots:
+    """A per-run store of page snapshots shared by every browser session.
+
+    A snapshot is whatever a loader extracts from a page, typically every
+    candidate download link on it. Each snapshot is loaded once; concurrent
+    requests for the same snapshot wait for the first one to load it, without
+    their own session's `browser.watchdog` running meanwhile.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshots: dict[Hashable, Any] = {}
+        self._loading: dict[Hashable, threading.Lock] = {}
+
+    def get(self, key: Hashable, load: Callable[[], Any]) -> Any:
+        """Get a snapshot, loading it if it is not captured yet.
+
+        Args:
+            key (Hashable): Key of the snapshot, e.g. the page URL.
+            load (Callable[[], Any]): Function capturing the snapshot.
+
+        Returns:
+            Any: The snapshot.
+        """
+        with self._lock:
+            loading = self._loading.setdefault(key, threading.Lock())
+
+        if not loading.acquire(blocking=False):
+            # another session is loading it, so this one is not stuck
+            with unwatched():
+                loading.acquire()
+        try:
+            if key not in self._snapshots:
+                self._snapshots[key] = load()
+            return self._snapshots[key]
+        finally:
+            loading.release()
+
+    def clear(self) -> None:
+        """Discard every snapshot, e.g. at the start of a run.
+        """
+        with self._lock:
+            self._snapshots.clear()
+            self._loading.clear()
+
+
+snapshots = PageSnapshots()
+"""Page snapshots of the current run.
+"""
+
+_JS_LINK_ROWS = '''
+return Array.from(document.querySelectorAll(arguments[0]), row => {
+    if (arguments[1] && row.dataset.clawBefore === row.textContent) return null;
+    const texts = [];
+    const walker = document.createTreeWalker(row, NodeFilter.SHOW_TEXT);
+    while (walker.nextNode()) texts.push(walker.currentNode.nodeValue);
+    return {texts: texts, hrefs: Array.from(row.querySelectorAll('a'), a => a.href)};
+}).filter(row => row);
+'''
+"""Script returning the text nodes and link targets of every element matching a CSS selector,
+or only of those that are new or changed since `_JS_MARK_ROWS` if asked to.
+"""
+
+_JS_MARK_ROWS = '''
+for (const row of document.querySelectorAll(arguments[0])) row.dataset.clawBefore = row.textContent;
+'''
+"""Script marking every element matching a CSS selector with its current text.
+"""
+
+_JS_TAB_SELECTED = '''
+const selected = '[aria-selected="true"], [aria-pressed="true"], [aria-current="true"], .active, .selected, .is-active';
+return [arguments[0], arguments[0].parentElement].some(element => element && element.matches(selected));
+'''
+"""Script telling whether a tab, or the element holding it, is marked as the selected one.
+"""
+
+
+def _link_rows(remote: webdriver.Remote, selector: str, changed: bool = False) -> list[dict[str, list[str]]]:
+    """Capture the text and links of every row of a download table in a single evaluation.
+
+    Args:
+        remote (webdriver.Remote): Selenium WebDriver instance.
+        selector (str): CSS selector of the rows.
+        changed (bool): Only capture the rows rendered or changed since they
+            were marked by `_switch_tab`.
+
+    Returns:
+        list[dict[str, list[str]]]: Text nodes (`texts`) and link targets (`hrefs`) of each row.
+    """
+    return remote.execute_script(_JS_LINK_ROWS, selector, changed)
+
+
+def _wait_rows(remote: webdriver.Remote, selector: str, changed: bool = False) -> list[dict[str, list[str]]]:
+    """Wait for the rows of a download table to be populated with links.
+
+    Args:
+        remote (webdriver.Remote): Selenium WebDriver instance.
+        selector (str): CSS selector of the rows.
+        changed (bool): Wait for rows rendered or changed since they were
+            marked by `_switch_tab`.
+
+    Returns:
+        list[dict[str, list[str]]]: Rows captured by `_link_rows` that have links.
+
+    Raises:
+        TimeoutException: If no such rows show up within the budget.
+    """
+    def populated(driver: webdriver.Remote):
+        rows = [row for row in _link_rows(driver, selector, changed) if row['hrefs']]
+        return rows or False
+
+    return wait(remote, populated)
+
+
+def _switch_tab(remote: webdriver.Remote, tab: WebElement, selector: str) -> list[dict[str, list[str]]]:
+    """Show a tab of a download table and wait for its rows.
+
+    A tab already selected is not clicked, and its rows are captured as they
+    are. Otherwise, the rows shown are marked before clicking the tab, and only
+    the rows it renders, or changes, are captured, so the rows of the previous
+    tab are never mistaken for its own.
+
+    Args:
+        remote (webdriver.Remote): Selenium WebDriver instance.
+        tab (WebElement): The tab.
+        selector (str): CSS selector of the rows.
+
+    Returns:
+        list[dict[str, list[str]]]: Rows captured by `_link_rows` that have links.
+
+    Raises:
+        TimeoutException: If the rows of the tab do not show up within the budget.
+    """
+    if remote.execute_script(_JS_TAB_SELECTED, tab):
+        return _wait_rows(remote, selector)
+
+    remote.execute_script(_JS_MARK_ROWS, selector)
+    tab.click()
+    return _wait_rows(remote, selector, changed=True)
+
+
+def _find_link(rows: list[dict[str, list[str]]], dri_name: str) -> str:
+    """Find the first link of the first row with a text node containing the driver name.
+
+    Args:
+        rows (list[dict[str, list[str]]]): Rows captured by `_link_rows`.
+        dri_name (str): Driver name to locate.
+
+    Returns:
+        str: Link target.
+
+    Raises:
+        ValueError: If no row matches.
+    """
+    for row in rows:
+        if row['hrefs'] and any(dri_name in text for text in row['texts']):
+            return row['hrefs'][0]
+    raise ValueError(f'No download link found for "{dri_name}".')
+
+
+def _http_attribute(session: requests.Session, url: str, xpath: str, attribute: str = 'href') -> str:
+    """Fetch a static page and read an attribute of the first element matching an XPath.
+
+    Links are made absolute, as a browser would report them.
+
+    Args:
+        session (requests.Session): HTTP session.
+        url (str): Page URL.
+        xpath (str): XPath of the element.
+        attribute (str): Name of the attribute. Defaults to `href`.
+
+    Returns:
+        str: Value of the attribute.
+
+    Raises:
+        ValueError: If no matching element has the attribute.
+    """
+    resp = session.get(url, headers=HTTP_HEADERS, timeout=(10, 30))
+    resp.raise_for_status()
 
+    tree = lxml.html.fromstring(resp.content)
+    tree.make_links_absolute(resp.url)
 
+    for element in tree.xpath(xpath):
+        if (value := element.get(attribute)):
+            return value
+    raise ValueError(f'No element matching {xpath} with attribute "{attribute}".')
+
+
+@lean
 def amd(remote: webdriver.Remote, url: str, dri_name: str) -> str:
     """Fetch AMD driver download URL.
 
@@ -29,11 +453,11 @@ def amd(remote: webdriver.Remote, url: str, dri_name: str) -> str:
         str: Direct download URL for the driver.
     """
     remote.get(url)
-    return (remote
-            .find_element(By.XPATH, f'//a[contains(@href, ".exe") and contains(@href, "{dri_name}")]')
-            .get_attribute('href'))
+    return wait(remote, attribute_populated(
+        By.XPATH, f'//a[contains(@href, ".exe") and contains(@href, "{dri_name}")]'))
 
 
+@lean
 def intel(remote: webdriver.Remote, url: str) -> str:
     """Fetch Intel driver download URL.
 
@@ -45,9 +469,8 @@ def intel(remote: webdriver.Remote, url: str) -> str:
         str: Direct download URL for the driver.
     """
     remote.get(url)
-    return (remote
-            .find_element(By.CSS_SELECTOR, 'button.dc-page-available-downloads-hero-button__cta')
-            .get_attribute('data-href'))
+    return wait(remote, attribute_populated(
+        By.CSS_SELECTOR, 'button.dc-page-available-downloads-hero-button__cta', 'data-href'))
 
 
 def gigabyte(remote: webdriver.Remote, url: str, dri_name: str) -> str:
@@ -62,14 +485,15 @@ def gigabyte(remote: webdriver.Remote, url: str, dri_name: str) -> str:
     Returns:
         str: Direct download URL for the driver.
     """
-    remote.get(url)
-    time.sleep(2)
+    def load():
+        remote.get(url)
+        return _wait_rows(remote, 'div[class*="table-body-Driver"]')
 
-    return (remote
-            .find_element(By.XPATH, f'//div[contains(@class, "table-body-Driver")][.//text()[contains(., "{dri_name}")]]//a')
-            .get_attribute('href'))
+    return _find_link(snapshots.get(urldefrag(url).url, load), dri_name)
 
 
+@stateful
+@budget(45)
 def gigabyte_wifi_card(remote: webdriver.Remote, dri_type: str, dri_name: str) -> str:
     """Fetch Gigabyte GC-WIFI7 card driver download URL.
 
@@ -84,27 +508,30 @@ def gigabyte_wifi_card(remote: webdriver.Remote, dri_type: str, dri_name: str) -
     Raises:
         ValueError: If no visible version element is found.
     """
-    if ('https://www.gigabyte.com/PC-Accessory/GC-WIFI7/support' in remote.current_url):
-        remote.refresh()
-    else:
-        remote.get(
-            'https://www.gigabyte.com/PC-Accessory/GC-WIFI7/support#support-childModelsMenu')
+    def load():
+        if ('https://www.gigabyte.com/PC-Accessory/GC-WIFI7/support' in remote.current_url):
+            remote.refresh()
+        else:
+            remote.get(
+                'https://www.gigabyte.com/PC-Accessory/GC-WIFI7/support#support-childModelsMenu')
 
-    time.sleep(3)
+        def visible_anchor(driver: webdriver.Remote):
+            for anchor in driver.find_elements(By.XPATH, f'//a[.//p[text()="{dri_type}"]]'):
+                if anchor.is_displayed() and anchor.is_enabled():
+                    return anchor
+            return False
 
-    for anchor in remote.find_elements(By.XPATH, f'//a[.//p[text()="{dri_type}"]]'):
-        if anchor.is_displayed():
-            anchor.click()
-            break
-    else:
-        raise ValueError('No visible element found')
+        try:
+            anchor = wait(remote, visible_anchor)
+        except TimeoutException:
+            raise ValueError('No visible element found')
 
-    time.sleep(2)
+        return _switch_tab(remote, anchor, 'div[class*="table-body-Driver"]')
 
-    # going to the same URL, browser will not refresh
-    return gigabyte(remote, 'https://www.gigabyte.com/PC-Accessory/GC-WIFI7/support#support-dl', dri_name)
+    return _find_link(snapshots.get(('GC-WIFI7', dri_type), load), dri_name)
 
 
+@page_affinity
 def msi(remote: webdriver.Remote, url: str, dri_type: str, dri_name: str) -> str:
     """Fetch MSI driver download URL.
 
@@ -117,24 +544,26 @@ def msi(remote: webdriver.Remote, url: str, dri_type: str, dri_name: str) -> str
     Returns:
         str: Direct download URL for the driver.
     """
-    remote.get(url)
+    def load():
+        # switching to another driver type does not require reloading the page
+        if urldefrag(remote.current_url).url != urldefrag(url).url:
+            remote.get(url)
 
-    try:
-        # close cookie consent overlay
-        remote.find_element(value='ccc-notify-dismiss').click()
-    except:
-        pass
+            try:
+                # close cookie consent overlay
+                remote.find_element(value='ccc-notify-dismiss').click()
+            except:
+                pass
 
-    remote.find_element(
-        By.XPATH, f'//div[@class="badges"]//button[text()="{dri_type}"]').click()
+        badge = wait(remote, EC.element_to_be_clickable(
+            (By.XPATH, f'//div[@class="badges"]//button[text()="{dri_type}"]')))
 
-    time.sleep(1)
+        return _switch_tab(remote, badge, 'div[class="card card--web"]')
 
-    return remote\
-        .find_element(By.XPATH, f'//div[@class="card card--web"][.//text()[contains(., "{dri_name}")]]//a')\
-        .get_attribute('href')
+    return _find_link(snapshots.get((urldefrag(url).url, dri_type), load), dri_name)
 
 
+@lean
 def nvidia_grd(remote: webdriver.Remote, dri_type: Literal['desktop', 'laptop']) -> str:
     """Fetch NVIDIA Game Ready Driver download URL.
 
@@ -150,15 +579,10 @@ def nvidia_grd(remote: webdriver.Remote, dri_type: Literal['desktop', 'laptop'])
 
     remote.get('https://www.nvidia.com/zh-tw/geforce/game-ready-drivers/')
 
-    remote.get(
-        remote.find_element(
-            By.XPATH, f'//a[@id="{'DsktpGrdDwnldBtn' if dri_type == 'desktop' else 'NtbkGrdDwnldBtn'}"]')
-        .get_attribute('href')
-    )
+    remote.get(wait(remote, attribute_populated(
+        By.XPATH, f'//a[@id="{'DsktpGrdDwnldBtn' if dri_type == 'desktop' else 'NtbkGrdDwnldBtn'}"]')))
 
-    return (remote
-            .find_element(By.XPATH, '//a[contains(@id, "agreeDownload")]')
-            .get_attribute('href'))
+    return wait(remote, attribute_populated(By.XPATH, '//a[contains(@id, "agreeDownload")]'))
 
 
 # ---------------------------------------------
@@ -166,26 +590,52 @@ def nvidia_grd(remote: webdriver.Remote, dri_type: Literal['desktop', 'laptop'])
 # ---------------------------------------------
 
 
+SOURCEFORGE = 'https://sourceforge.net'
+"""Base URL of SourceForge project pages, which the benchmark points at its stand-in.
+"""
+
+SOURCEFORGE_DOWNLOADS = 'https://download.sourceforge.net'
+"""Base URL of SourceForge downloads.
+"""
+
+_SOURCEFORGE_LATEST = '//a[contains(., "Download Latest Version")]'
+"""XPath of the latest version link on a SourceForge files page.
+"""
+
+
+def _sourceforge_http(session: requests.Session, project: str) -> str:
+    """Fetch the latest version download URL of a SourceForge project without a browser.
+    """
+    version = _http_attribute(
+        session, f'{SOURCEFORGE}/projects/{project}/files/', _SOURCEFORGE_LATEST, 'title').split(':')[0]
+
+    return f'{SOURCEFORGE_DOWNLOADS}/{project}/{version}'
+
+
+@fast_path(functools.partial(_sourceforge_http, project='crystaldiskinfo'))
+@lean
 def crystaldick_info(remote: webdriver.Remote) -> str:
     """Fetch CrystalDiskInfo download URL.
     """
-    remote.get('https://sourceforge.net/projects/crystaldiskinfo/files/')
+    remote.get(f'{SOURCEFORGE}/projects/crystaldiskinfo/files/')
 
-    version = remote.find_element(
-        By.XPATH, '//a[contains(., "Download Latest Version")]').get_attribute('title').split(':')[0]
+    version = wait(remote, attribute_populated(
+        By.XPATH, _SOURCEFORGE_LATEST, 'title')).split(':')[0]
 
-    return f'https://download.sourceforge.net/crystaldiskinfo/{version}'
+    return f'{SOURCEFORGE_DOWNLOADS}/crystaldiskinfo/{version}'
 
 
+@fast_path(functools.partial(_sourceforge_http, project='crystalmarkretro'))
+@lean
 def crystaldick_mark(remote: webdriver.Remote) -> str:
     """Fetch CrystalDiskMark download URL.
     """
-    remote.get('https://sourceforge.net/projects/crystalmarkretro/files/')
+    remote.get(f'{SOURCEFORGE}/projects/crystalmarkretro/files/')
 
-    version = remote.find_element(
-        By.XPATH, '//a[contains(., "Download Latest Version")]').get_attribute('title').split(':')[0]
+    version = wait(remote, attribute_populated(
+        By.XPATH, _SOURCEFORGE_LATEST, 'title')).split(':')[0]
 
-    return f'https://download.sourceforge.net/crystalmarkretro/{version}'
+    return f'{SOURCEFORGE_DOWNLOADS}/crystalmarkretro/{version}'
 
 
 def furmark(remote: webdriver.Remote) -> str:
@@ -193,40 +643,44 @@ def furmark(remote: webdriver.Remote) -> str:
     """
     remote.get('https://www.geeks3d.com/furmark/downloads/')
 
-    remote.get(
-        remote
-        .find_element(By.XPATH, '//a[contains(., "win64 - (ZIP)")]')
-        .get_attribute('href')
-    )
+    remote.get(wait(remote, attribute_populated(
+        By.XPATH, '//a[contains(., "win64 - (ZIP)")]')))
 
-    time.sleep(5)
+    return wait(remote, attribute_populated(By.XPATH, '//a[contains(., "Geeks3D server")]'))
 
-    return remote.find_element(
-        By.XPATH, '//a[contains(., "Geeks3D server")]').get_attribute('href')
+
+_HWINFO_PORTABLE = ('//div[contains(@class, "download") and contains(., "Portable") and contains(., "Windows")]'
+                    '//li[contains(., "SAC ftp (SK)")]//a')
+"""XPath of the portable HWiNFO download link.
+"""
 
 
+@fast_path(functools.partial(_http_attribute, url='https://www.hwinfo.com/download/', xpath=_HWINFO_PORTABLE))
+@lean
 def hwinfo(remote: webdriver.Remote) -> str:
     """Fetch HWiNFO download URL.
     """
     remote.get('https://www.hwinfo.com/download/')
-    return (remote
-            .find_element(By.XPATH,
-                          '//div[contains(@class, "download") and contains(., "Portable") and contains(., "Windows")]'
-                          '//li[contains(., "SAC ftp (SK)")]//a')
-            .get_attribute('href'))
+    return wait(remote, attribute_populated(By.XPATH, _HWINFO_PORTABLE))
 
 
+@fast_path(lambda session: 'https://www.ocbase.com/download/edition:Personal/os:Windows')
 def occt(remote: webdriver.Remote) -> str:
     """Fetch OCCT download URL.
     """
     return 'https://www.ocbase.com/download/edition:Personal/os:Windows'
 
 
+_Y_CRUNCHER_WINDOWS = '//table[contains(., "Download Link")]//tr[contains(., "Windows")]//a'
+"""XPath of the Windows y-cruncher download link.
+"""
+
+
+@fast_path(functools.partial(_http_attribute, url='https://www.numberworld.org/y-cruncher/', xpath=_Y_CRUNCHER_WINDOWS))
+@lean
 def y_cruncher(remote: webdriver.Remote) -> str:
     """Fetch y-cruncher download URL.
     """
     remote.get('https://www.numberworld.org/y-cruncher/#Download')
 
-    return (remote
-            .find_element(By.XPATH, '//table[contains(., "Download Link")]//tr[contains(., "Windows")]//a')
-            .get_attribute('href'))
+    return wait(remote, attribute_populated(By.XPATH, _Y_CRUNCHER_WINDOWS))
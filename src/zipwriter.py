@@ -0,0 +1,274 @@
+"""Low-level zip file writing.
+
+`ZipWriter` writes zip entries whose data is either compressed by the caller
+(e.g. on another process), compressed while streaming, or copied byte for byte
+from another zip file. Large files and archives use the zip64 extensions.
+Entries are described with `zipfile.ZipInfo`, so archives written here can be
+read back with `zipfile`.
+"""
+
+import io
+import struct
+import zlib
+from pathlib import Path
+from typing import BinaryIO
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipInfo
+
+CHUNK_SIZE = 1024 * 1024
+"""Number of bytes read or written at a time.
+"""
+
+ZIP64_LIMIT = (1 << 31) - 1
+"""Size or offset from which the zip64 extensions are used, as in `zipfile`.
+"""
+
+_LOCAL_HEADER = struct.Struct('<4s2B4HL2L2H')
+_CENTRAL_HEADER = struct.Struct('<4s4B4HL2L5H2L')
+_END_RECORD = struct.Struct('<4s4H2LH')
+_END_RECORD64 = struct.Struct('<4sQ2H2L4Q')
+_END_LOCATOR64 = struct.Struct('<4sLQL')
+
+_FLAG_UTF8 = 0x800
+_VERSION_DEFAULT = 20
+_VERSION_ZIP64 = 45
+_VERSION_MADE_BY = 3
+"""Host system written in entries, Unix, as `zipfile` does on POSIX systems.
+"""
+
+
+def _dos_time(info: ZipInfo) -> tuple[int, int]:
+    """DOS time and date fields of an entry.
+    """
+    year, month, day, hour, minute, second = info.date_time
+    return (hour << 11 | minute << 5 | second // 2,
+            (year - 1980) << 9 | month << 5 | day)
+
+
+def read_local_header(fp: BinaryIO, info: ZipInfo) -> int:
+    """Seek past the local header of an entry in a zip file.
+
+    Args:
+        fp (BinaryIO): The zip file.
+        info (ZipInfo): Entry read from its central directory.
+
+    Returns:
+        int: Offset of the entry data.
+    """
+    fp.seek(info.header_offset)
+    header = fp.read(_LOCAL_HEADER.size)
+    if header[:4] != b'PK\x03\x04':
+        raise ValueError(f'Bad local header of {info.filename}.')
+    name_length, extra_length = struct.unpack('<2H', header[26:30])
+    return fp.seek(info.header_offset + _LOCAL_HEADER.size + name_length + extra_length)
+
+
+class ZipWriter:
+    """A zip file written entry by entry.
+
+    The file must be seekable: the local header of an entry compressed while
+    streaming is completed once its data is written.
+    """
+
+    path: Path
+    """Path to the zip file.
+    """
+
+    entries: list[ZipInfo]
+    """Entries written so far, in order.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.entries = []
+        self._fp = open(self.path, 'wb')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *_):
+        if exc_type is None:
+            self.close()
+        else:
+            self._fp.close()
+
+    @property
+    def offset(self) -> int:
+        """Number of bytes written so far.
+        """
+        return self._fp.tell()
+
+    def _write_local_header(self, info: ZipInfo, zip64: bool):
+        name = info.filename.encode('utf-8')
+        if not info.filename.isascii():
+            info.flag_bits |= _FLAG_UTF8
+
+        extra = b''
+        compress_size, file_size = info.compress_size, info.file_size
+        if zip64:
+            extra = struct.pack('<2H2Q', 1, 16, file_size, compress_size)
+            compress_size = file_size = 0xFFFFFFFF
+
+        info.header_offset = self.offset
+        info.extract_version = max(info.extract_version,
+                                   _VERSION_ZIP64 if zip64 else _VERSION_DEFAULT)
+        self._fp.write(_LOCAL_HEADER.pack(
+            b'PK\x03\x04', info.extract_version, 0, info.flag_bits,
+            info.compress_type, *_dos_time(info), info.CRC,
+            compress_size, file_size, len(name), len(extra)))
+        self._fp.write(name)
+        self._fp.write(extra)
+
+    def write_raw(self, info: ZipInfo, data: BinaryIO) -> ZipInfo:
+        """Write an entry whose data is already compressed.
+
+        Args:
+            info (ZipInfo): The entry, with `compress_type`, `CRC`,
+                `compress_size` and `file_size` set.
+            data (BinaryIO): Stream positioned at the compressed data;
+                `compress_size` bytes are copied from it.
+
+        Returns:
+            ZipInfo: The written entry.
+        """
+        info.flag_bits &= ~0x08
+        self._write_local_header(
+            info, max(info.file_size, info.compress_size) > ZIP64_LIMIT)
+
+        remaining = info.compress_size
+        while remaining > 0:
+            chunk = data.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                raise EOFError(f'Data of {info.filename} is truncated.')
+            self._fp.write(chunk)
+            remaining -= len(chunk)
+
+        self.entries.append(info)
+        return info
+
+    def write_directory(self, info: ZipInfo) -> ZipInfo:
+        """Write a directory entry.
+
+        Args:
+            info (ZipInfo): The entry, whose name ends with a slash.
+
+        Returns:
+            ZipInfo: The written entry.
+        """
+        info.CRC = info.compress_size = info.file_size = 0
+        return self.write_raw(info, io.BytesIO())
+
+    def write_stream(self, info: ZipInfo, data: BinaryIO, level: int | None = None, size_hint: int | None = None) -> ZipInfo:
+        """Write an entry from uncompressed data, compressing it while streaming.
+
+        Args:
+            info (ZipInfo): The entry.
+            data (BinaryIO): Uncompressed data, read until exhausted.
+            level (int | None): Deflate level, or None to store the data.
+            size_hint (int | None): Expected uncompressed size, used to decide
+                whether the entry needs zip64 extensions. Unknown sizes always
+                get them.
+
+        Returns:
+            ZipInfo: The written entry.
+        """
+        info.compress_type = ZIP_STORED if level is None else ZIP_DEFLATED
+        info.flag_bits &= ~0x08
+        info.CRC = info.compress_size = info.file_size = 0
+        zip64 = size_hint is None or size_hint * 1.05 > ZIP64_LIMIT
+        self._write_local_header(info, zip64)
+        start = self.offset
+
+        compressor = None if level is None else zlib.compressobj(
+            level, zlib.DEFLATED, -15)
+        crc, size = 0, 0
+        while chunk := data.read(CHUNK_SIZE):
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+            self._fp.write(compressor.compress(chunk) if compressor else chunk)
+        if compressor:
+            self._fp.write(compressor.flush())
+
+        info.CRC, info.file_size = crc, size
+        info.compress_size = self.offset - start
+        if not zip64 and max(info.file_size, info.compress_size) > ZIP64_LIMIT:
+            raise RuntimeError(
+                f'{info.filename} exceeded its size hint and needs zip64 extensions.')
+
+        end = self.offset
+        self._fp.seek(info.header_offset)
+        self._write_local_header(info, zip64)
+        self._fp.seek(end)
+
+        self.entries.append(info)
+        return info
+
+    def copy_from(self, source: BinaryIO, info: ZipInfo) -> ZipInfo:
+        """Copy an entry of another zip file byte for byte, without recompressing it.
+
+        Args:
+            source (BinaryIO): The other zip file.
+            info (ZipInfo): The entry, read from the central directory of `source`.
+
+        Returns:
+            ZipInfo: The written entry.
+        """
+        read_local_header(source, info)
+        return self.write_raw(info, source)
+
+    def write_file(self, info: ZipInfo, path: str | Path, level: int | None = None) -> ZipInfo:
+        """Write an entry from a file, compressing it while streaming.
+
+        Args:
+            info (ZipInfo): The entry.
+            path (str | Path): Path to the file.
+            level (int | None): Deflate level, or None to store the file.
+
+        Returns:
+            ZipInfo: The written entry.
+        """
+        with open(path, 'rb') as f:
+            return self.write_stream(info, f, level, Path(path).stat().st_size)
+
+    def close(self):
+        """Write the central directory and close the file.
+        """
+        start = self.offset
+
+        for info in self.entries:
+            name = info.filename.encode('utf-8')
+            compress_size, file_size, header_offset = info.compress_size, info.file_size, info.header_offset
+
+            fields = []
+            if file_size > ZIP64_LIMIT:
+                fields.append(file_size)
+                file_size = 0xFFFFFFFF
+            if compress_size > ZIP64_LIMIT:
+                fields.append(compress_size)
+                compress_size = 0xFFFFFFFF
+            if header_offset > ZIP64_LIMIT:
+                fields.append(header_offset)
+                header_offset = 0xFFFFFFFF
+            extra = (struct.pack(f'<2H{len(fields)}Q', 1, 8 * len(fields), *fields)
+                     if fields else b'')
+            version = _VERSION_ZIP64 if fields else info.extract_version
+
+            self._fp.write(_CENTRAL_HEADER.pack(
+                b'PK\x01\x02', version, _VERSION_MADE_BY, version, 0,
+                info.flag_bits, info.compress_type, *_dos_time(info), info.CRC,
+                compress_size, file_size, len(name), len(extra), 0, 0, 0,
+                info.external_attr, header_offset))
+            self._fp.write(name)
+            self._fp.write(extra)
+
+        end = self.offset
+        count, size = len(self.entries), end - start
+        if count > 0xFFFF or size > ZIP64_LIMIT or start > ZIP64_LIMIT:
+            self._fp.write(_END_RECORD64.pack(
+                b'PK\x06\x06', 44, _VERSION_ZIP64, _VERSION_ZIP64, 0, 0,
+                count, count, size, start))
+            self._fp.write(_END_LOCATOR64.pack(b'PK\x06\x07', 0, end, 1))
+            count, size, start = min(count, 0xFFFF), min(size, 0xFFFFFFFF), min(start, 0xFFFFFFFF)
+
+        self._fp.write(_END_RECORD.pack(
+            b'PK\x05\x06', 0, 0, count, count, size, start, 0))
+        self._fp.close()
@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+import time
+import zipfile
+import zlib
+from zipfile import ZIP_DEFLATED, ZIP_STORED
+
+import pytest
+
+import archive
+
+TEXT = b'driver package\n' * 10_000
+
+
+def tree(root):
+    root.joinpath('net', 'sub').mkdir(parents=True)
+    root.joinpath('net', 'driver.inf').write_bytes(TEXT)
+    root.joinpath('net', 'setup.exe').write_bytes(os.urandom(100_000))
+    root.joinpath('net', 'sub', 'copy.inf').write_bytes(TEXT)
+    root.joinpath('video').mkdir()
+    root.joinpath('video', 'data.bin').write_bytes(os.urandom(100_000))
+    return root
+
+
+def contents(path) -> dict[str, bytes]:
+    with zipfile.ZipFile(path) as zf:
+        assert zf.testzip() is None
+        return {info.filename: zf.read(info) for info in zf.infolist()}
+
+
+def test_zip_round_trip(tmp_path):
+    source = tree(tmp_path.joinpath('out'))
+    target = tmp_path.joinpath('pack.zip')
+
+    entries = archive.zip(target, source.joinpath('net'), source.joinpath('video'), workers=2)
+
+    assert [info.filename for info in entries] == [
+        'net/', 'net/sub/', 'net/driver.inf', 'net/setup.exe', 'net/sub/copy.inf', 'video/', 'video/data.bin']
+    assert contents(target) == {
+        'net/': b'', 'net/sub/': b'', 'video/': b'',
+        'net/driver.inf': TEXT,
+        'net/setup.exe': source.joinpath('net', 'setup.exe').read_bytes(),
+        'net/sub/copy.inf': TEXT,
+        'video/data.bin': source.joinpath('video', 'data.bin').read_bytes()}
+    with zipfile.ZipFile(target) as zf:
+        assert zf.getinfo('net/driver.inf').compress_type == ZIP_DEFLATED
+        assert zf.getinfo('net/setup.exe').compress_type == ZIP_STORED
+        assert zf.getinfo('video/data.bin').compress_type == ZIP_STORED
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['out', 'pack.zip']
+
+
+def test_zip_stored(tmp_path):
+    source = tree(tmp_path.joinpath('out'))
+    target = tmp_path.joinpath('pack.zip')
+
+    archive.zip(target, source.joinpath('net'), level=0, workers=1)
+
+    with zipfile.ZipFile(target) as zf:
+        assert {info.compress_type for info in zf.infolist()} == {ZIP_STORED}
+    assert contents(target)['net/driver.inf'] == TEXT
+
+
+def test_zip_update(tmp_path, monkeypatch):
+    source = tree(tmp_path.joinpath('out'))
+    target = tmp_path.joinpath('pack.zip')
+    archive.zip(target, source.joinpath('net'), source.joinpath('video'), workers=2)
+
+    # zip files store modification times with a 2 seconds resolution
+    mtime = (int(time.time()) // 2 + 5) * 2
+    changed = source.joinpath('net', 'driver.inf')
+    changed.write_bytes(TEXT.replace(b'driver', b'Driver'))
+    os.utime(changed, (mtime, mtime))
+    touched = source.joinpath('net', 'sub', 'copy.inf')
+    os.utime(touched, (mtime, mtime))
+    source.joinpath('video', 'data.bin').unlink()
+    source.joinpath('video', 'new.inf').write_bytes(TEXT)
+
+    compressed = []
+    compressible = archive.compressible
+    monkeypatch.setattr(archive, 'compressible', lambda path, size=None: (
+        compressed.append(path.relative_to(source).as_posix()) or compressible(path, size)))
+    archive.zip(target, source.joinpath('net'), source.joinpath('video'), workers=2, update=True)
+
+    assert compressed == ['net/driver.inf', 'video/new.inf']
+    assert contents(target) == {
+        'net/': b'', 'net/sub/': b'', 'video/': b'',
+        'net/driver.inf': TEXT.replace(b'driver', b'Driver'),
+        'net/setup.exe': source.joinpath('net', 'setup.exe').read_bytes(),
+        'net/sub/copy.inf': TEXT,
+        'video/new.inf': TEXT}
+    with zipfile.ZipFile(target) as zf:
+        assert zf.getinfo('net/sub/copy.inf').date_time == zipfile.ZipInfo.from_file(touched).date_time
+
+
+def manifest(files: dict[str, bytes]) -> bytes:
+    return json.dumps({'items': {'net': {'files': {
+        name: {'sha256': hashlib.sha256(data).hexdigest(), 'crc32': zlib.crc32(data), 'size': len(data)}
+        for name, data in files.items()}}}}).encode()
+
+
+def build(path, files: dict[str, bytes]):
+    with zipfile.ZipFile(path, 'w', ZIP_DEFLATED) as zf:
+        for name, data in files.items():
+            zf.writestr(name, data)
+
+
+def test_delta_round_trip(tmp_path):
+    setup, renamed = os.urandom(100_000), os.urandom(100_000)
+    base = {'out/net/setup.exe': setup, 'out/net/old.inf': TEXT, 'out/video/gone.bin': b'gone',
+            'out/video/renamed.bin': renamed}
+    base['out/manifest.json'] = manifest({'setup.exe': setup, 'old.inf': TEXT})
+    new = {'out/net/setup.exe': setup, 'out/net/old.inf': TEXT + b'new', 'out/net/added.inf': b'added',
+           'out/video/moved.bin': renamed}
+    new['out/manifest.json'] = manifest({'setup.exe': setup, 'old.inf': TEXT + b'new'})
+    build(tmp_path.joinpath('base.zip'), base)
+    build(tmp_path.joinpath('new.zip'), new)
+
+    pack = archive.delta(tmp_path.joinpath('delta.zip'), tmp_path.joinpath('base.zip'), tmp_path.joinpath('new.zip'))
+
+    sources = {entry['name']: (entry['source'], entry['base_name']) for entry in pack['entries']}
+    assert sources == {'out/net/setup.exe': ('base', 'out/net/setup.exe'),
+                       'out/net/old.inf': ('delta', None),
+                       'out/net/added.inf': ('delta', None),
+                       'out/video/moved.bin': ('base', 'out/video/renamed.bin'),
+                       'out/manifest.json': ('delta', None)}
+    assert pack['deleted'] == ['out/video/gone.bin', 'out/video/renamed.bin']
+    assert pack['entries'][0]['sha256'] == hashlib.sha256(setup).hexdigest()
+    assert set(contents(tmp_path.joinpath('delta.zip'))) == {
+        'out/net/old.inf', 'out/net/added.inf', 'out/manifest.json', archive.DELTA_MANIFEST}
+
+    entries = archive.apply_delta(tmp_path.joinpath('base.zip'), tmp_path.joinpath('delta.zip'),
+                                  tmp_path.joinpath('rebuilt.zip'))
+
+    assert [info.filename for info in entries] == list(new)
+    assert contents(tmp_path.joinpath('rebuilt.zip')) == new
+
+
+def test_apply_delta_to_other_base(tmp_path):
+    build(tmp_path.joinpath('base.zip'), {'a.bin': b'a', 'b.bin': b'b'})
+    build(tmp_path.joinpath('new.zip'), {'a.bin': b'a', 'c.bin': b'c'})
+    build(tmp_path.joinpath('other.zip'), {'a.bin': b'A', 'b.bin': b'b'})
+    archive.delta(tmp_path.joinpath('delta.zip'), tmp_path.joinpath('base.zip'), tmp_path.joinpath('new.zip'))
+
+    with pytest.raises(ValueError):
+        archive.apply_delta(tmp_path.joinpath('other.zip'), tmp_path.joinpath('delta.zip'),
+                            tmp_path.joinpath('rebuilt.zip'))
+    assert not tmp_path.joinpath('rebuilt.zip').exists()
+    assert not tmp_path.joinpath('.rebuilt.zip.tmp').exists()
@@ -0,0 +1,61 @@
+import os
+import time
+
+import requests
+
+from cache import DownloadCache
+
+
+def response(etag: str) -> requests.Response:
+    resp = requests.Response()
+    resp.status_code = 200
+    resp.headers['ETag'] = etag
+    return resp
+
+
+def download(tmp_path, name: str) -> os.PathLike:
+    path = tmp_path.joinpath('downloads', name)
+    path.parent.mkdir(exist_ok=True)
+    path.write_bytes(os.urandom(1000))
+    return path
+
+
+def test_lru_eviction(tmp_path):
+    cache = DownloadCache(tmp_path.joinpath('cache'), 2500)
+    entries = {}
+    for name in 'abc':
+        entries[name] = cache.add(f'https://example.com/{name}', download(tmp_path, name), name, response(f'"{name}"'))
+        time.sleep(0.01)
+        if name == 'b':
+            # a hit makes `a` more recently used than `b`
+            assert cache.lookup('https://example.com/a') == entries['a']
+            time.sleep(0.01)
+
+    assert cache.lookup('https://example.com/b') is None
+    assert not cache.path_object(entries['b']['sha256']).exists()
+    for name in 'ac':
+        assert cache.lookup(f'https://example.com/{name}') == entries[name]
+        assert cache.path_object(entries[name]['sha256']).exists()
+
+
+def test_shared_index(tmp_path):
+    first = DownloadCache(tmp_path.joinpath('cache'), 10_000)
+    second = DownloadCache(tmp_path.joinpath('cache'), 10_000)
+    a = first.add('https://example.com/a', download(tmp_path, 'a'), 'a', response('"a"'))
+    b = second.add('https://example.com/b', download(tmp_path, 'b'), 'b', response('"b"'))
+
+    assert first.lookup('https://example.com/b') == b
+    assert second.lookup('https://example.com/a') == a
+    assert DownloadCache.conditional_headers(a) == {'If-None-Match': '"a"'}
+
+
+def test_materialize(tmp_path):
+    cache = DownloadCache(tmp_path.joinpath('cache'), 10_000)
+    source = download(tmp_path, 'a')
+    entry = cache.add('https://example.com/a', source, 'a', response('"a"'))
+
+    dest = cache.materialize(entry, tmp_path.joinpath('out', 'a'))
+    assert dest.read_bytes() == source.read_bytes()
+
+    cache.path_object(entry['sha256']).unlink()
+    assert cache.lookup('https://example.com/a') is None
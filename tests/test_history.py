@@ -0,0 +1,59 @@
+import pytest
+
+from history import MIN_BYTES, History, RunMetrics
+
+
+def metrics(*items: dict) -> RunMetrics:
+    metrics = RunMetrics()
+    for item in items:
+        metrics.add('resolve', item['label'], 0, item.get('resolve', 2), {'source': item.get('source', 'http')})
+        metrics.add('download', item['label'], 0, item.get('download', 2),
+                    {'bytes': item.get('bytes', 10 * MIN_BYTES), 'cached': item.get('cached', False),
+                     'error': item.get('error')})
+    metrics.add('run', None, 0, 10, {'items': len(items), 'failed': 0, 'bytes': 0})
+    return metrics
+
+
+@pytest.fixture
+def history(tmp_path):
+    with History(tmp_path.joinpath('history.db')) as history:
+        yield history
+
+
+def test_regressions(history):
+    for _ in range(3):
+        history.add(metrics({'label': 'net'}, {'label': 'video'}, {'label': 'audio'}))
+    run = history.add(metrics({'label': 'net', 'resolve': 5},
+                              {'label': 'video', 'download': 8},
+                              {'label': 'audio', 'resolve': 2.5, 'download': 2.5}))
+
+    assert history.regressions(run) == [
+        {'label': 'net', 'metric': 'resolve', 'value': 5, 'baseline': 2, 'runs': 3},
+        {'label': 'video', 'metric': 'download', 'value': 10 * MIN_BYTES / 8,
+         'baseline': 10 * MIN_BYTES / 2, 'runs': 3}]
+    assert history.regressions(run, threshold=3) == [
+        {'label': 'video', 'metric': 'download', 'value': 10 * MIN_BYTES / 8,
+         'baseline': 10 * MIN_BYTES / 2, 'runs': 3}]
+    assert history.regressions(run, min_runs=4) == []
+
+
+def test_regressions_baseline(history):
+    history.add(metrics({'label': 'net', 'source': 'browser', 'download': 1, 'cached': True}))
+    history.add(metrics({'label': 'net', 'resolve': 1, 'error': 'HTTPError'}))
+    history.add(metrics({'label': 'net', 'resolve': 1, 'download': 1, 'bytes': 1000}))
+    run = history.add(metrics({'label': 'net', 'resolve': 10, 'download': 10}))
+
+    # the resolve baseline only counts successful runs with the same source, and
+    # the download baseline large downloads not served from the cache
+    assert history.regressions(run, min_runs=1) == [
+        {'label': 'net', 'metric': 'resolve', 'value': 10, 'baseline': 1, 'runs': 1}]
+
+
+def test_failed_items_not_compared(history):
+    for _ in range(3):
+        history.add(metrics({'label': 'net'}))
+    run = history.add(metrics({'label': 'net', 'resolve': 10, 'download': 10, 'error': 'Timeout'}))
+
+    assert history.regressions(run) == []
+    assert history.items(run)[0]['error'] == 'Timeout'
+    assert [record['id'] for record in history.runs(2)] == [run, run - 1]
@@ -0,0 +1,77 @@
+import requests
+
+import retry
+from retry import Backoff, CircuitBreaker
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_circuit_breaker(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(retry.time, 'monotonic', clock)
+    breaker = CircuitBreaker(threshold=3, cooldown=60)
+
+    assert not breaker.failure('a.com:443')
+    assert not breaker.failure('a.com:443')
+    assert breaker.retry_in('a.com:443') == 0
+    assert breaker.failure('a.com:443')
+    assert breaker.retry_in('a.com:443') == 60
+    assert breaker.retry_in('b.com:443') == 0
+
+    # failures of requests sent before the cutoff do not open it again
+    clock.now += 10
+    assert not breaker.failure('a.com:443')
+    assert breaker.retry_in('a.com:443') == 60
+
+    # after the cooldown, a single failure cuts the host off again
+    clock.now += 61
+    assert breaker.retry_in('a.com:443') == 0
+    assert breaker.failure('a.com:443')
+    assert breaker.retry_in('a.com:443') == 60
+
+    # and a success closes the breaker
+    clock.now += 61
+    breaker.success('a.com:443')
+    assert not breaker.failure('a.com:443')
+    assert breaker.retry_in('a.com:443') == 0
+
+
+def test_circuit_breaker_unknown_host():
+    breaker = CircuitBreaker(threshold=1)
+    assert not breaker.failure(None)
+    assert breaker.retry_in(None) == 0
+
+
+def test_backoff(monkeypatch):
+    monkeypatch.setattr(retry.random, 'uniform', lambda low, high: high)
+    backoff = Backoff(base=2, cap=60)
+    assert [backoff.delay(attempt) for attempt in range(7)] == [2, 4, 8, 16, 32, 60, 60]
+
+
+def http_error(status: int, headers: dict[str, str] | None = None) -> requests.HTTPError:
+    resp = requests.Response()
+    resp.status_code = status
+    resp.headers.update(headers or {})
+    return requests.HTTPError(response=resp)
+
+
+def test_transient():
+    assert retry.transient(http_error(503))
+    assert retry.transient(http_error(429))
+    assert not retry.transient(http_error(404))
+    assert retry.transient(requests.ConnectionError())
+    assert retry.transient(TimeoutError())
+    assert not retry.transient(ValueError())
+
+
+def test_retry_after():
+    assert retry.retry_after(http_error(503, {'Retry-After': '5'})) == 5
+    assert retry.retry_after(http_error(503, {'Retry-After': 'soon'})) == 0
+    assert retry.retry_after(http_error(503)) == 0
+    assert 0 < retry.retry_after(http_error(503, {'Retry-After': 'Fri, 01 Jan 2100 00:00:00 GMT'}))
@@ -0,0 +1,71 @@
+import hashlib
+import os
+import zlib
+
+import pytest
+import requests
+
+from transfer import Partial
+
+URL = 'https://example.com/driver.exe'
+DATA = os.urandom(100_000)
+
+
+def response(etag: str = '"v1"', size: int = len(DATA)) -> requests.Response:
+    resp = requests.Response()
+    resp.status_code = 200
+    resp.headers.update({'ETag': etag, 'Accept-Ranges': 'bytes', 'Content-Length': str(size)})
+    return resp
+
+
+def receive(partial: Partial, index: int, count: int):
+    start, _, received = partial.segments[index]
+    chunk = DATA[start + received:start + received + count]
+    with open(partial.path, 'r+b') as f:
+        f.seek(start + received)
+        f.write(chunk)
+    partial.advance(index, chunk)
+
+
+def test_resume(tmp_path):
+    partial = Partial(tmp_path, URL, crc32=True)
+    partial.reset(response(), 2)
+    receive(partial, 0, 10_000)
+    receive(partial, 1, 20_000)
+    partial.save()
+
+    resumed = Partial(tmp_path, URL, crc32=True)
+    assert resumed.received == 30_000
+    assert resumed.segments == partial.segments
+    assert resumed.resumable(response())
+
+    for index, (start, end, received) in enumerate(resumed.segments):
+        receive(resumed, index, end - start + 1 - received)
+    assert resumed.digest() == {'sha256': hashlib.sha256(DATA).hexdigest(),
+                                'crc32': zlib.crc32(DATA),
+                                'size': len(DATA)}
+
+    path = resumed.complete('.exe')
+    assert path.read_bytes() == DATA
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_not_resumable_after_change(tmp_path):
+    partial = Partial(tmp_path, URL)
+    partial.reset(response(), 1)
+    receive(partial, 0, 10_000)
+    partial.save()
+
+    resumed = Partial(tmp_path, URL)
+    assert not resumed.resumable(response(etag='"v2"'))
+    assert not resumed.resumable(response(size=len(DATA) + 1))
+    assert not Partial(tmp_path, URL + '?other').received
+
+
+def test_complete_incomplete(tmp_path):
+    partial = Partial(tmp_path, URL)
+    partial.reset(response(), 1)
+    receive(partial, 0, 10_000)
+
+    with pytest.raises(RuntimeError):
+        partial.complete()
@@ -0,0 +1,69 @@
+import io
+import os
+import zipfile
+import zlib
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipInfo
+
+import pytest
+
+from zipwriter import ZipWriter
+
+TEXT = b'driver package\n' * 10_000
+RANDOM = os.urandom(50_000)
+
+
+def test_round_trip(tmp_path):
+    source = tmp_path.joinpath('random.bin')
+    source.write_bytes(RANDOM)
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -15)
+    deflated = compressor.compress(TEXT) + compressor.flush()
+
+    with ZipWriter(tmp_path.joinpath('out.zip')) as writer:
+        writer.write_directory(ZipInfo('dir/'))
+        writer.write_stream(ZipInfo('dir/text.txt'), io.BytesIO(TEXT), 5, len(TEXT))
+        writer.write_stream(ZipInfo('dir/unknown.txt'), io.BytesIO(TEXT), 5)
+        writer.write_file(ZipInfo('dir/random.bin'), source)
+        info = ZipInfo('dir/raw.txt')
+        info.compress_type, info.CRC = ZIP_DEFLATED, zlib.crc32(TEXT)
+        info.compress_size, info.file_size = len(deflated), len(TEXT)
+        writer.write_raw(info, io.BytesIO(deflated))
+        writer.write_stream(ZipInfo('dir/pilote été.txt'), io.BytesIO(b'unicode'))
+
+    with zipfile.ZipFile(tmp_path.joinpath('out.zip')) as zf:
+        assert zf.testzip() is None
+        assert zf.namelist() == ['dir/', 'dir/text.txt', 'dir/unknown.txt', 'dir/random.bin',
+                                 'dir/raw.txt', 'dir/pilote été.txt']
+        assert zf.getinfo('dir/').is_dir()
+        assert zf.getinfo('dir/text.txt').compress_type == ZIP_DEFLATED
+        assert zf.getinfo('dir/random.bin').compress_type == ZIP_STORED
+        for name in ('dir/text.txt', 'dir/unknown.txt', 'dir/raw.txt'):
+            assert zf.read(name) == TEXT
+        assert zf.read('dir/random.bin') == RANDOM
+        assert zf.read('dir/pilote été.txt') == b'unicode'
+
+
+def test_copy_from(tmp_path):
+    with zipfile.ZipFile(tmp_path.joinpath('source.zip'), 'w', ZIP_DEFLATED) as zf:
+        zf.writestr('a.txt', TEXT)
+        zf.writestr('b.bin', RANDOM)
+
+    with (open(tmp_path.joinpath('source.zip'), 'rb') as source,
+          zipfile.ZipFile(source) as zf,
+          ZipWriter(tmp_path.joinpath('out.zip')) as writer):
+        for info in reversed(zf.infolist()):
+            writer.copy_from(source, info)
+
+    with zipfile.ZipFile(tmp_path.joinpath('out.zip')) as zf:
+        assert zf.testzip() is None
+        assert zf.namelist() == ['b.bin', 'a.txt']
+        assert zf.read('a.txt') == TEXT
+        assert zf.read('b.bin') == RANDOM
+
+
+def test_failed_write_is_not_finished(tmp_path):
+    path = tmp_path.joinpath('out.zip')
+    with pytest.raises(KeyboardInterrupt), ZipWriter(path) as writer:
+        writer.write_stream(ZipInfo('a.txt'), io.BytesIO(TEXT), 5, len(TEXT))
+        raise KeyboardInterrupt
+
+    assert not zipfile.is_zipfile(path)